@@ -0,0 +1,220 @@
+import io
+import time
+import asyncio
+import logging
+import functools
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from application.services import watermark_service
+from application.services.watermark_service import WatermarkService, _init_worker
+from domain.batch import JobResult, read_manifest
+from domain.overlay import write_offset_sidecar
+from domain.photo_io import load_photo, save_photo
+from domain.exceptions import WatermarkGeneratorError
+
+logger = logging.getLogger(__name__)
+
+# 后台线程每次从任务清单读取的记录数
+MANIFEST_CHUNK_SIZE = 64
+
+def _render_job_in_memory(processor, index: int, job: dict, photo_data: bytes = None):
+    """
+    渲染单个任务并返回 (JobResult, 编码后的字节, 偏移)，不写文件，写盘由调用方在 I/O 线程中完成。
+    照片任务使用调用方读入的 photo_data；启用了输出缓存时仍交给 generate_watermark 直接写文件，
+    带 widths 的多分辨率任务交给 generate_watermark_sizes 直接写文件，这两种情况返回的字节为 None。
+    """
+    start = time.perf_counter()
+    output_path = job.get("output_path")
+    try:
+        if job.get("photo_path"):
+            job = dict(job)
+            job.pop("photo_path")
+            job.pop("output_path")
+            photo = load_photo(io.BytesIO(photo_data), processor.config.PHOTO_MAX_DIMENSION)
+            result = processor.composite_photo(photo, **job)
+            buffer = io.BytesIO()
+            save_photo(result, output_path, photo.info, processor.config.PHOTO_JPEG_QUALITY, fp=buffer)
+            processor.metrics.increment("photos_composited")
+            data, offset = buffer.getvalue(), (0, 0)
+        elif job.get("widths"):
+            processor.generate_watermark_sizes(**job)
+            data, offset = None, (0, 0)
+        elif processor.output_cache:
+            processor.generate_watermark(**job)
+            data, offset = None, (0, 0)
+        else:
+            job = dict(job)
+            job.pop("output_path")
+            img, offset = processor.render_image(**job)
+            buffer = io.BytesIO()
+            processor._encode_image(img, offset, buffer)
+            processor.metrics.increment("images_generated")
+            data = buffer.getvalue()
+        return JobResult(index, output_path, True, elapsed=time.perf_counter() - start), data, offset
+    except WatermarkGeneratorError as e:
+        return JobResult(index, output_path, False, str(e), time.perf_counter() - start), None, None
+    except Exception as e:
+        logger.error(f"渲染任务 {index} 时发生意外错误: {e}")
+        return JobResult(index, output_path, False, str(e), time.perf_counter() - start), None, None
+
+def _render_in_memory_in_worker(index: int, job: dict, photo_data: bytes = None):
+    """在工作进程中渲染单个任务，使用 _init_worker 创建的 ImageProcessor。"""
+    processor = watermark_service._worker_processor
+    if processor is None:
+        return JobResult(index, job.get("output_path"), False, "工作进程未初始化 ImageProcessor"), None, None
+    result, data, offset = _render_job_in_memory(processor, index, job, photo_data)
+    if processor.metrics.enabled:
+        result.metrics = processor.metrics.drain()
+    return result, data, offset
+
+def _read_file(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+def _read_manifest_chunk(records, size: int) -> list:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            break
+    return chunk
+
+class AsyncWatermarkService:
+    """
+    WatermarkService 的 asyncio 封装，供异步的摄取服务调用。
+    渲染在执行器中进行：max_workers 大于 1 时为进程池，每个进程由 _init_worker 创建一次 ImageProcessor；
+    为 1 时为单线程执行器，复用 WatermarkService 自带的实例。
+    读取照片和写出结果通过 asyncio.to_thread 进行，与其他任务的渲染重叠；
+    同时处理（读取、渲染、写出）的任务数由信号量限制为 max_concurrency，内存占用不随批次大小增长。
+    应在 async with 中使用，或在结束时调用 close()。
+    """
+    def __init__(self, service: WatermarkService = None, max_workers: int = None, max_concurrency: int = None):
+        self.service = service or WatermarkService()
+        self.config = self.service.config
+        self.max_workers = self.service._resolve_worker_count(max_workers)
+        # 默认让在途任务数为渲染并发度的两倍，一个任务读写文件时执行器里始终有任务在渲染
+        self.max_concurrency = max_concurrency or self.max_workers * 2
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self.max_workers == 1:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="watermark-render")
+            self._render = functools.partial(_render_job_in_memory, self.service.image_processor)
+        else:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                                 initargs=(self.config,))
+            self._render = _render_in_memory_in_worker
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """等待执行器中的任务结束并关闭执行器。"""
+        await asyncio.to_thread(self._executor.shutdown, True, cancel_futures=True)
+
+    def _write_output(self, output_path: str, data: bytes, offset: tuple, is_photo: bool):
+        with open(output_path, 'wb') as f:
+            f.write(data)
+        if not is_photo and self.config.RENDER_MODE == "cropped" and self.service.image_processor.encoder.format != "png":
+            write_offset_sidecar(output_path, offset, (self.config.CANVAS_WIDTH, self.config.CANVAS_HEIGHT))
+
+    async def run_job(self, index: int, job: dict) -> JobResult:
+        """
+        处理单个任务（generate_watermark 或照片合成的关键字参数字典），失败时返回失败的 JobResult 而不是抛出异常。
+        """
+        async with self._semaphore:
+            start = time.perf_counter()
+            output_path = job.get("output_path")
+            photo_data = None
+            if job.get("photo_path"):
+                try:
+                    photo_data = await asyncio.to_thread(_read_file, job["photo_path"])
+                except OSError as e:
+                    return JobResult(index, output_path, False, f"无法读取照片 '{job['photo_path']}': {e}",
+                                     time.perf_counter() - start)
+
+            loop = asyncio.get_running_loop()
+            result, data, offset = await loop.run_in_executor(self._executor, self._render, index, job, photo_data)
+            if result.metrics and self.service.image_processor:
+                self.service.image_processor.metrics.merge(result.metrics)
+            if result.success and data is not None:
+                try:
+                    await asyncio.to_thread(self._write_output, output_path, data, offset, photo_data is not None)
+                except OSError as e:
+                    result.success, result.error = False, f"无法写入 '{output_path}': {e}"
+            result.elapsed = time.perf_counter() - start
+            return result
+
+    async def generate_watermark(self, city: str, location: str, camera: str, lens: str, output_path: str,
+                                 font_size: int = None, signature_logo_width: int = None) -> bool:
+        """WatermarkService.generate_watermark 的异步版本，返回 True 表示成功，False 表示失败。"""
+        job = {"city": city, "location": location, "camera": camera, "lens": lens, "output_path": output_path,
+               "font_size": font_size, "signature_logo_width": signature_logo_width}
+        result = await self.run_job(0, job)
+        if result.success:
+            logger.info(f"水印图片已成功生成并保存到: {output_path}")
+        else:
+            logger.error(f"生成水印失败: {result.error}")
+        return result.success
+
+    async def iter_batch(self, jobs):
+        """
+        批量处理任务，按完成顺序逐个产出 JobResult（用 JobResult.index 对应输入顺序）。
+        jobs 可以是普通可迭代对象或异步可迭代对象，按需读取，同时在途的任务不超过 max_concurrency 个。
+        调用方提前停止迭代时取消尚未完成的任务。
+        """
+        if hasattr(jobs, "__aiter__"):
+            job_iterator = jobs.__aiter__()
+            next_job = job_iterator.__anext__
+        else:
+            job_iterator = iter(jobs)
+
+            async def next_job():
+                try:
+                    return next(job_iterator)
+                except StopIteration:
+                    raise StopAsyncIteration
+
+        pending = set()
+        index, exhausted = 0, False
+        try:
+            while True:
+                while not exhausted and len(pending) < self.max_concurrency:
+                    try:
+                        job = await next_job()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    pending.add(asyncio.ensure_future(self.run_job(index, job)))
+                    index += 1
+                if not pending:
+                    return
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def generate_batch(self, jobs) -> list:
+        """批量处理任务，返回与输入顺序一致的 JobResult 列表。"""
+        results = [result async for result in self.iter_batch(jobs)]
+        results.sort(key=lambda result: result.index)
+        failed = sum(1 for result in results if not result.success)
+        logger.info(f"异步批量渲染完成：成功 {len(results) - failed} 条，失败 {failed} 条。")
+        return results
+
+async def aiter_manifest(manifest_path: str):
+    """
+    在后台线程中分块读取任务清单，逐个产出 (行号, 记录字典)，格式与 read_manifest 相同。
+    读取下一块的同时事件循环可以继续调度渲染和写出。
+    """
+    records = read_manifest(manifest_path)
+    while True:
+        chunk = await asyncio.to_thread(_read_manifest_chunk, records, MANIFEST_CHUNK_SIZE)
+        if not chunk:
+            return
+        for item in chunk:
+            yield item
@@ -0,0 +1,80 @@
+import io
+import os
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+from domain.image_processor import ImageProcessor
+from domain.exceptions import ServiceBusyError
+from utils.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+class RenderPool:
+    """
+    预热的 ImageProcessor 池，供多线程的渲染服务使用。
+    每个实例同一时刻只借给一个线程，并配有一个可复用的编码缓冲区；
+    正在渲染和排队等待的请求总数不超过 size + max_pending，超出时 lease 立即抛出 ServiceBusyError。
+    """
+    def __init__(self, service, size: int = None, max_pending: int = None):
+        self.service = service
+        config = service.config
+        size = config.SERVER_WORKERS if size is None else size
+        if not size or size <= 0:
+            size = os.cpu_count() or 1
+        self.size = size
+        self.max_pending = config.SERVER_QUEUE_SIZE if max_pending is None else max_pending
+
+        # 服务自带的实例作为第一个，其余按同一份配置创建
+        processors = [service.image_processor] + [ImageProcessor(config) for _ in range(size - 1)]
+        self._idle = queue.LifoQueue() # 后进先出，优先复用缓存最热的实例
+        for processor in processors:
+            self._idle.put((processor, io.BytesIO()))
+        self._processors = processors
+        self._admission = threading.BoundedSemaphore(size + self.max_pending)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.rejected = 0
+
+    def warm_up(self):
+        """为所有实例加载字体和 Logo，服务开始接受请求前调用。"""
+        for processor in self._processors:
+            processor.warm_up()
+        logger.info(f"渲染池已预热 {self.size} 个实例，最多排队 {self.max_pending} 个请求")
+
+    @contextmanager
+    def lease(self):
+        """
+        借出一个空闲的 (ImageProcessor, BytesIO)，用于 with 语句，退出时归还。
+        所有实例都在忙时排队等待；等待的请求已达上限时抛出 ServiceBusyError。
+        """
+        if not self._admission.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise ServiceBusyError(f"渲染队列已满（{self.size} 个实例忙碌，{self.max_pending} 个请求排队）")
+        with self._lock:
+            self._in_flight += 1
+        try:
+            item = self._idle.get()
+            try:
+                yield item
+            finally:
+                self._idle.put(item)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._admission.release()
+
+    def status(self) -> dict:
+        """当前的实例数、正在处理（含排队）的请求数和被拒绝的请求数。"""
+        with self._lock:
+            return {"workers": self.size, "max_pending": self.max_pending,
+                    "in_flight": self._in_flight, "idle": self._idle.qsize(), "rejected": self.rejected}
+
+    def export_metrics(self) -> Metrics:
+        """汇总所有实例的指标，返回新的 Metrics 对象。"""
+        merged = Metrics(enabled=True)
+        for processor in self._processors:
+            merged.merge(processor.export_metrics().snapshot())
+        merged.increment("server_rejected_requests", self.status()["rejected"])
+        return merged
@@ -1,14 +1,58 @@
+import os
 import logging
+import threading
+from collections import deque
 from domain.config_loader import load_config
 from domain.image_processor import ImageProcessor
+from domain.batch import JobResult, render_job
 from domain.exceptions import WatermarkGeneratorError, ConfigurationError, FileProcessingError, ImageProcessingError
 
 logger = logging.getLogger(__name__)
 
+# 任务数未知（迭代器）时每个批次的任务数，每个任务渲染耗时远大于进程间传递一个批次的开销
+STREAM_CHUNKSIZE = 4
+
+# 每个工作进程各自持有的 ImageProcessor，由 _init_worker 在进程启动时创建一次
+_worker_processor = None
+
+def _init_worker(config):
+    """工作进程初始化函数：创建 ImageProcessor，字体和 Logo 在处理第一个任务时加载，之后该进程的所有任务复用此实例。"""
+    global _worker_processor
+    _worker_processor = ImageProcessor(config)
+
+def _render_in_worker(indexed_job):
+    """在工作进程中渲染单个任务。"""
+    index, job = indexed_job
+    if _worker_processor is None:
+        return JobResult(index, job.get("output_path"), False, "工作进程未初始化 ImageProcessor")
+    result = render_job(_worker_processor, index, job)
+    if _worker_processor.metrics.enabled:
+        # 把本任务的指标增量随结果带回主进程汇总
+        result.metrics = _worker_processor.metrics.drain()
+    return result
+
+def _render_chunk_in_worker(chunk):
+    """在工作进程中依次渲染一个批次的 (序号, 任务)。"""
+    return [_render_in_worker(indexed_job) for indexed_job in chunk]
+
+def _iter_chunks(jobs, size: int):
+    """把任务按 size 个一组打包为 (序号, 任务) 列表，按需读取 jobs。"""
+    chunk = []
+    for indexed_job in enumerate(jobs):
+        chunk.append(indexed_job)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
 class WatermarkService:
     def __init__(self):
         self.config = None
         self.image_processor = None
+        # GUI 的渲染队列和预览在各自的工作线程中共用同一个 ImageProcessor，
+        # 字体对象和绘制过程不是线程安全的，两者的渲染通过此锁依次进行
+        self._render_lock = threading.Lock()
         self._load_dependencies()
 
     def _load_dependencies(self):
@@ -27,6 +71,21 @@ class WatermarkService:
             logger.critical(f"初始化水印服务时发生未知错误: {e}")
             raise WatermarkGeneratorError(f"初始化失败: {e}")
 
+    def warm_up_in_background(self):
+        """在后台线程中预加载字体和 Logo，失败只记录日志，错误会在实际渲染时再次报告。返回该线程。"""
+        if not self.image_processor:
+            return None
+
+        def warm_up():
+            try:
+                self.image_processor.warm_up()
+            except Exception as e:
+                logger.warning(f"预加载字体和 Logo 失败: {e}")
+
+        thread = threading.Thread(target=warm_up, name="asset-warm-up", daemon=True)
+        thread.start()
+        return thread
+
     def generate_watermark(self, city: str, location: str, camera: str, lens: str, output_path: str,
                            font_size: int = None, signature_logo_width: int = None) -> bool:
         """
@@ -39,15 +98,16 @@ class WatermarkService:
 
         try:
             logger.info(f"开始生成水印：城市={city}, 地点={location}, 相机={camera}, 镜头={lens}, 输出={output_path}")
-            self.image_processor.generate_watermark(
-                city=city,
-                location=location,
-                camera=camera,
-                lens=lens,
-                output_path=output_path,
-                font_size=font_size,
-                signature_logo_width=signature_logo_width
-            )
+            with self._render_lock:
+                self.image_processor.generate_watermark(
+                    city=city,
+                    location=location,
+                    camera=camera,
+                    lens=lens,
+                    output_path=output_path,
+                    font_size=font_size,
+                    signature_logo_width=signature_logo_width
+                )
             logger.info("水印生成成功。")
             return True
         except WatermarkGeneratorError as e:
@@ -56,3 +116,99 @@ class WatermarkService:
         except Exception as e:
             logger.error(f"生成水印时发生意外错误: {e}")
             return False
+
+    def render_preview(self, city: str, location: str, camera: str, lens: str, width: int,
+                       font_size: int = None, signature_logo_width: int = None):
+        """
+        渲染宽度为 width 的低分辨率预览图，不写入文件。
+        可在后台线程中调用，与 generate_watermark 互斥。返回 RGBA 图片，失败时返回 None。
+        """
+        if not self.image_processor:
+            return None
+        try:
+            with self._render_lock:
+                return self.image_processor.render_preview(city, location, camera, lens, width, font_size=font_size,
+                                                           signature_logo_width=signature_logo_width)
+        except WatermarkGeneratorError as e:
+            logger.warning(f"渲染预览失败: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"渲染预览时发生意外错误: {e}")
+            return None
+
+    def _resolve_worker_count(self, max_workers: int = None) -> int:
+        """确定进程池大小：参数优先，其次为配置 BATCH_WORKERS，0 表示使用全部 CPU 核心。"""
+        if max_workers is None:
+            max_workers = self.config.BATCH_WORKERS
+        if not max_workers or max_workers <= 0:
+            max_workers = os.cpu_count() or 1
+        return max_workers
+
+    def iter_batch(self, jobs, max_workers: int = None, chunksize: int = None):
+        """
+        批量渲染任务，按输入顺序逐个产出 JobResult。
+        jobs 为 ImageProcessor.generate_watermark 的关键字参数字典的列表或迭代器，
+        含 photo_path 的任务改为调用 ImageProcessor.composite_onto_photo。
+        迭代器按渲染进度读取，不会一次读完，适合直接传入逐行读取清单的生成器。
+        max_workers 为 1 时在当前进程中串行渲染，否则分发到进程池，
+        每个工作进程在初始化时构建一次自己的 ImageProcessor。
+        """
+        # 列表可以预先确定进程数和批次大小，迭代器的任务数未知
+        count = len(jobs) if isinstance(jobs, (list, tuple)) else None
+        if count == 0:
+            return
+
+        max_workers = self._resolve_worker_count(max_workers)
+        if count is not None:
+            max_workers = min(max_workers, count)
+        if max_workers == 1:
+            if not self.image_processor:
+                raise WatermarkGeneratorError("ImageProcessor 未初始化。")
+            if count is None or any(job.get("photo_path") for job in jobs):
+                # 照片合成任务在后台线程预解码，解码与合成/编码重叠进行；迭代器中可能有照片任务，同样走这里
+                yield from self.image_processor.iter_photo_jobs(jobs)
+            else:
+                for index, job in enumerate(jobs):
+                    yield render_job(self.image_processor, index, job)
+            return
+
+        if chunksize is None:
+            # 每个工作进程大约分到 4 个批次，在调度开销和负载均衡之间折中
+            chunksize = max(1, count // (max_workers * 4)) if count is not None else STREAM_CHUNKSIZE
+
+        # 进程池模块只在并行渲染时才导入，不拖慢单任务和 GUI 的启动
+        from concurrent.futures import ProcessPoolExecutor
+
+        logger.info(f"开始并行批量渲染：任务数={count if count is not None else '按需读取'}, "
+                    f"进程数={max_workers}, chunksize={chunksize}")
+        executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                       initargs=(self.config,))
+        pending = deque()
+        try:
+            for chunk in _iter_chunks(jobs, chunksize):
+                pending.append(executor.submit(_render_chunk_in_worker, chunk))
+                # 在途批次数有上限，任务按渲染进度读取和提交
+                while len(pending) >= max_workers * 2:
+                    yield from self._collect_chunk(pending.popleft())
+            while pending:
+                yield from self._collect_chunk(pending.popleft())
+        finally:
+            # 调用方提前停止迭代时（如 --fail-fast），取消尚未开始的任务
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _collect_chunk(self, future):
+        """等待一个批次完成，把工作进程带回的指标并入主进程后逐个产出结果。"""
+        for result in future.result():
+            if result.metrics and self.image_processor:
+                self.image_processor.metrics.merge(result.metrics)
+            yield result
+
+    def generate_batch(self, jobs, max_workers: int = None, chunksize: int = None) -> list:
+        """
+        批量渲染任务并返回与输入顺序一致的 JobResult 列表。
+        单个任务失败不会中断整个批次，错误信息记录在对应的 JobResult.error 中。
+        """
+        results = list(self.iter_batch(jobs, max_workers=max_workers, chunksize=chunksize))
+        failed = sum(1 for result in results if not result.success)
+        logger.info(f"批量渲染完成：成功 {len(results) - failed} 条，失败 {failed} 条。")
+        return results
@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+
+# 允许直接以 python benchmarks/bench_compositor.py 方式运行
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import PIL
+from PIL import Image
+from domain.config_loader import load_config
+from domain.image_processor import ImageProcessor
+from domain.alpha_compositor import NUMPY_AVAILABLE, NumpyCompositor
+from benchmarks.bench_pipeline import prepare_test_assets, summarize, _parse_canvas
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="对比 NumPy 合成器与 Image.paste 贴 Logo 和把水印合成到照片上的耗时，并校验各场景的输出逐字节一致。")
+    parser.add_argument("-n", "--repeat", type=int, default=20, help="每项重复测量的次数 (默认: 20)")
+    parser.add_argument("--photo", default="6000x4000,3000x2000", help="照片尺寸，逗号分隔 (默认: 6000x4000,3000x2000)")
+    parser.add_argument("--config-assets", action="store_true",
+                        help="使用配置中的字体和 Logo，而不是内置的测试字体和合成 Logo")
+    parser.add_argument("--json", help="把结果保存为 JSON 文件")
+    return parser.parse_args(argv)
+
+def time_paste(paste, img: Image.Image, overlay: Image.Image, position: tuple, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        paste(img, overlay, position)
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+def pillow_paste(img, overlay, position):
+    img.paste(overlay, position, overlay)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if not NUMPY_AVAILABLE:
+        print("未安装 NumPy，无法测试 NumPy 合成器 (pip install numpy)", file=sys.stderr)
+        return 2
+    # 随机像素和越界位置的逐字节校验见 tests/test_alpha_compositor.py，这里只校验实际测量的场景
+    compositor = NumpyCompositor()
+    mismatches = 0
+    results = {}
+
+    with tempfile.TemporaryDirectory(prefix="watermark_bench_") as temp_dir:
+        config = load_config()
+        if not args.config_assets:
+            config.FONT_PATH, config.LOCATION_LOGO_PATH, config.SIGNATURE_LOGO_PATH = prepare_test_assets(temp_dir)
+        config.OUTPUT_CACHE_DIR = None
+        config.COMPOSITOR = "pillow"
+        processor = ImageProcessor(config)
+        print(f"Python {platform.python_version()}, Pillow {PIL.__version__}, 每项重复 {args.repeat} 次")
+        print(f"{'场景':<36}{'Pillow p50':>12}{'NumPy p50':>12}{'节省':>8}")
+
+        cases = []
+        # 贴 Logo：签名 Logo 缩放到常用宽度后贴到透明画布上
+        logo = processor._get_scaled_logo(processor.signature_logo, (600, 200))
+        canvas = Image.new("RGBA", (config.CANVAS_WIDTH, config.CANVAS_HEIGHT), (255, 255, 255, 0))
+        cases.append(("logo@canvas", canvas, logo, (canvas.width - logo.width - 40, 40)))
+        # 照片合成：按照片宽度缩放的紧凑水印贴到照片底部
+        overlay = processor.render_overlay(config.DEFAULT_CITY, config.DEFAULT_LOCATION,
+                                           config.DEFAULT_CAMERA, config.DEFAULT_LENS)
+        for photo_size in args.photo.split(","):
+            width, height = _parse_canvas(photo_size)
+            photo = Image.new("RGB", (width, height), (90, 120, 150))
+            overlay_img, (offset_x, offset_y), canvas_height = processor._scale_overlay(overlay, width)
+            cases.append((f"overlay@{photo_size}", photo, overlay_img, (offset_x, height - canvas_height + offset_y)))
+
+        for name, target, layer, position in cases:
+            expected, actual = target.copy(), target.copy()
+            pillow_paste(expected, layer, position)
+            compositor.paste(actual, layer, position)
+            if expected.tobytes() != actual.tobytes():
+                mismatches += 1
+                print(f"不一致: {name}", file=sys.stderr)
+            pillow = time_paste(pillow_paste, target.copy(), layer, position, args.repeat)
+            numpy = time_paste(compositor.paste, target.copy(), layer, position, args.repeat)
+            saving = 1 - numpy["p50_ms"] / pillow["p50_ms"] if pillow["p50_ms"] > 0 else 0.0
+            results[name] = {"pillow": pillow, "numpy": numpy, "p50_saving": saving}
+            print(f"{name:<36}{pillow['p50_ms']:>12.2f}{numpy['p50_ms']:>12.2f}{saving:>8.0%}")
+
+    print("\n像素校验: " + ("两种实现输出一致" if not mismatches else f"{mismatches} 项不一致"))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"python": platform.python_version(), "pillow": PIL.__version__,
+                       "platform": platform.platform(), "repeat": args.repeat, "mismatches": mismatches,
+                       "results": results}, f, indent=4, ensure_ascii=False)
+        print(f"结果已保存到 {args.json}")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+# 允许直接以 python benchmarks/bench_encoders.py 方式运行
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from domain.config_loader import load_config
+from domain.image_processor import ImageProcessor
+from domain.image_encoder import EncoderSettings
+
+# 对比的编码设置：(名称, EncoderSettings)
+ENCODER_MATRIX = [
+    ("png level=0", EncoderSettings("png", compress_level=0)),
+    ("png level=1", EncoderSettings("png", compress_level=1)),
+    ("png level=3", EncoderSettings("png", compress_level=3)),
+    ("png level=6 (默认)", EncoderSettings("png", compress_level=6)),
+    ("png level=9", EncoderSettings("png", compress_level=9)),
+    ("png level=9 optimize", EncoderSettings("png", compress_level=9, optimize=True)),
+    ("png P256 level=1", EncoderSettings("png", compress_level=1, quantize_colors=256)),
+    ("png P256 level=6", EncoderSettings("png", compress_level=6, quantize_colors=256)),
+    ("png P64 level=6", EncoderSettings("png", compress_level=6, quantize_colors=64)),
+    ("webp lossless method=0", EncoderSettings("webp", webp_method=0)),
+    ("webp lossless method=4", EncoderSettings("webp", webp_method=4)),
+    ("webp lossless method=6", EncoderSettings("webp", webp_method=6)),
+    ("tiff deflate", EncoderSettings("tiff", tiff_compression="tiff_deflate")),
+    ("tiff lzw", EncoderSettings("tiff", tiff_compression="tiff_lzw")),
+    ("tiff raw", EncoderSettings("tiff", tiff_compression="raw")),
+]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="对比不同编码设置下水印图片的大小和编码耗时。")
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="每种设置重复编码的次数 (默认: 5)")
+    parser.add_argument("--cropped", action="store_true", help="编码裁剪后的紧凑图层而不是完整画布")
+    parser.add_argument("--json", help="把结果另存为 JSON 文件")
+    return parser.parse_args(argv)
+
+def benchmark_encoder(img, settings: EncoderSettings, repeat: int) -> dict:
+    """对同一张图片重复编码，返回字节数和耗时统计。"""
+    timings = []
+    size = 0
+    buffer = io.BytesIO()
+    for _ in range(repeat):
+        buffer.seek(0)
+        buffer.truncate()
+        start = time.perf_counter()
+        settings.encode(img, buffer)
+        timings.append(time.perf_counter() - start)
+        size = buffer.tell()
+    return {
+        "bytes": size,
+        "mean_ms": statistics.mean(timings) * 1000,
+        "min_ms": min(timings) * 1000,
+        "megapixels_per_s": img.width * img.height / 1e6 / min(timings)
+    }
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    config = load_config()
+    processor = ImageProcessor(config)
+    overlay = processor.render_overlay(config.DEFAULT_CITY, config.DEFAULT_LOCATION,
+                                       config.DEFAULT_CAMERA, config.DEFAULT_LENS)
+    img = overlay.to_compact()[0] if args.cropped else overlay.to_full_canvas()
+    print(f"图片尺寸: {img.width}x{img.height}，每种设置编码 {args.repeat} 次\n")
+
+    results = []
+    print(f"{'设置':<26}{'字节数':>12}{'平均(ms)':>12}{'最快(ms)':>12}{'MP/s':>10}")
+    for name, settings in ENCODER_MATRIX:
+        try:
+            result = benchmark_encoder(img, settings, args.repeat)
+        except (OSError, ValueError) as e:
+            # 例如 Pillow 未编译 WebP 支持
+            print(f"{name:<26}跳过: {e}")
+            continue
+        result["name"] = name
+        result["settings"] = repr(settings)
+        results.append(result)
+        print(f"{name:<26}{result['bytes']:>12,}{result['mean_ms']:>12.1f}"
+              f"{result['min_ms']:>12.1f}{result['megapixels_per_s']:>10.1f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"size": list(img.size), "repeat": args.repeat, "results": results},
+                      f, indent=4, ensure_ascii=False)
+        print(f"\n结果已保存到 {args.json}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
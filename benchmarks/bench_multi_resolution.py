@@ -0,0 +1,100 @@
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+import platform
+import tempfile
+
+# 允许直接以 python benchmarks/bench_multi_resolution.py 方式运行
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import PIL
+from domain.config_loader import load_config, parse_widths
+from domain.image_processor import ImageProcessor
+from benchmarks.bench_pipeline import prepare_test_assets, _parse_canvas
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="对比为每种画布宽度各建一个 ImageProcessor 与用 render_sizes 一次输出多种尺寸的耗时，"
+                    "并校验两种方式的像素一致。")
+    parser.add_argument("-n", "--jobs", type=int, default=20, help="任务数 (默认: 20)")
+    parser.add_argument("--canvas", default="3000x764", help="原始画布尺寸 (默认: 3000x764)")
+    parser.add_argument("--widths", default="3000,4000,6000", help="输出宽度，逗号分隔 (默认: 3000,4000,6000)")
+    parser.add_argument("--font-size", type=int, default=40, help="原始画布上的字号 (默认: 40)")
+    parser.add_argument("--config-assets", action="store_true",
+                        help="使用配置中的字体和 Logo，而不是内置的测试字体和合成 Logo")
+    parser.add_argument("--json", help="把结果保存为 JSON 文件")
+    return parser.parse_args(argv)
+
+def make_jobs(count: int):
+    for i in range(count):
+        yield "GUANGZHOU", "HUANGPU", f"CAMERA {i}", "SIGMA 24-70MM"
+
+def separate_processors(config, widths, font_size: int):
+    """为每种宽度复制一份按比例换算的配置并各建一个 ImageProcessor，即没有多分辨率模式时的做法。"""
+    processors = {}
+    for width in widths:
+        scale = width / config.CANVAS_WIDTH
+        scaled = copy.copy(config)
+        scaled.CANVAS_WIDTH = width
+        scaled.CANVAS_HEIGHT = max(1, round(config.CANVAS_HEIGHT * scale))
+        scaled.DEFAULT_FONT_SIZE = max(1, round(config.DEFAULT_FONT_SIZE * scale))
+        scaled.DEFAULT_SIGNATURE_LOGO_WIDTH = max(1, round(config.DEFAULT_SIGNATURE_LOGO_WIDTH * scale))
+        for name in ("PADDING", "LOCATION_LOGO_TEXT_SPACING", "LOCATION_VERTICAL_OFFSET",
+                     "LOCATION_TEXT_HORIZONTAL_OFFSET"):
+            setattr(scaled, name, round(getattr(config, name) * scale))
+        processors[width] = (ImageProcessor(scaled), max(1, round(font_size * scale)))
+    return processors
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    widths = parse_widths(args.widths)
+    with tempfile.TemporaryDirectory(prefix="watermark_bench_") as temp_dir:
+        config = load_config()
+        if not args.config_assets:
+            config.FONT_PATH, config.LOCATION_LOGO_PATH, config.SIGNATURE_LOGO_PATH = prepare_test_assets(temp_dir)
+        config.OUTPUT_CACHE_DIR = None
+        config.CANVAS_WIDTH, config.CANVAS_HEIGHT = _parse_canvas(args.canvas)
+        print(f"Python {platform.python_version()}, Pillow {PIL.__version__}, {args.jobs} 个任务, 宽度 {widths}")
+
+        # 各自独立的实例：每种尺寸各自加载字体、解码 Logo
+        start = time.perf_counter()
+        processors = separate_processors(config, widths, args.font_size)
+        for job in make_jobs(args.jobs):
+            for processor, font_size in processors.values():
+                processor.render_image(*job, font_size=font_size)
+        separate = time.perf_counter() - start
+
+        # 多分辨率模式：一个实例，各尺寸的视图共享字体、Logo 原图和缓存
+        start = time.perf_counter()
+        processor = ImageProcessor(config)
+        for job in make_jobs(args.jobs):
+            processor.render_sizes(*job, widths, font_size=args.font_size)
+        shared = time.perf_counter() - start
+
+        # 逐张比较前几个任务的输出，完整画布较大，不保留全部结果
+        mismatches = 0
+        for job in make_jobs(min(args.jobs, 3)):
+            actual = processor.render_sizes(*job, widths, font_size=args.font_size)
+            for width, (separate_processor, font_size) in processors.items():
+                expected_img, expected_offset = separate_processor.render_image(*job, font_size=font_size)
+                actual_img, actual_offset = actual[width]
+                if expected_offset != actual_offset or expected_img.tobytes() != actual_img.tobytes():
+                    mismatches += 1
+
+    print(f"{'独立实例':<12}{separate * 1000:>10.1f} ms")
+    print(f"{'render_sizes':<12}{shared * 1000:>10.1f} ms  (节省 {1 - shared / separate:.0%})")
+    print("\n像素校验: " + ("两种方式输出一致" if not mismatches else f"{mismatches} 张不一致"))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"python": platform.python_version(), "pillow": PIL.__version__,
+                       "platform": platform.platform(), "jobs": args.jobs, "widths": widths,
+                       "separate_ms": separate * 1000, "render_sizes_ms": shared * 1000,
+                       "mismatches": mismatches}, f, indent=4, ensure_ascii=False)
+        print(f"结果已保存到 {args.json}")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
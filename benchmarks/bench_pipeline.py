@@ -0,0 +1,244 @@
+import io
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+
+try:
+    import resource
+except ImportError: # Windows 没有 resource 模块，不报告峰值内存
+    resource = None
+
+# 允许直接以 python benchmarks/bench_pipeline.py 方式运行
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import PIL
+from PIL import Image, ImageDraw, ImageFont
+from domain.config_loader import load_config
+from domain.image_processor import ImageProcessor
+
+# 各阶段的名称，顺序即报告中的顺序
+STAGES = ["font_load", "text_measure", "logo_resize", "draw", "paste", "encode", "total_cold"]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="分阶段测量水印渲染流水线的耗时（字体加载、文本测量、Logo 缩放、绘制、粘贴、编码），"
+                    "并可与保存的基线结果对比。")
+    parser.add_argument("-n", "--repeat", type=int, default=10, help="每个阶段重复测量的次数 (默认: 10)")
+    parser.add_argument("--canvas", default="2000x382,4000x764",
+                        help="画布尺寸列表，逗号分隔 (默认: 2000x382,4000x764)")
+    parser.add_argument("--font-sizes", default="40,120", help="字号列表，逗号分隔 (默认: 40,120)")
+    parser.add_argument("--batch-sizes", default="1,20", help="批量吞吐测试的任务数列表，逗号分隔 (默认: 1,20)")
+    parser.add_argument("--config-assets", action="store_true",
+                        help="使用配置中的字体和 Logo，而不是内置的测试字体和合成 Logo")
+    parser.add_argument("--json", help="把结果保存为 JSON 文件，可作为之后对比的基线")
+    parser.add_argument("--baseline", help="与此前保存的 JSON 结果对比，p50 变慢超过阈值时返回非零退出码")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="判定为性能回退的 p50 变慢比例 (默认: 0.15，即 15%%)")
+    return parser.parse_args(argv)
+
+def _parse_list(text: str, convert=int):
+    return [convert(item.strip()) for item in text.split(",") if item.strip()]
+
+def _parse_canvas(text: str):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+def prepare_test_assets(directory: str):
+    """
+    生成与环境无关的测试素材：Pillow 自带的字体（写出为 .ttf 文件）和两张合成的半透明 Logo，
+    返回 (字体路径, 地点 Logo 路径, 签名 Logo 路径)。
+    """
+    font_path = os.path.join(directory, "bench_font.ttf")
+    with open(font_path, 'wb') as f:
+        f.write(ImageFont.load_default(10).path.getvalue())
+
+    location_logo = Image.new("RGBA", (256, 256), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(location_logo)
+    draw.ellipse((16, 16, 240, 240), fill=(255, 255, 255, 200), outline=(255, 255, 255, 255), width=12)
+    draw.polygon([(128, 48), (200, 208), (56, 208)], fill=(255, 255, 255, 96))
+    location_logo_path = os.path.join(directory, "bench_location_logo.png")
+    location_logo.save(location_logo_path)
+
+    signature_logo = Image.new("RGBA", (1200, 400), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(signature_logo)
+    for i in range(12):
+        x = 40 + i * 95
+        draw.arc((x, 60, x + 160, 340), 200, 340, fill=(255, 255, 255, 160 + i * 8), width=14)
+    signature_logo_path = os.path.join(directory, "bench_signature_logo.png")
+    signature_logo.save(signature_logo_path)
+    return font_path, location_logo_path, signature_logo_path
+
+def percentile(values, fraction: float) -> float:
+    """最近秩法百分位数。"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+def summarize(timings) -> dict:
+    return {
+        "p50_ms": percentile(timings, 0.50) * 1000,
+        "p95_ms": percentile(timings, 0.95) * 1000,
+        "mean_ms": statistics.mean(timings) * 1000,
+        "samples": len(timings)
+    }
+
+def peak_rss_mb():
+    """进程的峰值常驻内存 (MB)，不支持时返回 None。"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+def _clear_caches(processor: ImageProcessor):
+    for cache in (processor.font_cache, processor.logo_cache, processor.text_cache, processor.block_cache):
+        cache.clear()
+
+def benchmark_stages(processor: ImageProcessor, font_size: int, repeat: int, output_dir: str) -> dict:
+    """逐阶段测量一次渲染，每次测量前清空相关缓存，得到冷启动下各阶段的耗时。"""
+    config = processor.config
+    location_text, info_text = processor._compose_texts(config.DEFAULT_CITY, config.DEFAULT_LOCATION,
+                                                        config.DEFAULT_CAMERA, config.DEFAULT_LENS)
+    timings = {stage: [] for stage in STAGES}
+    buffer = io.BytesIO()
+    output_path = os.path.join(output_dir, "bench_stage.png")
+
+    for _ in range(repeat):
+        _clear_caches(processor)
+        elapsed, _ = _timed(lambda: processor._get_font(font_size))
+        timings["font_load"].append(elapsed)
+        font = processor._get_font(font_size)
+
+        def measure_texts():
+            processor._get_text_dimensions(info_text, font)
+            return processor._get_text_dimensions(location_text, font)[1]
+        elapsed, text_height = _timed(measure_texts)
+        timings["text_measure"].append(elapsed)
+
+        def resize_logos():
+            processor._resize_logo_to_text_height(processor.location_logo, text_height)
+            logo = processor.signature_logo
+            if logo:
+                width = config.DEFAULT_SIGNATURE_LOGO_WIDTH
+                processor._get_scaled_logo(logo, (width, int(logo.height * width / logo.width)))
+        elapsed, _ = _timed(resize_logos)
+        timings["logo_resize"].append(elapsed)
+
+        # 文本蒙版和 Logo 已缓存，此时只剩内容块的绘制
+        elapsed, overlay = _timed(lambda: processor.render_overlay(
+            config.DEFAULT_CITY, config.DEFAULT_LOCATION, config.DEFAULT_CAMERA, config.DEFAULT_LENS,
+            font_size=font_size))
+        timings["draw"].append(elapsed)
+
+        elapsed, img = _timed(overlay.to_full_canvas)
+        timings["paste"].append(elapsed)
+
+        buffer.seek(0)
+        buffer.truncate()
+        elapsed, _ = _timed(lambda: processor.encoder.encode(img, buffer))
+        timings["encode"].append(elapsed)
+
+        _clear_caches(processor)
+        elapsed, _ = _timed(lambda: processor.generate_watermark(
+            config.DEFAULT_CITY, config.DEFAULT_LOCATION, config.DEFAULT_CAMERA, config.DEFAULT_LENS,
+            output_path, font_size=font_size))
+        timings["total_cold"].append(elapsed)
+
+    return {stage: summarize(values) for stage, values in timings.items()}
+
+def benchmark_batch(processor: ImageProcessor, font_size: int, batch_size: int, output_dir: str) -> dict:
+    """连续渲染 batch_size 个文本各不相同的任务（缓存保持预热），测量单张延迟和吞吐量。"""
+    config = processor.config
+    timings = []
+    start = time.perf_counter()
+    for i in range(batch_size):
+        elapsed, _ = _timed(lambda: processor.generate_watermark(
+            f"CITY {i}", f"LOCATION {i}", config.DEFAULT_CAMERA, config.DEFAULT_LENS,
+            os.path.join(output_dir, f"bench_batch_{i}.png"), font_size=font_size))
+        timings.append(elapsed)
+    total = time.perf_counter() - start
+    result = summarize(timings)
+    result["throughput_per_s"] = batch_size / total if total > 0 else 0.0
+    return result
+
+def compare_with_baseline(results: dict, baseline_path: str, threshold: float) -> list:
+    """与基线对比 p50，返回 [(名称, 基线 ms, 当前 ms, 比例)] 中超过阈值的回退项。"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    print(f"\n与基线 {baseline_path} 对比 (p50):")
+    for name, current in results.items():
+        if name not in baseline:
+            continue
+        base_ms, current_ms = baseline[name]["p50_ms"], current["p50_ms"]
+        ratio = current_ms / base_ms if base_ms > 0 else float("inf")
+        marker = "  <-- 回退" if ratio > 1 + threshold else ""
+        print(f"  {name:<44}{base_ms:>10.2f}{current_ms:>10.2f}{ratio:>8.2f}x{marker}")
+        if marker:
+            regressions.append((name, base_ms, current_ms, ratio))
+    return regressions
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    canvases = [_parse_canvas(item) for item in args.canvas.split(",") if item.strip()]
+    font_sizes = _parse_list(args.font_sizes)
+    batch_sizes = _parse_list(args.batch_sizes)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="watermark_bench_") as temp_dir:
+        config = load_config()
+        if not args.config_assets:
+            config.FONT_PATH, config.LOCATION_LOGO_PATH, config.SIGNATURE_LOGO_PATH = prepare_test_assets(temp_dir)
+        # 基准测试不使用输出缓存，始终输出完整画布
+        config.OUTPUT_CACHE_DIR = None
+        config.RENDER_MODE = "full"
+
+        print(f"Python {platform.python_version()}, Pillow {PIL.__version__}, 每个阶段重复 {args.repeat} 次")
+        print(f"{'场景':<44}{'p50(ms)':>10}{'p95(ms)':>10}{'吞吐(张/秒)':>14}")
+        for width, height in canvases:
+            config.CANVAS_WIDTH, config.CANVAS_HEIGHT = width, height
+            processor = ImageProcessor(config)
+            for font_size in font_sizes:
+                scenario = f"{width}x{height}/font{font_size}"
+                for stage, summary in benchmark_stages(processor, font_size, args.repeat, temp_dir).items():
+                    name = f"{stage}@{scenario}"
+                    results[name] = summary
+                    print(f"{name:<44}{summary['p50_ms']:>10.2f}{summary['p95_ms']:>10.2f}")
+                for batch_size in batch_sizes:
+                    name = f"batch{batch_size}@{scenario}"
+                    summary = benchmark_batch(processor, font_size, batch_size, temp_dir)
+                    results[name] = summary
+                    print(f"{name:<44}{summary['p50_ms']:>10.2f}{summary['p95_ms']:>10.2f}"
+                          f"{summary['throughput_per_s']:>14.1f}")
+
+    rss = peak_rss_mb()
+    if rss is not None:
+        print(f"\n峰值常驻内存: {rss:.1f} MB")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"python": platform.python_version(), "pillow": PIL.__version__,
+                       "platform": platform.platform(), "repeat": args.repeat,
+                       "peak_rss_mb": rss, "results": results}, f, indent=4, ensure_ascii=False)
+        print(f"结果已保存到 {args.json}")
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} 项 p50 变慢超过 {args.threshold:.0%}")
+            return 1
+        print("\n未发现性能回退")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+
+# 允许直接以 python benchmarks/bench_preview.py 方式运行
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import PIL
+from domain.config_loader import load_config
+from domain.image_processor import ImageProcessor
+from interface.preview_worker import PreviewWorker
+from benchmarks.bench_pipeline import prepare_test_assets, summarize, _parse_canvas
+
+# GUI 预览的背景色（见 interface/gui.py），这里不导入 GUI 模块，无 Tkinter 的机器上也能运行
+PREVIEW_BACKGROUND = (64, 64, 64, 255)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="模拟在 GUI 中逐字输入，测量水印预览从提交到渲染完成的延迟，以及 Tk 主线程提交请求的耗时。")
+    parser.add_argument("--canvas", default="4000x764,6000x1528", help="画布尺寸，逗号分隔 (默认: 4000x764,6000x1528)")
+    parser.add_argument("--text", default="SONY A7R5 / SIGMA 24-70MM F2.8 DG DN ART",
+                        help="逐字输入的文本，每个字符一次预览 (默认: 一个较长的相机型号)")
+    parser.add_argument("--width", type=int, default=560, help="预览宽度，与 GUI 一致 (默认: 560)")
+    parser.add_argument("--target", type=float, default=50.0, help="延迟目标 (ms)，p95 超过时退出码为 1 (默认: 50)")
+    parser.add_argument("--config-assets", action="store_true",
+                        help="使用配置中的字体和 Logo，而不是内置的测试字体和合成 Logo")
+    parser.add_argument("--json", help="把结果保存为 JSON 文件")
+    return parser.parse_args(argv)
+
+class _Service:
+    """只提供 PreviewWorker 需要的 render_preview，直接调用 ImageProcessor。"""
+    def __init__(self, processor: ImageProcessor):
+        self.processor = processor
+
+    def render_preview(self, *args, **kwargs):
+        return self.processor.render_preview(*args, **kwargs)
+
+def typing_requests(text: str, field: str):
+    """逐字输入 text 时每次按键对应的 (城市, 地点, 相机, 镜头)，只有 field 一侧的文本在变化。"""
+    for end in range(1, len(text) + 1):
+        fields = {"city": "GUANGZHOU", "location": "HUANGPU", "camera": "SONY A7R5", "lens": "SIGMA 24-70MM"}
+        fields[field] = text[:end]
+        yield fields["city"], fields["location"], fields["camera"], fields["lens"]
+
+def measure(worker: PreviewWorker, requests) -> tuple:
+    """逐个提交预览请求并等待结果，返回 (端到端延迟列表, 主线程提交耗时列表)。"""
+    latencies, submit_costs = [], []
+    for texts in requests:
+        start = time.perf_counter()
+        request_id = worker.request(*texts)
+        submit_costs.append(time.perf_counter() - start)
+        while True:
+            result = worker.poll()
+            if result is not None and result.request_id == request_id:
+                latencies.append(result.latency)
+                break
+            time.sleep(0.0005)
+    return latencies, submit_costs
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = {}
+    worst_p95 = 0.0
+    with tempfile.TemporaryDirectory(prefix="watermark_bench_") as temp_dir:
+        config = load_config()
+        if not args.config_assets:
+            config.FONT_PATH, config.LOCATION_LOGO_PATH, config.SIGNATURE_LOGO_PATH = prepare_test_assets(temp_dir)
+        config.OUTPUT_CACHE_DIR = None
+
+        print(f"Python {platform.python_version()}, Pillow {PIL.__version__}, 每个场景 {len(args.text)} 次按键")
+        print(f"{'场景':<32}{'p50 (ms)':>10}{'p95 (ms)':>10}{'提交 p95 (ms)':>16}")
+        for canvas in args.canvas.split(","):
+            config.CANVAS_WIDTH, config.CANVAS_HEIGHT = _parse_canvas(canvas)
+            processor = ImageProcessor(config)
+            processor.warm_up()
+            worker = PreviewWorker(_Service(processor), args.width, PREVIEW_BACKGROUND)
+            # 预热未变化一侧的内容块和预览缩放缓存
+            measure(worker, typing_requests("W", "camera"))
+            scenarios = {
+                "right_side_typing": typing_requests(args.text, "camera"),
+                "left_side_typing": typing_requests(args.text, "location"),
+                "unchanged": [next(typing_requests(args.text, "camera"))] * len(args.text),
+            }
+            for scenario, requests in scenarios.items():
+                latencies, submit_costs = measure(worker, requests)
+                latency, submit = summarize(latencies), summarize(submit_costs)
+                name = f"{scenario}@{canvas}"
+                results[name] = {"latency": latency, "submit": submit}
+                worst_p95 = max(worst_p95, latency["p95_ms"])
+                print(f"{name:<32}{latency['p50_ms']:>10.2f}{latency['p95_ms']:>10.2f}{submit['p95_ms']:>16.3f}")
+            worker.shutdown()
+
+    met = worst_p95 <= args.target
+    print(f"\n延迟目标 {args.target:.0f} ms: " + ("达到" if met else f"未达到 (最差 p95 {worst_p95:.1f} ms)"))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"python": platform.python_version(), "pillow": PIL.__version__,
+                       "platform": platform.platform(), "target_ms": args.target, "results": results},
+                      f, indent=4, ensure_ascii=False)
+        print(f"结果已保存到 {args.json}")
+    return 0 if met else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
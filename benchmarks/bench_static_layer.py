@@ -0,0 +1,107 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+
+# 允许直接以 python benchmarks/bench_static_layer.py 方式运行
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import PIL
+from domain.config_loader import load_config
+from domain.image_processor import ImageProcessor
+from utils.lru_cache import LRUCache
+from benchmarks.bench_pipeline import prepare_test_assets, summarize, _parse_canvas
+
+# 批量任务的场景：地点固定、相机镜头逐条变化，或所有文本都逐条变化
+SCENARIOS = ("fixed_location", "all_varying")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="对比完整画布模式下按内容块渲染与在预渲染的静态图层（Logo 底图）上只绘制文本的单张耗时，"
+                    "并逐张校验两种方式的像素一致。")
+    parser.add_argument("-n", "--jobs", type=int, default=50, help="每个场景的任务数 (默认: 50)")
+    parser.add_argument("--canvas", default="3000x764", help="画布尺寸，逗号分隔 (默认: 3000x764)")
+    parser.add_argument("--font-size", type=int, default=40, help="字号 (默认: 40)")
+    parser.add_argument("--config-assets", action="store_true",
+                        help="使用配置中的字体和 Logo，而不是内置的测试字体和合成 Logo")
+    parser.add_argument("--json", help="把结果保存为 JSON 文件")
+    return parser.parse_args(argv)
+
+def make_jobs(scenario: str, count: int, tag: str):
+    """生成文本互不相同的任务，tag 区分两轮测量，使两轮都不命中文本和内容块缓存。"""
+    for i in range(count):
+        if scenario == "fixed_location":
+            yield "GUANGZHOU", "HUANGPU", f"CAMERA {tag}{i}", "SIGMA 24-70MM"
+        else:
+            yield f"CITY {tag}{i}", f"LOCATION {tag}{i}", f"CAMERA {tag}{i}", "SIGMA 24-70MM"
+
+def time_jobs(processor: ImageProcessor, jobs, font_size: int) -> list:
+    timings = []
+    for city, location, camera, lens in jobs:
+        start = time.perf_counter()
+        processor.render_image(city, location, camera, lens, font_size=font_size)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def verify(processor: ImageProcessor, static_cache: LRUCache, jobs, font_size: int) -> int:
+    """逐张比较两种渲染方式的像素，返回不一致的张数。"""
+    mismatches = 0
+    for city, location, camera, lens in jobs:
+        processor.static_layer_cache = None
+        expected, _ = processor.render_image(city, location, camera, lens, font_size=font_size)
+        processor.static_layer_cache = static_cache
+        actual, _ = processor.render_image(city, location, camera, lens, font_size=font_size)
+        if expected.tobytes() != actual.tobytes():
+            mismatches += 1
+    return mismatches
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = {}
+    mismatches = 0
+    with tempfile.TemporaryDirectory(prefix="watermark_bench_") as temp_dir:
+        config = load_config()
+        if not args.config_assets:
+            config.FONT_PATH, config.LOCATION_LOGO_PATH, config.SIGNATURE_LOGO_PATH = prepare_test_assets(temp_dir)
+        config.OUTPUT_CACHE_DIR = None
+        config.RENDER_MODE = "full"
+
+        print(f"Python {platform.python_version()}, Pillow {PIL.__version__}, 每个场景 {args.jobs} 个任务")
+        print(f"{'场景':<40}{'逐块 p50':>10}{'静态层 p50':>12}{'逐块 p95':>10}{'静态层 p95':>12}{'节省':>8}")
+        for canvas in args.canvas.split(","):
+            config.CANVAS_WIDTH, config.CANVAS_HEIGHT = _parse_canvas(canvas)
+            processor = ImageProcessor(config)
+            processor.warm_up()
+            static_cache = LRUCache(max_entries=2)
+            for scenario in SCENARIOS:
+                # 预热字体、Logo 缩放和静态底图，只测量每张任务的增量开销
+                processor.static_layer_cache = static_cache
+                time_jobs(processor, make_jobs(scenario, 2, "warm"), args.font_size)
+
+                processor.static_layer_cache = None
+                blocks = summarize(time_jobs(processor, make_jobs(scenario, args.jobs, "a"), args.font_size))
+                processor.static_layer_cache = static_cache
+                static = summarize(time_jobs(processor, make_jobs(scenario, args.jobs, "b"), args.font_size))
+                mismatches += verify(processor, static_cache, make_jobs(scenario, min(args.jobs, 10), "c"),
+                                     args.font_size)
+
+                saving = 1 - static["p50_ms"] / blocks["p50_ms"] if blocks["p50_ms"] > 0 else 0.0
+                name = f"{scenario}@{canvas}"
+                results[name] = {"blocks": blocks, "static_layer": static, "p50_saving": saving}
+                print(f"{name:<40}{blocks['p50_ms']:>10.2f}{static['p50_ms']:>12.2f}"
+                      f"{blocks['p95_ms']:>10.2f}{static['p95_ms']:>12.2f}{saving:>8.0%}")
+
+    print("\n像素校验: " + ("两种方式输出一致" if not mismatches else f"{mismatches} 张不一致"))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"python": platform.python_version(), "pillow": PIL.__version__,
+                       "platform": platform.platform(), "jobs": args.jobs, "mismatches": mismatches,
+                       "results": results}, f, indent=4, ensure_ascii=False)
+        print(f"结果已保存到 {args.json}")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
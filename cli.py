@@ -0,0 +1,11 @@
+import sys
+import time
+from utils.startup_timer import StartupTimer
+
+# 无界面批量入口，可在没有显示器的渲染节点上运行：
+#   python cli.py manifest.csv -o output
+if __name__ == "__main__":
+    startup_timer = StartupTimer(time.perf_counter())
+    from interface.cli import main
+    startup_timer.mark("导入模块")
+    sys.exit(main(startup_timer=startup_timer))
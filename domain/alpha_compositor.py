@@ -0,0 +1,116 @@
+import threading
+import logging
+from PIL import Image
+from domain.exceptions import ConfigurationError
+
+try:
+    import numpy as np
+except ImportError: # NumPy 为可选依赖，未安装时使用 Pillow 的 paste 合成
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# 是否可以使用 NumPy 合成
+NUMPY_AVAILABLE = np is not None
+
+# 支持的目标图片模式，其他模式交给 Pillow 处理
+_TARGET_MODES = ("RGB", "RGBA")
+
+class NumpyCompositor:
+    """
+    用 NumPy 向量化实现的 alpha 合成，结果与 Image.paste(src, position, src) 逐字节一致。
+    每个通道 out = (dst * (255 - a) + src * a + 128) / 255（与 Pillow 相同的整数除法近似），
+    其中 src * a 即预乘 alpha 后的源颜色，贴到不透明照片上时等价于预乘 alpha 的 over 合成。
+    中间结果不超过 255 * 255 + 255，全部在 uint16 中计算；alpha 为 0 的像素保持不变，只取出 alpha 非 0 的像素参与计算。
+    取出的像素和中间结果写入按线程预先分配的缓冲区，只在像素数变多时扩容，逐次合成不再分配临时数组。
+    """
+    def __init__(self):
+        if np is None:
+            raise ImportError("NumpyCompositor 需要安装 NumPy")
+        self._local = threading.local()
+
+    def _buffer(self, name: str, dtype, size: int):
+        """返回本线程复用的一维缓冲区的前 size 个元素，容量不足时扩容。"""
+        buffer = getattr(self._local, name, None)
+        if buffer is None or buffer.size < size:
+            buffer = np.empty(size, dtype=dtype)
+            setattr(self._local, name, buffer)
+        return buffer[:size]
+
+    def blend(self, dst, src, alpha):
+        """
+        把 src 按 alpha 合成到 dst 上，直接修改 dst。
+        dst、src 为形状相同的 uint8 数组 (..., 通道)，alpha 为 uint8 数组 (..., 1)。
+        """
+        shape, alpha_shape = dst.shape, dst.shape[:-1] + (1,)
+        size, pixels = dst.size, dst.size // shape[-1]
+        scratch = self._buffer("scratch", np.uint16, 2 * size + pixels)
+        accumulator = scratch[:size].reshape(shape)
+        temp = scratch[size:2 * size].reshape(shape)
+        weight = scratch[2 * size:].reshape(alpha_shape)
+        # 先拷贝为连续的 uint16 再运算，比在 ufunc 中逐元素转换类型快得多
+        np.copyto(weight, alpha)
+        np.copyto(accumulator, src)
+        np.multiply(accumulator, weight, out=accumulator)
+        np.subtract(255, weight, out=weight)
+        np.copyto(temp, dst)
+        np.multiply(temp, weight, out=temp)
+        np.add(accumulator, temp, out=accumulator)
+        # 除以 255 并四舍五入：(v + 128 + ((v + 128) >> 8)) >> 8
+        np.add(accumulator, 128, out=accumulator)
+        np.right_shift(accumulator, 8, out=temp)
+        np.add(accumulator, temp, out=accumulator)
+        np.right_shift(accumulator, 8, out=accumulator)
+        np.copyto(dst, accumulator, casting="unsafe")
+
+    def paste(self, img: Image.Image, overlay: Image.Image, position: tuple):
+        """
+        等同于 img.paste(overlay, position, overlay)：overlay 为 RGBA，超出 img 边界的部分被裁掉。
+        只转换 overlay 中 alpha 非 0 区域与 img 重叠的部分，合成后写回 img；
+        img 不是 RGB/RGBA 或 overlay 不是 RGBA 时交给 Pillow。
+        """
+        if img.mode not in _TARGET_MODES or overlay.mode != "RGBA":
+            img.paste(overlay, position, overlay)
+            return
+        x, y = position
+        left, top = max(0, x), max(0, y)
+        right, bottom = min(img.width, x + overlay.width), min(img.height, y + overlay.height)
+        if left >= right or top >= bottom:
+            return
+        source_box = (left - x, top - y, right - x, bottom - y)
+        if source_box != (0, 0) + overlay.size:
+            overlay = overlay.crop(source_box)
+        # 完全透明的边缘不影响结果，不必转换
+        alpha_box = overlay.getchannel("A").getbbox()
+        if alpha_box is None:
+            return
+        if alpha_box != (0, 0) + overlay.size:
+            overlay = overlay.crop(alpha_box)
+            left, top = left + alpha_box[0], top + alpha_box[1]
+
+        source = np.asarray(overlay).reshape(-1, 4)
+        region = np.array(img.crop((left, top, left + overlay.width, top + overlay.height)))
+        channels = region.shape[2]
+        pixels = region.reshape(-1, channels)
+        index = np.flatnonzero(source[:, 3])
+        count = index.size
+        dst = np.take(pixels, index, axis=0,
+                      out=self._buffer("dst", np.uint8, count * channels).reshape(count, channels))
+        src = np.take(source, index, axis=0, out=self._buffer("src", np.uint8, count * 4).reshape(count, 4))
+        self.blend(dst, src[:, :channels], src[:, 3:4])
+        pixels[index] = dst
+        img.paste(Image.fromarray(region), (left, top))
+
+def create_compositor(name: str):
+    """
+    按配置 COMPOSITOR 返回合成器：pillow 返回 None（使用 Image.paste）；
+    numpy 返回 NumpyCompositor，未安装 NumPy 时抛出 ConfigurationError。
+    不提供自动选择：在已测量的环境中 NumPy 合成器都比 Image.paste 慢（数据见 README 与 benchmarks/bench_compositor.py），
+    只在基准测试证明更快时手动启用。
+    """
+    if name == "pillow":
+        return None
+    if np is None:
+        raise ConfigurationError("COMPOSITOR 为 numpy，但未安装 NumPy (pip install numpy)")
+    logger.debug(f"使用 NumPy {np.__version__} 合成 Logo 和照片水印")
+    return NumpyCompositor()
@@ -0,0 +1,160 @@
+import os
+import csv
+import json
+import time
+import logging
+from domain.exceptions import WatermarkGeneratorError, FileProcessingError
+from utils.filename_utils import build_output_filename
+
+logger = logging.getLogger(__name__)
+
+# 清单中必须提供的文本字段
+REQUIRED_FIELDS = ("city", "location", "camera", "lens")
+
+class JobResult:
+    """
+    单个批量任务的执行结果。
+    """
+    def __init__(self, index: int, output_path: str = None, success: bool = False,
+                 error: str = None, elapsed: float = 0.0, metrics: dict = None):
+        self.index = index # 任务在清单中的序号（从0开始）
+        self.output_path = output_path
+        self.success = success
+        self.error = error
+        self.elapsed = elapsed # 渲染耗时（秒）
+        self.metrics = metrics # 工作进程中记录的指标增量 (Metrics.drain)，未启用指标时为 None
+
+    def __repr__(self):
+        status = "ok" if self.success else f"failed: {self.error}"
+        return f"JobResult(index={self.index}, output_path={self.output_path!r}, {status})"
+
+def read_manifest(manifest_path: str):
+    """
+    逐行读取 CSV 或 JSONL 格式的任务清单，按顺序产出 (行号, 记录字典)。
+    格式根据扩展名判断：.csv 为 CSV（首行为表头），.jsonl/.ndjson 为每行一个 JSON 对象。
+    无法解析的行产出 (行号, None)，由调用方记为失败。
+    """
+    extension = os.path.splitext(manifest_path)[1].lower()
+    try:
+        f = open(manifest_path, 'r', encoding='utf-8-sig', newline='')
+    except OSError as e:
+        raise FileProcessingError(f"无法打开任务清单 '{manifest_path}': {e}")
+
+    with f:
+        if extension == ".csv":
+            reader = csv.DictReader(f)
+            for record in reader:
+                # DictReader 的表头在第1行，数据从第2行开始
+                yield reader.line_num, {k.strip(): v for k, v in record.items() if k}
+        elif extension in (".jsonl", ".ndjson"):
+            for line_no, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    logger.error(f"任务清单第 {line_no} 行 JSON 格式错误: {e}")
+                    yield line_no, None
+                    continue
+                yield line_no, record if isinstance(record, dict) else None
+        else:
+            raise FileProcessingError(f"不支持的任务清单格式: '{manifest_path}'（仅支持 .csv / .jsonl）")
+
+def _optional_int(record: dict, key: str, maximum: int = None):
+    """
+    读取可选的正整数字段，空值返回 None。
+    接受整数、整数值的浮点数（如 JSON 中的 40.0）和数字字符串；布尔值、列表、小数、非正数和超过 maximum 的值抛出 ValueError。
+    """
+    value = record.get(key)
+    if value is None or str(value).strip() == "":
+        return None
+    try:
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise ValueError(key)
+        if isinstance(value, float) and not value.is_integer():
+            raise ValueError(key)
+        value = int(value)
+    except ValueError:
+        raise ValueError(f"{key} 必须是有效的正整数")
+    if value <= 0:
+        raise ValueError(f"{key} 必须是有效的正整数")
+    if maximum is not None and value > maximum:
+        # 过大的字号或 Logo 宽度会让单个任务长时间占用渲染实例和大量内存
+        raise ValueError(f"{key} 不能超过 {maximum}，当前为 {value}")
+    return value
+
+def _check_output_filename(filename: str):
+    """output 字段只能是文件名：含路径分隔符、盘符或为 . / .. 时抛出 ValueError，防止写到输出目录之外。"""
+    if ("/" in filename or "\\" in filename or filename in (".", "..")
+            or os.path.isabs(filename) or os.path.splitdrive(filename)[0]):
+        raise ValueError(f"output 只能是文件名，不能包含路径: '{filename}'")
+
+def build_job(record: dict, output_dir: str, filename_fields, used_filenames: set = None,
+              extension: str = ".png", max_font_size: int = None, max_logo_width: int = None) -> dict:
+    """
+    将清单记录转换为 ImageProcessor.generate_watermark 的关键字参数。
+    记录带 photo 字段时转换为 ImageProcessor.composite_onto_photo 的参数，可用 placement 字段指定位置。
+    记录中可用 output 字段指定输出文件名（不能包含路径），否则按 filename_fields 拼接并使用 extension 扩展名
+    （照片任务沿用原文件名），重名时追加序号。
+    font_size、signature_logo_width 分别不能超过 max_font_size、max_logo_width（为 None 时不限制）。
+    字段缺失、类型错误或超出范围时抛出 ValueError。
+    """
+    if record is None:
+        raise ValueError("无法解析的记录")
+
+    missing = [field for field in REQUIRED_FIELDS if not str(record.get(field) or "").strip()]
+    if missing:
+        raise ValueError(f"缺少字段: {', '.join(missing)}")
+
+    job = {field: str(record[field]).strip() for field in REQUIRED_FIELDS}
+    job["font_size"] = _optional_int(record, "font_size", max_font_size)
+    job["signature_logo_width"] = _optional_int(record, "signature_logo_width", max_logo_width)
+
+    photo_path = str(record.get("photo") or "").strip()
+    if photo_path:
+        # 带 photo 字段的记录直接把水印合成到照片上
+        job["photo_path"] = photo_path
+        placement = str(record.get("placement") or "").strip().lower()
+        if placement:
+            job["placement"] = placement
+
+    filename = str(record.get("output") or "").strip()
+    if filename:
+        _check_output_filename(filename)
+    elif photo_path:
+        # 照片合成任务默认沿用原照片的文件名
+        filename = os.path.basename(photo_path)
+    else:
+        filename = build_output_filename(job, filename_fields, extension)
+    if used_filenames is not None:
+        # 同一批次中可能有多条记录得到相同的文件名（包括显式指定的 output），追加序号避免相互覆盖
+        stem, suffix = os.path.splitext(filename)
+        candidate, counter = filename, 1
+        while candidate in used_filenames:
+            candidate = f"{stem}_{counter}{suffix}"
+            counter += 1
+        filename = candidate
+        used_filenames.add(filename)
+
+    job["output_path"] = os.path.join(output_dir, filename)
+    if photo_path and os.path.abspath(job["output_path"]) == os.path.abspath(photo_path):
+        raise ValueError("输出路径与原照片相同，拒绝覆盖原照片")
+    return job
+
+def render_job(image_processor, index: int, job: dict) -> JobResult:
+    """使用给定的 ImageProcessor 渲染单个任务，异常被转换为失败结果而不是向上抛出。"""
+    start = time.perf_counter()
+    try:
+        if job.get("photo_path"):
+            image_processor.composite_onto_photo(**job)
+        elif job.get("widths"):
+            image_processor.generate_watermark_sizes(**job)
+        else:
+            image_processor.generate_watermark(**job)
+        return JobResult(index, job["output_path"], True, elapsed=time.perf_counter() - start)
+    except WatermarkGeneratorError as e:
+        return JobResult(index, job.get("output_path"), False, str(e), time.perf_counter() - start)
+    except Exception as e:
+        logger.error(f"渲染任务 {index} 时发生意外错误: {e}")
+        return JobResult(index, job.get("output_path"), False, str(e), time.perf_counter() - start)
@@ -34,16 +34,54 @@ class Config:
         self.DEFAULT_LOCATION = None # 新增默认值参数
         self.DEFAULT_CAMERA = None # 新增默认值参数
         self.DEFAULT_LENS = None # 新增默认值参数
+        self.BATCH_WORKERS = None # 批量渲染进程数，0 表示使用全部 CPU 核心
+        self.FONT_CACHE_SIZE = None # 字体缓存最多保留的字号数量
+        self.LOGO_CACHE_MAX_BYTES = None # 缩放 Logo 缓存的内存上限（字节）
+        self.COMPOSITOR = None # 带 alpha 贴 Logo 和照片水印的实现：pillow / numpy
+        self.LOGO_PREMULTIPLIED_ALPHA = None # 是否使用预乘 alpha 合成 Logo
+        self.TEXT_CACHE_MAX_BYTES = None # 文本蒙版缓存的内存上限（字节）
+        self.BLOCK_CACHE_MAX_BYTES = None # 已渲染内容块（含预览缩放结果）缓存的内存上限（字节）
+        self.STATIC_LAYER_CACHE_SIZE = None # full 模式下缓存的 Logo 底图数量，0 表示不使用静态图层
+        self.RENDER_MODE = None # 渲染模式：full 输出完整画布，cropped 只输出内容区域
+        self.PHOTO_PLACEMENT = None # 照片合成位置：over 叠加在照片底部，below 追加在照片下方
+        self.PHOTO_BAR_COLOR = None # below 模式下水印栏的底色 (R, G, B)
+        self.PHOTO_MAX_DIMENSION = None # 照片输出的最大边长，0 表示保持原尺寸
+        self.PHOTO_JPEG_QUALITY = None # 照片以 JPEG 输出时的质量
+        self.PHOTO_PREFETCH = None # 预解码的照片数量上限
+        self.EXIF_INDEX_PATH = None # 照片 EXIF 索引文件路径
+        self.OUTPUT_CACHE_DIR = None # 输出缓存目录，为空时不启用
+        self.OUTPUT_CACHE_MAX_BYTES = None # 输出缓存目录的大小上限（字节）
+        self.OUTPUT_CACHE_HARDLINK = None # 命中缓存时是否用硬链接代替复制
+        self.OUTPUT_FORMAT = None # 水印输出格式：png / webp / tiff
+        self.PNG_COMPRESS_LEVEL = None # PNG 的 zlib 压缩级别 (0-9)
+        self.PNG_OPTIMIZE = None # PNG 是否搜索最优压缩参数
+        self.PNG_QUANTIZE_COLORS = None # 大于 0 时量化为调色板 PNG 的颜色数
+        self.WEBP_METHOD = None # WebP 无损编码的速度档位 (0-6)
+        self.TIFF_COMPRESSION = None # TIFF 压缩方式
 
         self.cities = [] # 城市库
         self.locations_by_city = {} # 地点库，现在是字典
         self.cameras = [] # 相机库
         self.lenses = [] # 镜头库
         self.last_session_data = {} # 上次会话数据
+        self.DATA_FILE_PATH = None # 库数据文件 data.json 的绝对路径
+        self.SESSION_FILE_PATH = None # 会话文件 last_session.json 的绝对路径
+        self.DATA_BACKEND = None # 数据库后端：json 使用 data.json，sqlite 使用 DATA_DB_PATH
+        self.DATA_DB_PATH = None # SQLite 数据库文件的绝对路径
+        self.METRICS_ENABLED = None # 是否记录各渲染阶段的耗时和计数
+        self.LAYOUT = None # 水印布局名称：内置的 default / top_bar / centered / stacked 或 LAYOUT_FILE 中定义的布局
+        self.LAYOUT_FILE = None # 自定义布局文件 (JSON) 的绝对路径，为空时只使用内置布局
+        self.OUTPUT_WIDTHS = None # 批量生成时每个水印额外输出的画布宽度列表，为空时只输出 CANVAS_WIDTH 一种尺寸
+        self.SERVER_HOST = None # HTTP 渲染服务监听的地址
+        self.SERVER_PORT = None # HTTP 渲染服务监听的端口
+        self.SERVER_WORKERS = None # HTTP 渲染服务预热的 ImageProcessor 数量，0 表示使用全部 CPU 核心
+        self.SERVER_QUEUE_SIZE = None # 渲染实例都在忙时最多排队等待的请求数，超出返回 503
+        self.SERVER_MAX_BATCH_JOBS = None # 单个 /batch 请求最多包含的任务数
 
-def load_config(): # 移除env_path参数，因为我们将动态构建它
+def get_config_dir():
     """
-    从 .env 文件加载配置。
+    返回 config 文件夹的绝对路径。
+    打包后的exe使用exe所在目录，未打包时使用项目根目录。
     """
     # 获取当前脚本的运行路径，对于打包后的exe，这将是exe所在的目录
     if getattr(sys, 'frozen', False):
@@ -53,12 +91,31 @@ def load_config(): # 移除env_path参数，因为我们将动态构建它
         # 如果是未打包的脚本，则使用当前文件所在的目录作为基准
         base_path = os.path.dirname(os.path.abspath(__file__))
         # 对于未打包的情况，config文件夹在项目根目录，而不是domain/config_loader.py的同级目录
-        # 所以需要向上两级目录
-        base_path = os.path.abspath(os.path.join(base_path, '..', '..'))
+        # 所以需要向上一级目录
+        base_path = os.path.abspath(os.path.join(base_path, '..'))
 
+    return os.path.join(base_path, 'config')
 
+def parse_widths(value: str) -> list:
+    """解析逗号分隔的画布宽度列表（如 "3000,4000,6000"），去除重复项，宽度必须是正整数，否则抛出 ValueError。"""
+    widths = []
+    for item in str(value or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        width = int(item)
+        if width <= 0:
+            raise ValueError(f"画布宽度必须是正整数，当前为 {width}")
+        if width not in widths:
+            widths.append(width)
+    return widths
+
+def load_config(): # 移除env_path参数，因为我们将动态构建它
+    """
+    从 .env 文件加载配置。
+    """
     # 构建config文件夹的绝对路径
-    config_dir = os.path.join(base_path, 'config')
+    config_dir = get_config_dir()
 
     # 调整env_path以使用绝对路径
     absolute_env_path = os.path.join(config_dir, '.env')
@@ -113,9 +170,77 @@ def load_config(): # 移除env_path参数，因为我们将动态构建它
         config.DEFAULT_CAMERA = os.getenv('DEFAULT_CAMERA', 'LICE-7c')
         config.DEFAULT_LENS = os.getenv('DEFAULT_LENS', 'SIGMA 24-70mm F2.8 DG DN II Art')
 
-        # 加载库数据
+        config.BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', '0'))
+        config.FONT_CACHE_SIZE = int(os.getenv('FONT_CACHE_SIZE', '16'))
+        config.LOGO_CACHE_MAX_BYTES = int(os.getenv('LOGO_CACHE_MAX_MB', '64')) * 1024 * 1024
+        config.LOGO_PREMULTIPLIED_ALPHA = os.getenv('LOGO_PREMULTIPLIED_ALPHA', 'false').strip().lower() in ('1', 'true', 'yes')
+        config.COMPOSITOR = os.getenv('COMPOSITOR', 'pillow').strip().lower()
+        if config.COMPOSITOR not in ('numpy', 'pillow'):
+            raise ValueError(f"COMPOSITOR 只能是 numpy 或 pillow，当前为 '{config.COMPOSITOR}'")
+        config.TEXT_CACHE_MAX_BYTES = int(os.getenv('TEXT_CACHE_MAX_MB', '32')) * 1024 * 1024
+        config.BLOCK_CACHE_MAX_BYTES = int(os.getenv('BLOCK_CACHE_MAX_MB', '32')) * 1024 * 1024
+        config.STATIC_LAYER_CACHE_SIZE = int(os.getenv('STATIC_LAYER_CACHE_SIZE', '2'))
+        config.RENDER_MODE = os.getenv('RENDER_MODE', 'full').strip().lower()
+        if config.RENDER_MODE not in ('full', 'cropped'):
+            raise ValueError(f"RENDER_MODE 只能是 full 或 cropped，当前为 '{config.RENDER_MODE}'")
+
+        config.PHOTO_PLACEMENT = os.getenv('PHOTO_PLACEMENT', 'below').strip().lower()
+        config.PHOTO_BAR_COLOR = tuple(int(v) for v in os.getenv('PHOTO_BAR_COLOR', '0,0,0').split(','))
+        if len(config.PHOTO_BAR_COLOR) != 3:
+            raise ValueError(f"PHOTO_BAR_COLOR 必须是 R,G,B 三个整数，当前为 '{os.getenv('PHOTO_BAR_COLOR')}'")
+        config.PHOTO_MAX_DIMENSION = int(os.getenv('PHOTO_MAX_DIMENSION', '0'))
+        config.PHOTO_JPEG_QUALITY = int(os.getenv('PHOTO_JPEG_QUALITY', '95'))
+        config.PHOTO_PREFETCH = int(os.getenv('PHOTO_PREFETCH', '2'))
+
+        # EXIF 索引默认放在 config 文件夹，相对路径同样相对于 config 文件夹
+        exif_index_path = os.getenv('EXIF_INDEX_PATH', 'exif_index.json')
+        config.EXIF_INDEX_PATH = os.path.join(config_dir, exif_index_path)
+
+        # 输出缓存目录的相对路径同样相对于 config 文件夹
+        output_cache_dir = os.getenv('OUTPUT_CACHE_DIR', '').strip()
+        config.OUTPUT_CACHE_DIR = os.path.join(config_dir, output_cache_dir) if output_cache_dir else None
+        config.OUTPUT_CACHE_MAX_BYTES = int(os.getenv('OUTPUT_CACHE_MAX_MB', '1024')) * 1024 * 1024
+        config.OUTPUT_CACHE_HARDLINK = os.getenv('OUTPUT_CACHE_HARDLINK', 'true').strip().lower() in ('1', 'true', 'yes')
+
+        # 编码参数
+        config.OUTPUT_FORMAT = os.getenv('OUTPUT_FORMAT', 'png').strip().lower()
+        if config.OUTPUT_FORMAT not in ('png', 'webp', 'tiff'):
+            raise ValueError(f"OUTPUT_FORMAT 只能是 png、webp 或 tiff，当前为 '{config.OUTPUT_FORMAT}'")
+        config.PNG_COMPRESS_LEVEL = int(os.getenv('PNG_COMPRESS_LEVEL', '6'))
+        config.PNG_OPTIMIZE = os.getenv('PNG_OPTIMIZE', 'false').strip().lower() in ('1', 'true', 'yes')
+        config.PNG_QUANTIZE_COLORS = int(os.getenv('PNG_QUANTIZE_COLORS', '0'))
+        config.WEBP_METHOD = int(os.getenv('WEBP_METHOD', '4'))
+        config.TIFF_COMPRESSION = os.getenv('TIFF_COMPRESSION', 'tiff_deflate').strip()
+
+        config.METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').strip().lower() in ('1', 'true', 'yes')
+
+        # 布局，自定义布局文件的相对路径相对于 config 文件夹
+        config.LAYOUT = os.getenv('LAYOUT', 'default').strip()
+        layout_file = os.getenv('LAYOUT_FILE', '').strip()
+        config.LAYOUT_FILE = os.path.join(config_dir, layout_file) if layout_file else None
+        config.OUTPUT_WIDTHS = parse_widths(os.getenv('OUTPUT_WIDTHS', ''))
+
+        # HTTP 渲染服务
+        config.SERVER_HOST = os.getenv('SERVER_HOST', '127.0.0.1').strip()
+        config.SERVER_PORT = int(os.getenv('SERVER_PORT', '8765'))
+        config.SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', '2'))
+        config.SERVER_QUEUE_SIZE = int(os.getenv('SERVER_QUEUE_SIZE', '16'))
+        if config.SERVER_QUEUE_SIZE < 0:
+            raise ValueError(f"SERVER_QUEUE_SIZE 不能为负数，当前为 {config.SERVER_QUEUE_SIZE}")
+        config.SERVER_MAX_BATCH_JOBS = int(os.getenv('SERVER_MAX_BATCH_JOBS', '500'))
+
+        # 数据库后端
+        config.DATA_BACKEND = os.getenv('DATA_BACKEND', 'json').strip().lower()
+        if config.DATA_BACKEND not in ('json', 'sqlite'):
+            raise ValueError(f"DATA_BACKEND 只能是 json 或 sqlite，当前为 '{config.DATA_BACKEND}'")
+        config.DATA_DB_PATH = os.path.join(config_dir, os.getenv('DATA_DB_PATH', 'data.db'))
+
+        # 加载库数据（sqlite 后端按需查询数据库，不整体读入）
         data_file_path = os.path.join(config_dir, 'data.json')
-        if os.path.exists(data_file_path):
+        config.DATA_FILE_PATH = data_file_path
+        if config.DATA_BACKEND == 'sqlite':
+            logger.info(f"使用 SQLite 数据库: {config.DATA_DB_PATH}")
+        elif os.path.exists(data_file_path):
             try:
                 with open(data_file_path, 'r', encoding='utf-8') as f:
                     data = json.load(f)
@@ -132,6 +257,7 @@ def load_config(): # 移除env_path参数，因为我们将动态构建它
 
         # 加载上次会话数据
         session_file_path = os.path.join(config_dir, 'last_session.json')
+        config.SESSION_FILE_PATH = session_file_path
         if os.path.exists(session_file_path):
             try:
                 with open(session_file_path, 'r', encoding='utf-8') as f:
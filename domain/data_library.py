@@ -0,0 +1,163 @@
+import os
+import re
+import bisect
+from domain.json_store import JsonFileStore
+
+def normalize_library_key(value: str) -> str:
+    """用于比较的规范化键：忽略大小写和空白差异，"LICE-7C" 与 "lice-7c " 视为同一项。"""
+    return re.sub(r"\s+", " ", value).strip().casefold()
+
+def build_library_lookup(library) -> dict:
+    """为数据库条目建立 {规范化键: 库中写法} 的查找表，同一键有多种写法时保留第一个。"""
+    lookup = {}
+    for item in library:
+        lookup.setdefault(normalize_library_key(item), item)
+    return lookup
+
+# 比任何实际字符都大的哨兵，用于确定前缀区间的上界
+_PREFIX_END = chr(0x10FFFF)
+
+class PrefixIndex:
+    """
+    数据库条目（城市、地点、相机、镜头）的前缀索引。
+    规范化键保存在有序列表中，前缀查询用二分查找定位区间，耗时 O(log n + k)；
+    忽略大小写和空白后相同的写法只保留第一个。
+    """
+    def __init__(self, items=()):
+        self._values = {} # 规范化键 -> 库中写法
+        for item in items:
+            key = normalize_library_key(item)
+            if key:
+                self._values.setdefault(key, item)
+        self._keys = sorted(self._values)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, item: str) -> bool:
+        return normalize_library_key(item) in self._values
+
+    def add(self, item: str) -> bool:
+        """增量插入一项，已存在（含大小写/空白不同的写法）时返回 False。"""
+        key = normalize_library_key(item)
+        if not key or key in self._values:
+            return False
+        self._values[key] = item
+        bisect.insort(self._keys, key)
+        return True
+
+    def _range(self, prefix: str):
+        key = normalize_library_key(prefix)
+        return (bisect.bisect_left(self._keys, key),
+                bisect.bisect_left(self._keys, key + _PREFIX_END))
+
+    def count(self, prefix: str) -> int:
+        """以 prefix 开头的条目数。"""
+        lo, hi = self._range(prefix)
+        return hi - lo
+
+    def search(self, prefix: str, limit: int = None) -> list:
+        """
+        返回以 prefix 开头的条目（库中写法），最多 limit 个。
+        按规范化键排序，与输入完全相同的条目排在最前。
+        """
+        lo, hi = self._range(prefix)
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        return [self._values[key] for key in self._keys[lo:hi]]
+
+    def common_prefix(self, prefix: str) -> str:
+        """
+        所有以 prefix 开头的条目的最长公共前缀，用于输入框的部分自动补全，没有匹配时返回空字符串。
+        条目有序，只需比较区间内的第一个和最后一个。
+        """
+        lo, hi = self._range(prefix)
+        if lo >= hi:
+            return ""
+        return os.path.commonprefix([self._values[self._keys[lo]], self._values[self._keys[hi - 1]]])
+
+# 数据库的种类，与 data.json 中的键及 Config 的属性名对应；地点库按城市 (scope) 分组
+LIBRARY_KINDS = ("cities", "locations_by_city", "cameras", "lenses")
+
+class JsonDataLibrary:
+    """
+    基于 data.json 的数据库：条目保存在 Config 的列表中，前缀查询使用内存中的 PrefixIndex，
+    修改通过 JsonFileStore 在后台延迟写盘。不记录使用次数，匹配结果按字母顺序排列。
+    """
+    def __init__(self, config, save_delay: float = 1.0):
+        self.config = config
+        self.store = JsonFileStore(config.DATA_FILE_PATH, delay=save_delay)
+        self._indexes = {}
+        # data.json 中的列表不一定有序，先排序，add 才能用 insort 保持有序
+        for kind in ("cities", "cameras", "lenses"):
+            getattr(config, kind).sort()
+        for locations in config.locations_by_city.values():
+            locations.sort()
+
+    def _items(self, kind: str, scope: str = None) -> list:
+        if kind == "locations_by_city":
+            return self.config.locations_by_city.setdefault(scope, [])
+        return getattr(self.config, kind)
+
+    def _index(self, kind: str, scope: str = None) -> PrefixIndex:
+        """返回 (种类, 城市) 对应的前缀索引，首次使用时建立。"""
+        key = (kind, scope if kind == "locations_by_city" else None)
+        if key not in self._indexes:
+            if kind == "locations_by_city":
+                self._indexes[key] = PrefixIndex(self.config.locations_by_city.get(scope, []))
+            else:
+                self._indexes[key] = PrefixIndex(self._items(kind))
+        return self._indexes[key]
+
+    def values(self, kind: str, scope: str = None, limit: int = None) -> list:
+        """返回某个库按字母顺序的前 limit 个条目（None 为全部）。"""
+        if kind == "locations_by_city":
+            items = self.config.locations_by_city.get(scope, [])
+        else:
+            items = self._items(kind)
+        return items[:limit] if limit is not None else items
+
+    def contains(self, kind: str, value: str, scope: str = None) -> bool:
+        """库中是否已有该条目（忽略大小写和空白）。"""
+        return value in self._index(kind, scope)
+
+    def search(self, kind: str, prefix: str, limit: int = None, scope: str = None) -> list:
+        return self._index(kind, scope).search(prefix, limit)
+
+    def common_prefix(self, kind: str, prefix: str, scope: str = None) -> str:
+        return self._index(kind, scope).common_prefix(prefix)
+
+    def add(self, kind: str, value: str, scope: str = None) -> bool:
+        """新增条目并安排写盘，已存在（忽略大小写和空白）时返回 False。"""
+        if not self._index(kind, scope).add(value):
+            return False
+        bisect.insort(self._items(kind, scope), value) # 保持排序
+        self._schedule_save()
+        return True
+
+    def record_use(self, kind: str, value: str, scope: str = None):
+        """JSON 库不记录使用次数。"""
+
+    def lookup(self, kind: str) -> dict:
+        """返回 {规范化键: 库中写法} 查找表，供 EXIF 型号对齐使用。"""
+        return build_library_lookup(self.values(kind))
+
+    def _schedule_save(self):
+        # 传入列表的浅拷贝作为快照，后台线程写盘时主线程可以继续修改库
+        self.store.schedule({
+            "cities": list(self.config.cities),
+            "locations": {city: list(locations) for city, locations in self.config.locations_by_city.items()},
+            "cameras": list(self.config.cameras),
+            "lenses": list(self.config.lenses)
+        })
+
+    def close(self):
+        """写入尚未落盘的修改。"""
+        self.store.close()
+
+def open_data_library(config, save_delay: float = 1.0):
+    """按配置 DATA_BACKEND 打开数据库：json 使用 data.json，sqlite 使用 DATA_DB_PATH 指定的数据库文件。"""
+    if config.DATA_BACKEND == "sqlite":
+        from domain.sqlite_library import SqliteDataLibrary
+        return SqliteDataLibrary(config.DATA_DB_PATH, migrate_from=config.DATA_FILE_PATH)
+    return JsonDataLibrary(config, save_delay=save_delay)
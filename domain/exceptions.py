@@ -13,3 +13,7 @@ class FileProcessingError(WatermarkGeneratorError):
 class ImageProcessingError(WatermarkGeneratorError):
     """图像处理相关的异常。"""
     pass
+
+class ServiceBusyError(WatermarkGeneratorError):
+    """渲染服务的等待队列已满，调用方应稍后重试。"""
+    pass
@@ -0,0 +1,122 @@
+import os
+import re
+import json
+import logging
+from PIL import Image
+from domain.data_library import normalize_library_key
+from domain.json_store import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# EXIF 标签编号
+EXIF_IFD_POINTER = 0x8769
+TAG_MODEL = 0x0110
+TAG_LENS_MODEL = 0xA434
+
+# 索引文件格式版本，结构变化时递增以使旧索引失效
+INDEX_VERSION = 1
+
+def _clean_exif_text(value) -> str:
+    """去掉 EXIF 字符串中的空字符和多余空白。"""
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", errors="ignore")
+    return re.sub(r"\s+", " ", str(value).replace("\x00", "")).strip()
+
+def read_camera_lens(photo_path: str):
+    """
+    从照片 EXIF 读取相机型号和镜头型号，返回 (camera, lens)，读取不到的项为空字符串。
+    Image.open 只解析文件头，不会解码像素数据。
+    """
+    with Image.open(photo_path) as img:
+        exif = img.getexif()
+        camera = _clean_exif_text(exif.get(TAG_MODEL))
+        lens = _clean_exif_text(exif.get_ifd(EXIF_IFD_POINTER).get(TAG_LENS_MODEL))
+    return camera, lens
+
+def normalize_against_library(value: str, lookup: dict) -> str:
+    """
+    将 EXIF 读出的型号与数据库中的条目对齐：忽略大小写和空白后相同即返回库中的写法，
+    否则返回原值。lookup 由 build_library_lookup 或数据库的 lookup 方法生成。
+    """
+    if not value:
+        return value
+    return lookup.get(normalize_library_key(value), value)
+
+class ExifIndex:
+    """
+    照片 EXIF 的磁盘索引，以 (绝对路径, 修改时间, 文件大小) 判断缓存是否有效，
+    重复处理同一目录时不必重新解析每个文件头。
+    """
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self._entries = {}
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self):
+        """读取索引文件，文件不存在或损坏时使用空索引。"""
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self._entries = data.get("entries", {})
+            else:
+                logger.info(f"EXIF 索引 '{self.index_path}' 版本不匹配，将重新建立。")
+        except (OSError, json.JSONDecodeError, AttributeError) as e:
+            logger.warning(f"读取 EXIF 索引 '{self.index_path}' 失败，将重新建立: {e}")
+
+    def get(self, photo_path: str):
+        """返回照片的 (camera, lens)，索引有效时直接返回，否则解析 EXIF 并更新索引。"""
+        path = os.path.abspath(photo_path)
+        stat = os.stat(path)
+        entry = self._entries.get(path)
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            self.hits += 1
+            return entry["camera"], entry["lens"]
+
+        self.misses += 1
+        camera, lens = read_camera_lens(path)
+        self._entries[path] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size,
+                               "camera": camera, "lens": lens}
+        self._dirty = True
+        return camera, lens
+
+    def save(self):
+        """有新条目时写回索引文件，先写临时文件再替换，避免中途中断导致索引损坏。"""
+        if not self._dirty:
+            return
+        try:
+            write_json_atomic(self.index_path, {"version": INDEX_VERSION, "entries": self._entries})
+            self._dirty = False
+            logger.info(f"EXIF 索引已保存到 {self.index_path}（{len(self._entries)} 条）")
+        except OSError as e:
+            logger.error(f"保存 EXIF 索引到 '{self.index_path}' 失败: {e}")
+
+def fill_camera_lens(record: dict, exif_index: ExifIndex, camera_lookup: dict, lens_lookup: dict) -> dict:
+    """
+    对带 photo 字段的清单记录，用照片 EXIF 补全空缺的 camera / lens，
+    并与相机库、镜头库中的写法对齐（查找表由 build_library_lookup 或数据库的 lookup 方法生成）。记录中已有的值优先。
+    """
+    photo_path = str(record.get("photo") or "").strip()
+    if not photo_path:
+        return record
+    if str(record.get("camera") or "").strip() and str(record.get("lens") or "").strip():
+        return record
+    try:
+        camera, lens = exif_index.get(photo_path)
+    except OSError as e:
+        logger.warning(f"读取照片 '{photo_path}' 的 EXIF 失败: {e}")
+        return record
+
+    record = dict(record)
+    if not str(record.get("camera") or "").strip():
+        record["camera"] = normalize_against_library(camera, camera_lookup)
+    if not str(record.get("lens") or "").strip():
+        record["lens"] = normalize_against_library(lens, lens_lookup)
+    return record
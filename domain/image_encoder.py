@@ -0,0 +1,75 @@
+import logging
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# 支持的输出格式及其默认扩展名
+OUTPUT_EXTENSIONS = {"png": ".png", "webp": ".webp", "tiff": ".tif"}
+# 各输出格式的 MIME 类型，用于 HTTP 响应
+OUTPUT_MIME_TYPES = {"png": "image/png", "webp": "image/webp", "tiff": "image/tiff"}
+
+class EncoderSettings:
+    """
+    水印图片的编码参数。
+    format: png / webp / tiff；webp 固定使用无损模式以保留透明边缘。
+    compress_level: PNG 的 zlib 压缩级别 (0-9)，越低越快、文件越大。
+    optimize: PNG 是否额外搜索最优压缩参数（很慢）。
+    quantize_colors: 大于 0 时先量化为调色板 (P 模式)，适合单色文字加少量 Logo 的水印。
+    webp_method: WebP 编码速度与压缩率的取舍 (0 最快，6 最慢)。
+    tiff_compression: TIFF 的压缩方式，如 tiff_deflate、tiff_lzw、raw。
+    """
+    def __init__(self, format: str = "png", compress_level: int = 6, optimize: bool = False,
+                 quantize_colors: int = 0, webp_method: int = 4, tiff_compression: str = "tiff_deflate"):
+        self.format = format
+        self.compress_level = compress_level
+        self.optimize = optimize
+        self.quantize_colors = quantize_colors
+        self.webp_method = webp_method
+        self.tiff_compression = tiff_compression
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(format=config.OUTPUT_FORMAT,
+                   compress_level=config.PNG_COMPRESS_LEVEL,
+                   optimize=config.PNG_OPTIMIZE,
+                   quantize_colors=config.PNG_QUANTIZE_COLORS,
+                   webp_method=config.WEBP_METHOD,
+                   tiff_compression=config.TIFF_COMPRESSION)
+
+    @property
+    def extension(self) -> str:
+        return OUTPUT_EXTENSIONS[self.format]
+
+    @property
+    def mime_type(self) -> str:
+        return OUTPUT_MIME_TYPES[self.format]
+
+    def cache_fields(self) -> tuple:
+        """参与输出缓存键计算的字段。"""
+        return (self.format, self.compress_level, self.optimize, self.quantize_colors,
+                self.webp_method, self.tiff_compression)
+
+    def __repr__(self):
+        return (f"EncoderSettings(format={self.format!r}, compress_level={self.compress_level}, "
+                f"optimize={self.optimize}, quantize_colors={self.quantize_colors}, "
+                f"webp_method={self.webp_method}, tiff_compression={self.tiff_compression!r})")
+
+    def encode(self, img: Image.Image, fp, pnginfo=None):
+        """
+        按当前设置编码图片，fp 为文件路径或可写的二进制文件对象。
+        pnginfo 仅在 PNG 格式下写入。
+        """
+        if self.format == "png":
+            if self.quantize_colors:
+                # FASTOCTREE 支持 RGBA，调色板中保留每种颜色的 alpha，写入 PNG 的 tRNS 块
+                img = img.quantize(colors=self.quantize_colors, method=Image.Quantize.FASTOCTREE)
+            options = {"compress_level": self.compress_level, "optimize": self.optimize}
+            if pnginfo is not None:
+                options["pnginfo"] = pnginfo
+            img.save(fp, format="PNG", **options)
+        elif self.format == "webp":
+            img.save(fp, format="WEBP", lossless=True, method=self.webp_method)
+        elif self.format == "tiff":
+            img.save(fp, format="TIFF", compression=self.tiff_compression)
+        else:
+            raise ValueError(f"不支持的输出格式: '{self.format}'")
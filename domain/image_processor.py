@@ -1,29 +1,140 @@
+import io
 import os
+import copy
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image, ImageDraw, ImageFont
 import logging
 from domain.config_loader import load_config, Config
 from domain.exceptions import FileProcessingError, ImageProcessingError, ConfigurationError
+from domain.batch import JobResult
+from domain.output_cache import OutputCache, hash_file, hash_key_fields
+from domain.image_encoder import EncoderSettings
+from domain.overlay import CroppedOverlay, build_offset_pnginfo, write_offset_sidecar
+from domain.photo_io import load_photo, save_photo
+from domain.layout import LayoutBlock, compile_layout, load_layout_spec
+from domain.alpha_compositor import create_compositor
+from utils.filename_utils import sized_output_path
+from utils.lru_cache import LRUCache
+from utils.metrics import Metrics
 
 logger = logging.getLogger(__name__)
 
+# 输出缓存键的版本号，渲染逻辑变化导致输出不同时递增，使旧缓存失效
+OUTPUT_CACHE_KEY_VERSION = 2
+
 class ImageProcessor:
     def __init__(self, config: Config):
         self.config = config
-        self.font = self._load_font()
-        self.location_logo = self._load_logo(self.config.LOCATION_LOGO_PATH)
-        self.signature_logo = self._load_logo(self.config.SIGNATURE_LOGO_PATH)
+        # 按 (字体路径, 字号) 缓存 FreeTypeFont，避免重复解析字体文件
+        self.font_cache = LRUCache(max_entries=self.config.FONT_CACHE_SIZE or 1)
+        # 按 (Logo, 目标尺寸) 缓存缩放后的 Logo，按占用内存限制容量
+        self.logo_cache = LRUCache(max_entries=None, max_bytes=self.config.LOGO_CACHE_MAX_BYTES,
+                                   sizeof=lambda im: im.width * im.height * len(im.getbands()))
+        # 按 (字体, 字号, 文本) 缓存光栅化后的文本蒙版，测量和绘制共用
+        self.text_cache = LRUCache(max_entries=None, max_bytes=self.config.TEXT_CACHE_MAX_BYTES,
+                                   sizeof=lambda entry: entry[0].width * entry[0].height)
+        # 按各自的输入缓存已渲染的左右内容块及其预览缩放结果
+        self.block_cache = LRUCache(max_entries=None, max_bytes=self.config.BLOCK_CACHE_MAX_BYTES,
+                                    sizeof=lambda im: im.width * im.height * len(im.getbands()))
+        # full 模式下预渲染的 Logo 底图（完整画布大小），按各 Logo 的位置和尺寸缓存，0 表示不启用
+        self.static_layer_cache = None
+        if self.config.STATIC_LAYER_CACHE_SIZE > 0:
+            self.static_layer_cache = LRUCache(max_entries=self.config.STATIC_LAYER_CACHE_SIZE)
+        self.encoder = EncoderSettings.from_config(self.config)
+        # 带 alpha 贴 Logo 和照片水印使用的合成器，None 表示使用 Pillow 的 paste
+        self.compositor = create_compositor(self.config.COMPOSITOR)
+        # 各阶段耗时和计数，METRICS_ENABLED 为 false 时不记录
+        self.metrics = Metrics(enabled=self.config.METRICS_ENABLED)
+        if not self.config.FONT_PATH:
+            raise ConfigurationError("字体文件路径未配置。")
+        # 字体和 Logo 在首次使用时才加载（或由 warm_up 在后台提前加载），不拖慢启动
+        self._assets_lock = threading.Lock()
+        self._font = None
+        self._logos = None
+        # 按渲染输入的哈希复用已生成的图片，未配置缓存目录时不启用
+        self.output_cache = None
+        if self.config.OUTPUT_CACHE_DIR:
+            self.output_cache = OutputCache(self.config.OUTPUT_CACHE_DIR, self.config.OUTPUT_CACHE_MAX_BYTES,
+                                            self.config.OUTPUT_CACHE_HARDLINK)
+        self._asset_hash_cache = None
+        # 布局在此编译一次，之后每次渲染只测量文本并按预先解析好的偏移定位
+        self.layout_name, self._layout_spec = load_layout_spec(self.config)
+        self.layout_plan = compile_layout(self._layout_spec, self.config, name=self.layout_name)
+        # 多分辨率输出：相对原始画布的缩放比例，以及按目标宽度缓存的缩放视图（见 at_width）
+        self.scale = 1.0
+        self._base = None
+        self._scaled_views = {}
+        self._views_lock = threading.Lock()
+
+    @property
+    def font(self) -> ImageFont.FreeTypeFont:
+        """默认字号的字体，首次访问时加载。"""
+        if self._font is None:
+            with self._assets_lock:
+                if self._font is None:
+                    self._font = self._load_font()
+        return self._font
+
+    @property
+    def location_logo(self):
+        """地点 Logo，首次访问时加载，未配置或加载失败时为 None。"""
+        return self._get_logos()[0]
+
+    @property
+    def signature_logo(self):
+        """签名 Logo，首次访问时加载，未配置或加载失败时为 None。"""
+        return self._get_logos()[1]
+
+    def _get_logos(self):
+        if self._logos is None:
+            with self._assets_lock:
+                if self._logos is None:
+                    self._logos = (self._load_logo(self.config.LOCATION_LOGO_PATH),
+                                   self._load_logo(self.config.SIGNATURE_LOGO_PATH))
+        return self._logos
+
+    def warm_up(self):
+        """提前加载字体和 Logo，可在后台线程中调用，使首次渲染不必等待文件解析。"""
+        start = time.perf_counter()
+        self.font
+        self._get_logos()
+        logger.info(f"字体和 Logo 预加载完成，耗时 {(time.perf_counter() - start) * 1000:.1f} ms")
 
     def _load_font(self):
         """加载字体文件。"""
-        if not self.config.FONT_PATH:
-            raise ConfigurationError("字体文件路径未配置。")
         try:
-            return ImageFont.truetype(self.config.FONT_PATH, self.config.DEFAULT_FONT_SIZE)
+            return self._get_font(self.config.DEFAULT_FONT_SIZE)
         except IOError as e:
             raise FileProcessingError(f"无法加载字体文件 '{self.config.FONT_PATH}': {e}")
         except Exception as e:
             raise ConfigurationError(f"字体配置错误: {e}")
 
+    def _get_font(self, font_size: int) -> ImageFont.FreeTypeFont:
+        """从缓存获取指定字号的字体，未命中时才读取字体文件。"""
+        font_path = self.config.FONT_PATH
+        return self.font_cache.get_or_create(
+            (font_path, font_size), lambda: ImageFont.truetype(font_path, font_size))
+
+    def cache_stats(self) -> dict:
+        """返回各缓存的命中/未命中统计。"""
+        stats = {"font": self.font_cache.stats(), "logo": self.logo_cache.stats(),
+                 "text": self.text_cache.stats(), "block": self.block_cache.stats()}
+        if self.static_layer_cache is not None:
+            stats["static_layer"] = self.static_layer_cache.stats()
+        if self.output_cache:
+            stats["output"] = self.output_cache.stats()
+        return stats
+
+    def export_metrics(self) -> Metrics:
+        """把各缓存的统计写入 gauge 后返回指标对象，供调用方导出为 JSON 或 Prometheus 格式。"""
+        for cache_name, stats in self.cache_stats().items():
+            for field, value in stats.items():
+                self.metrics.set_gauge(f"{cache_name}_cache_{field}", value)
+        return self.metrics
+
     def _load_logo(self, logo_path: str):
         """加载并返回 Logo 图片，如果路径无效则返回 None。"""
         if not logo_path:
@@ -48,125 +159,663 @@ class ImageProcessor:
             return logo # 避免除以零
         new_height = text_height
         new_width = int(original_width * (new_height / original_height))
-        return logo.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        return self._get_scaled_logo(logo, (new_width, new_height))
+
+    def _get_scaled_logo(self, logo: Image.Image, size: tuple):
+        """
+        返回缩放到指定尺寸的 Logo，同一 Logo 的同一尺寸只做一次 LANCZOS 缩放。
+        返回的图片被缓存共享，调用方不得修改。
+        """
+        def resize():
+            with self.metrics.span("logo_resize"):
+                return logo.resize(size, Image.Resampling.LANCZOS)
+
+        return self.logo_cache.get_or_create((id(logo), size), resize)
+
+    def _composite_logo(self, img: Image.Image, logo: Image.Image, position: tuple):
+        """
+        将缩放后的 Logo 贴到画布上。
+        启用 LOGO_PREMULTIPLIED_ALPHA 时使用预乘 alpha 的 over 合成 (Image.alpha_composite)，
+        半透明边缘不会像 paste 蒙版那样被重复乘以 alpha；否则保持 paste 的原有效果。
+        """
+        if not self.config.LOGO_PREMULTIPLIED_ALPHA:
+            self._paste_with_alpha(img, logo, position)
+            return
+
+        # alpha_composite 不接受负坐标，先裁掉超出画布左/上边界的部分
+        x, y = position
+        source_x, source_y = max(0, -x), max(0, -y)
+        if source_x >= logo.width or source_y >= logo.height:
+            return
+        img.alpha_composite(logo, dest=(max(0, x), max(0, y)), source=(source_x, source_y))
+
+    def _paste_with_alpha(self, img: Image.Image, overlay: Image.Image, position: tuple):
+        """等同于 img.paste(overlay, position, overlay)，配置了 NumPy 合成器时由其完成，结果逐字节一致。"""
+        if self.compositor is None:
+            img.paste(overlay, position, overlay)
+        else:
+            self.compositor.paste(img, overlay, position)
+
+    def _get_text_mask(self, text: str, font: ImageFont.FreeTypeFont):
+        """
+        返回文本的光栅化蒙版，按 (字体路径, 字号, 文本) 缓存，每个不同的字符串在进程内只光栅化一次。
+        返回 (mask, offset, bbox)：mask 为 L 模式图片，offset 为蒙版相对绘制起点的偏移，
+        bbox 为蒙版中实际有像素的区域 (left, top, right, bottom)，无像素时为 None。
+        返回的蒙版被缓存共享，调用方不得修改。
+        """
+        def rasterize():
+            with self.metrics.span("text_rasterize"):
+                left, top, right, bottom = font.getbbox(text)
+                mask = Image.new("L", (max(0, right - left), max(0, bottom - top)), 0)
+                # 与 draw.text 使用相同的 FreeType 光栅化路径，仅整体平移了 (left, top)
+                ImageDraw.Draw(mask).text((-left, -top), text, font=font, fill=255)
+                return mask, (left, top), mask.getbbox()
+
+        return self.text_cache.get_or_create((getattr(font, "path", None), font.size, text), rasterize)
 
     def _get_text_dimensions(self, text: str, font: ImageFont.FreeTypeFont):
         """获取文本的尺寸 (宽度和高度)。"""
-        # 使用 getmask().getbbox() 获取更精确的文本边界框
+        # 使用文本蒙版中实际像素的边界框，比字体度量更精确
         # 这可以更好地处理不同字体和字符的实际渲染尺寸
         if not text:
             return 0, 0
-        
-        # 创建一个临时的ImageDraw对象来获取文本mask的bbox
-        # 注意：getmask().getbbox() 返回的是 (left, top, right, bottom)
-        # 这些坐标是相对于文本绘制的起始点 (0,0) 的
-        mask = font.getmask(text, mode="L")
-        bbox = mask.getbbox()
-        
+
+        # 注意：bbox 返回的是 (left, top, right, bottom)
+        _, _, bbox = self._get_text_mask(text, font)
+
         if bbox:
             width = bbox[2] - bbox[0]
             height = bbox[3] - bbox[1]
             return width, height
         return 0, 0
 
+    def _draw_text(self, img: Image.Image, position: tuple, text: str, font: ImageFont.FreeTypeFont, fill: tuple):
+        """
+        在 position 处绘制文本，效果等同于 ImageDraw.text，但复用测量时缓存的蒙版而不重新光栅化。
+        """
+        if not text:
+            return
+        if "\n" in text:
+            # 多行文本的行距排版交给 ImageDraw 处理
+            ImageDraw.Draw(img).text(position, text, font=font, fill=fill)
+            return
+        mask, (offset_x, offset_y), _ = self._get_text_mask(text, font)
+        img.paste(fill, (position[0] + offset_x, position[1] + offset_y), mask)
+
+    def _resolve_font(self, font_size: int = None) -> ImageFont.FreeTypeFont:
+        """返回本次渲染使用的字体，字号与默认值不同时从字体缓存获取。"""
+        # 更新字体大小（如果用户指定）
+        current_font = self.font
+        if font_size and font_size != self.config.DEFAULT_FONT_SIZE:
+            try:
+                current_font = self._get_font(font_size)
+            except IOError as e:
+                raise FileProcessingError(f"无法加载指定字体大小的字体文件 '{self.config.FONT_PATH}': {e}")
+        return current_font
+
+    def _compose_texts(self, city: str, location: str, camera: str, lens: str):
+        """组合水印上实际绘制的地点文本和信息文本。"""
+        location_text = f"{city}{self.config.LOCATION_SEPARATOR}{location}".upper()
+        info_text = f"SHOT ON {camera}{self.config.CAMERA_LENS_SEPARATOR}{lens}".upper()
+        return location_text, info_text
+
+    def _text_color(self):
+        """水印文本颜色 (R, G, B, A)。"""
+        return (self.config.TEXT_COLOR_R, self.config.TEXT_COLOR_G,
+                self.config.TEXT_COLOR_B, self.config.TEXT_COLOR_A)
+
+    def _layout_block(self, block: LayoutBlock, texts: tuple, current_font: ImageFont.FreeTypeFont,
+                      signature_logo_width: int):
+        """
+        按编译好的布局计算块中各元素在完整画布上的位置，返回待绘制的元素列表。
+        每次渲染只需测量文本、缩放 Logo，再做整数加减定位；缺少的 Logo 按 0x0 参与定位但不绘制。
+        """
+        sizes, contents = [], []
+        for element, text in zip(block.elements, texts):
+            if element.kind == "text":
+                sizes.append(self._get_text_dimensions(text, current_font))
+                contents.append(text)
+                continue
+            logo = self.location_logo if element.content == "location" else self.signature_logo
+            if logo is None:
+                scaled_logo = None
+            elif element.height_ref is not None:
+                # 缩放 Logo 使其与参照文本等高
+                scaled_logo = self._resize_logo_to_text_height(logo, sizes[element.height_ref][1])
+            else:
+                width = signature_logo_width if element.width == "signature" else element.width
+                original_width, original_height = logo.size
+                if original_width == 0:
+                    height = original_height
+                else:
+                    height = int(original_height * (width / original_width))
+                scaled_logo = self._get_scaled_logo(logo, (width, height))
+            sizes.append(scaled_logo.size if scaled_logo else (0, 0))
+            contents.append(scaled_logo)
+
+        elements = []
+        for element, content, position in zip(block.elements, contents, block.place(sizes)):
+            if element.kind == "text":
+                elements.append(("text", position, content, current_font, self._text_color()))
+            elif content is not None:
+                elements.append(("logo", position, content))
+        return elements
+
+    def _element_bbox(self, element):
+        """返回元素在画布坐标系中的边界框 (left, top, right, bottom)，没有像素时返回 None。"""
+        if element[0] == "logo":
+            _, (x, y), logo = element
+            return x, y, x + logo.width, y + logo.height
+
+        _, (x, y), text, font, _ = element
+        if not text:
+            return None
+        if "\n" in text:
+            return ImageDraw.Draw(Image.new("L", (1, 1))).textbbox((x, y), text, font=font)
+        mask, (offset_x, offset_y), _ = self._get_text_mask(text, font)
+        return x + offset_x, y + offset_y, x + offset_x + mask.width, y + offset_y + mask.height
+
+    def _draw_elements(self, img: Image.Image, elements, origin: tuple = (0, 0)):
+        """按顺序绘制元素，origin 为 img 左上角在完整画布中的坐标。"""
+        origin_x, origin_y = origin
+        for element in elements:
+            x, y = element[1]
+            position = (x - origin_x, y - origin_y)
+            if element[0] == "logo":
+                self._composite_logo(img, element[2], position)
+            else:
+                _, _, text, font, fill = element
+                self._draw_text(img, position, text, font, fill)
+
+    def _blocks_bbox(self, elements):
+        """计算一组元素裁剪到画布范围内的并集边界框，没有可见内容时返回 None。"""
+        boxes = [box for box in (self._element_bbox(e) for e in elements) if box]
+        if not boxes:
+            return None
+        left = max(0, min(box[0] for box in boxes))
+        top = max(0, min(box[1] for box in boxes))
+        right = min(self.config.CANVAS_WIDTH, max(box[2] for box in boxes))
+        bottom = min(self.config.CANVAS_HEIGHT, max(box[3] for box in boxes))
+        if left >= right or top >= bottom:
+            return None
+        return left, top, right, bottom
+
+    @staticmethod
+    def _boxes_overlap(box, other) -> bool:
+        return box[0] < other[2] and other[0] < box[2] and box[1] < other[3] and other[1] < box[3]
+
+    def _draw_block(self, elements, bbox):
+        """把一组元素绘制到与其边界框等大的小图上。"""
+        with self.metrics.span("block_draw"):
+            left, top, right, bottom = bbox
+            block = Image.new('RGBA', (right - left, bottom - top), (255, 255, 255, 0))
+            self._draw_elements(block, elements, (left, top))
+            return block
+
+    def _layout_elements(self, city: str, location: str, camera: str, lens: str,
+                         font_size: int = None, signature_logo_width: int = None):
+        """按布局计算各内容块的元素，返回 [(块缓存键, 元素列表)]。"""
+        current_font = self._resolve_font(font_size)
+        if signature_logo_width is None:
+            signature_logo_width = self.config.DEFAULT_SIGNATURE_LOGO_WIDTH
+        location_text, info_text = self._compose_texts(city, location, camera, lens)
+        fields = {"city": city, "location": location, "camera": camera, "lens": lens,
+                  "location_text": location_text, "info_text": info_text}
+        font_key = (getattr(current_font, "path", None), current_font.size)
+
+        laid_out = []
+        for block in self.layout_plan.blocks:
+            texts = block.texts(fields)
+            key = ((block.name, texts, signature_logo_width if block.uses_signature_width else None) + font_key
+                   + (self.config.CANVAS_WIDTH, self.config.CANVAS_HEIGHT))
+            laid_out.append((key, self._layout_block(block, texts, current_font, signature_logo_width)))
+        return laid_out
+
+    def _render_blocks(self, city: str, location: str, camera: str, lens: str,
+                       font_size: int = None, signature_logo_width: int = None):
+        """
+        按布局渲染各内容块（默认布局为左右两块），返回 [(缓存键, 图片, (x, y))]。
+        每块按只与自身相关的输入 (文本、字体、字号、签名宽度) 缓存，只有一块的输入变化时其他块直接复用；
+        内容块重叠而合并时不缓存，缓存键为 None。返回的图片被缓存共享，调用方不得修改。
+        """
+        groups = []
+        for key, elements in self._layout_elements(city, location, camera, lens, font_size=font_size,
+                                                   signature_logo_width=signature_logo_width):
+            bbox = self._blocks_bbox(elements)
+            if bbox:
+                groups.append((key, elements, bbox))
+        for i, (_, _, box) in enumerate(groups):
+            if any(self._boxes_overlap(box, other) for _, _, other in groups[i + 1:]):
+                # 窄画布上内容块重叠时合并为一块，保证绘制顺序与完整画布一致
+                merged = [element for _, elements, _ in groups for element in elements]
+                merged_box = self._blocks_bbox(merged)
+                return [(None, self._draw_block(merged, merged_box), merged_box[:2])]
+
+        return [(key, self.block_cache.get_or_create(key, lambda: self._draw_block(elements, bbox)), bbox[:2])
+                for key, elements, bbox in groups]
+
+    def _render_on_static_layer(self, city: str, location: str, camera: str, lens: str,
+                                font_size: int = None, signature_logo_width: int = None):
+        """
+        在完整画布上使用预渲染的静态图层：各 Logo 合成到与其等大的透明图块上并按位置和尺寸缓存，
+        每次渲染只分配画布、直接拷贝这些图块（不再做带 alpha 的合成）并绘制文本。
+        批量任务中 Logo 的位置通常不变，省去逐块分配、Logo 合成和二次拷贝。
+        文本与 Logo 重叠时绘制顺序会影响结果，此时返回 None，由调用方按内容块渲染。
+        """
+        elements = [element for _, block_elements in self._layout_elements(
+            city, location, camera, lens, font_size=font_size, signature_logo_width=signature_logo_width)
+            for element in block_elements]
+        logos = [element for element in elements if element[0] == "logo"]
+        texts = [element for element in elements if element[0] == "text"]
+        logo_boxes = [box for box in (self._element_bbox(logo) for logo in logos) if box]
+        for text in texts:
+            box = self._element_bbox(text)
+            if box and any(self._boxes_overlap(box, other) for other in logo_boxes):
+                self.metrics.increment("static_layer_fallbacks")
+                return None
+
+        def build():
+            with self.metrics.span("static_layer_build"):
+                if any(self._boxes_overlap(box, other)
+                       for i, box in enumerate(logo_boxes) for other in logo_boxes[i + 1:]):
+                    # Logo 之间重叠时按顺序合成到同一个图块上
+                    groups = [logos]
+                else:
+                    groups = [[logo] for logo in logos]
+                tiles = []
+                for group in groups:
+                    bbox = self._blocks_bbox(group)
+                    if bbox:
+                        tiles.append((self._draw_block(group, bbox), bbox[:2]))
+                # 同时保存 Logo 的引用，保证作为缓存键的 id 在条目存活期间不被复用
+                return tiles, [logo for _, _, logo in logos]
+
+        key = (self.config.CANVAS_WIDTH, self.config.CANVAS_HEIGHT) + tuple(
+            (position, id(logo)) for _, position, logo in logos)
+        tiles, _ = self.static_layer_cache.get_or_create(key, build)
+        with self.metrics.span("canvas_compose"):
+            canvas = Image.new('RGBA', (self.config.CANVAS_WIDTH, self.config.CANVAS_HEIGHT), (255, 255, 255, 0))
+            for tile, position in tiles:
+                canvas.paste(tile, position)
+            self._draw_elements(canvas, texts)
+        return canvas
+
+    def render_overlay(self, city: str, location: str, camera: str, lens: str,
+                       font_size: int = None, signature_logo_width: int = None) -> CroppedOverlay:
+        """
+        只渲染包含内容的区域：布局中的各内容块（默认为左侧的地点 Logo + 地点文本和右侧的签名 Logo + 信息文本）
+        各自绘制在与其边界框等大的小图上，不分配完整画布。
+        """
+        with self.metrics.span("render_overlay"):
+            blocks = [(block, position) for _, block, position in self._render_blocks(
+                city, location, camera, lens, font_size=font_size, signature_logo_width=signature_logo_width)]
+        return CroppedOverlay((self.config.CANVAS_WIDTH, self.config.CANVAS_HEIGHT), blocks)
+
+    def render_preview(self, city: str, location: str, camera: str, lens: str, width: int,
+                       font_size: int = None, signature_logo_width: int = None) -> Image.Image:
+        """
+        渲染宽度为 width 的低分辨率预览 (RGBA，透明背景)，供 GUI 实时显示。
+        各内容块缩放后的结果按 (块缓存键, 宽度) 缓存，只修改一侧输入时只重新渲染和缩放该侧。
+        """
+        scale = width / self.config.CANVAS_WIDTH
+        preview = Image.new('RGBA', (width, max(1, round(self.config.CANVAS_HEIGHT * scale))), (255, 255, 255, 0))
+        for key, block, (x, y) in self._render_blocks(city, location, camera, lens, font_size=font_size,
+                                                      signature_logo_width=signature_logo_width):
+            size = (max(1, round(block.width * scale)), max(1, round(block.height * scale)))
+            if key is None:
+                scaled = block.resize(size, Image.Resampling.LANCZOS)
+            else:
+                scaled = self.block_cache.get_or_create(
+                    ("preview", width) + key, lambda: block.resize(size, Image.Resampling.LANCZOS))
+            preview.paste(scaled, (round(x * scale), round(y * scale)))
+        return preview
+
+    def _scale_overlay(self, overlay: CroppedOverlay, width: int):
+        """
+        将紧凑图层按 width / CANVAS_WIDTH 等比缩放，用于贴到不同宽度的照片上。
+        返回 (缩放后的图层, (x, y) 偏移, 缩放后的画布高度)。
+        """
+        img, (offset_x, offset_y) = overlay.to_compact()
+        scale = width / self.config.CANVAS_WIDTH
+        canvas_height = max(1, round(self.config.CANVAS_HEIGHT * scale))
+        if scale != 1:
+            scaled_size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+            img = img.resize(scaled_size, Image.Resampling.LANCZOS)
+        return img, (round(offset_x * scale), round(offset_y * scale)), canvas_height
+
+    def composite_photo(self, photo: Image.Image, city: str, location: str, camera: str, lens: str,
+                        font_size: int = None, signature_logo_width: int = None, placement: str = None) -> Image.Image:
+        """
+        在内存中把水印合成到已解码的照片上，返回合成结果，不编码、不写文件。
+        placement 为 over 时水印叠加在照片底部（直接修改 photo），为 below 时在照片下方追加一条底色为 PHOTO_BAR_COLOR 的水印栏。
+        """
+        placement = placement or self.config.PHOTO_PLACEMENT
+        if placement not in ("over", "below"):
+            raise ConfigurationError(f"不支持的水印位置: '{placement}'（仅支持 over / below）")
+        overlay = self.render_overlay(city, location, camera, lens,
+                                      font_size=font_size, signature_logo_width=signature_logo_width)
+        with self.metrics.span("photo_composite"):
+            # 水印画布宽度与照片宽度对齐
+            overlay_img, (offset_x, offset_y), canvas_height = self._scale_overlay(overlay, photo.width)
+
+            if placement == "below":
+                result = Image.new(photo.mode, (photo.width, photo.height + canvas_height),
+                                   self.config.PHOTO_BAR_COLOR + ((255,) if photo.mode == "RGBA" else ()))
+                result.paste(photo, (0, 0))
+                canvas_top = photo.height
+            else:
+                result = photo
+                canvas_top = photo.height - canvas_height
+
+            self._paste_with_alpha(result, overlay_img, (offset_x, canvas_top + offset_y))
+        return result
+
+    def composite_onto_photo(self, photo_path: str, output_path: str, city: str, location: str, camera: str,
+                             lens: str, font_size: int = None, signature_logo_width: int = None,
+                             placement: str = None, photo: Image.Image = None):
+        """
+        将水印直接合成到照片上并保存，省去先输出透明 PNG 再二次合成的解码/编码开销。
+        合成由 composite_photo 完成，位置的含义见该方法。
+        photo 为已解码的照片（可选），未提供时从 photo_path 读取。
+        """
+        try:
+            if photo is None:
+                with self.metrics.span("photo_load"):
+                    photo = load_photo(photo_path, self.config.PHOTO_MAX_DIMENSION)
+            result = self.composite_photo(photo, city, location, camera, lens, font_size=font_size,
+                                          signature_logo_width=signature_logo_width, placement=placement)
+            with self.metrics.span("photo_save"):
+                save_photo(result, output_path, photo.info, self.config.PHOTO_JPEG_QUALITY)
+            self.metrics.increment("photos_composited")
+            logger.info(f"水印已合成到照片并保存到: {output_path}")
+            return True
+        except (FileProcessingError, ImageProcessingError, ConfigurationError) as e:
+            self.metrics.increment("render_errors")
+            logger.error(f"合成照片水印时发生错误: {e}")
+            raise
+        except Exception as e:
+            self.metrics.increment("render_errors")
+            logger.error(f"合成照片水印时发生未知错误: {e}")
+            raise ImageProcessingError(f"合成照片水印时发生未知错误: {e}")
+
+    def iter_photo_jobs(self, jobs, prefetch: int = None):
+        """
+        按顺序处理照片合成任务，逐个产出 JobResult。
+        jobs 可以是列表或生成器，在调用方线程中按需读取；后台线程预先解码之后至多 prefetch 张照片，
+        使解码与合成/编码重叠，同一时刻驻留内存的照片不超过 prefetch + 1 张。
+        不含 photo_path 的任务照常生成透明水印图片。
+        """
+        if prefetch is None:
+            prefetch = self.config.PHOTO_PREFETCH
+        prefetch = max(1, prefetch)
+
+        def load(job):
+            with self.metrics.span("photo_load"):
+                return load_photo(job["photo_path"], self.config.PHOTO_MAX_DIMENSION)
+
+        indexed_jobs = enumerate(jobs)
+        pending = deque() # (序号, 任务, 解码照片的 Future 或 None)
+        decoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="photo-loader")
+        try:
+            while True:
+                # 当前任务之后保持 prefetch 个任务在解码
+                while len(pending) <= prefetch:
+                    item = next(indexed_jobs, None)
+                    if item is None:
+                        break
+                    index, job = item
+                    pending.append((index, job, decoder.submit(load, job) if job.get("photo_path") else None))
+                if not pending:
+                    break
+                index, job, future = pending.popleft()
+                photo, error = None, None
+                if future is not None:
+                    try:
+                        photo = future.result()
+                    except Exception as e:
+                        error = e
+                start = time.perf_counter()
+                if error is None:
+                    try:
+                        if job.get("photo_path"):
+                            self.composite_onto_photo(photo=photo, **job)
+                        elif job.get("widths"):
+                            self.generate_watermark_sizes(**job)
+                        else:
+                            self.generate_watermark(**job)
+                    except Exception as e:
+                        error = e
+                    finally:
+                        if photo is not None:
+                            photo.close()
+                elapsed = time.perf_counter() - start
+                if error is None:
+                    yield JobResult(index, job.get("output_path"), True, elapsed=elapsed)
+                else:
+                    yield JobResult(index, job.get("output_path"), False, str(error), elapsed)
+        finally:
+            # 调用方提前停止迭代或读取任务出错时，取消尚未开始的解码，释放已预解码但未处理的照片
+            decoder.shutdown(wait=True, cancel_futures=True)
+            for _, _, future in pending:
+                if future is not None and not future.cancelled() and future.exception() is None:
+                    future.result().close()
+
+    def _asset_hashes(self):
+        """字体和 Logo 文件的内容哈希，首次使用时计算一次。"""
+        if self._asset_hash_cache is None:
+            try:
+                self._asset_hash_cache = (hash_file(self.config.FONT_PATH),
+                                          hash_file(self.config.LOCATION_LOGO_PATH if self.location_logo else None),
+                                          hash_file(self.config.SIGNATURE_LOGO_PATH if self.signature_logo else None))
+            except OSError as e:
+                raise FileProcessingError(f"无法读取字体或 Logo 文件计算哈希: {e}")
+        return self._asset_hash_cache
+
+    def output_cache_key(self, city: str, location: str, camera: str, lens: str, output_path: str,
+                         font_size: int = None, signature_logo_width: int = None) -> str:
+        """
+        计算输出缓存键：覆盖实际绘制的文本、字体与 Logo 文件内容、字号、签名宽度、
+        影响版面的配置项、编译后的布局（含 at_width 视图换算后的偏移）以及编码参数，任何一项变化都会得到不同的键。
+        """
+        location_text, info_text = self._compose_texts(city, location, camera, lens)
+        config = self.config
+        return hash_key_fields((
+            OUTPUT_CACHE_KEY_VERSION,
+            location_text, info_text,
+            self._asset_hashes(),
+            font_size or config.DEFAULT_FONT_SIZE,
+            signature_logo_width if signature_logo_width is not None else config.DEFAULT_SIGNATURE_LOGO_WIDTH,
+            config.CANVAS_WIDTH, config.CANVAS_HEIGHT, config.PADDING, config.LOCATION_LOGO_TEXT_SPACING,
+            config.TEXT_COLOR_R, config.TEXT_COLOR_G, config.TEXT_COLOR_B, config.TEXT_COLOR_A,
+            config.LOCATION_VERTICAL_OFFSET, config.LOCATION_TEXT_HORIZONTAL_OFFSET,
+            config.LOGO_PREMULTIPLIED_ALPHA, config.RENDER_MODE,
+            self.layout_plan.signature(),
+            self.encoder.cache_fields(),
+            os.path.splitext(output_path)[1].lower()
+        ))
+
+    def render_image(self, city: str, location: str, camera: str, lens: str,
+                     font_size: int = None, signature_logo_width: int = None):
+        """
+        在内存中渲染水印，不编码、不写文件，返回 (RGBA 图片, (x, y) 偏移)。
+        RENDER_MODE 为 full 时返回完整画布，偏移为 (0, 0)；为 cropped 时只返回内容区域及其在完整画布中的偏移。
+        返回的图片归调用方所有，可以直接用于后续合成。
+        full 模式下启用静态图层缓存时在预渲染的 Logo 底图上只绘制文本。
+        """
+        if self.config.RENDER_MODE == "full" and self.static_layer_cache is not None:
+            canvas = self._render_on_static_layer(city, location, camera, lens, font_size=font_size,
+                                                  signature_logo_width=signature_logo_width)
+            if canvas is not None:
+                return canvas, (0, 0)
+        overlay = self.render_overlay(city, location, camera, lens,
+                                      font_size=font_size, signature_logo_width=signature_logo_width)
+        with self.metrics.span("canvas_compose"):
+            if self.config.RENDER_MODE == "cropped":
+                return overlay.to_compact()
+            # 完整画布只在编码前分配一次
+            return overlay.to_full_canvas(), (0, 0)
+
+    def _scale_length(self, value: int):
+        """把以原始画布像素为单位的长度（字号、签名宽度）换算到本视图的画布，None 保持为 None。"""
+        if value is None or self.scale == 1:
+            return value
+        return max(1, round(value * self.scale))
+
+    def _create_scaled_view(self, width: int) -> "ImageProcessor":
+        scale = width / self.config.CANVAS_WIDTH
+        config = copy.copy(self.config)
+        config.CANVAS_WIDTH = width
+        config.CANVAS_HEIGHT = max(1, round(self.config.CANVAS_HEIGHT * scale))
+        config.DEFAULT_FONT_SIZE = max(1, round(self.config.DEFAULT_FONT_SIZE * scale))
+        config.DEFAULT_SIGNATURE_LOGO_WIDTH = max(1, round(self.config.DEFAULT_SIGNATURE_LOGO_WIDTH * scale))
+
+        # 浅拷贝共享字体、Logo、文本和内容块缓存以及已解码的 Logo 原图和指标
+        view = copy.copy(self)
+        view.config, view.scale, view._base = config, scale, self
+        view._font = None
+        if self.static_layer_cache is not None:
+            # 每种尺寸的 Logo 底图各占一个条目，分开缓存避免多种尺寸交替渲染时互相挤出
+            view.static_layer_cache = LRUCache(max_entries=self.config.STATIC_LAYER_CACHE_SIZE)
+        # 布局中的偏移量仍以原始画布为单位，在编译时按比例换算
+        view.layout_plan = compile_layout(self._layout_spec, self.config, (config.CANVAS_WIDTH, config.CANVAS_HEIGHT),
+                                          name=self.layout_name, scale=scale)
+        logger.debug(f"已创建 {width}x{config.CANVAS_HEIGHT} 的缩放视图，缩放比例 {scale:.3f}")
+        return view
+
+    def at_width(self, width: int) -> "ImageProcessor":
+        """
+        返回画布宽度为 width 的渲染视图，画布高度、默认字号、签名宽度和布局偏移按 width / CANVAS_WIDTH 等比换算。
+        视图与本实例共享字体、Logo 原图及各级缓存，文本和 Logo 在目标尺寸下重新光栅化和缩放，而不是缩放成品位图。
+        视图按宽度缓存，宽度等于 CANVAS_WIDTH 时返回原实例。
+        """
+        base = self._base or self
+        if width == base.config.CANVAS_WIDTH:
+            return base
+        if not isinstance(width, int) or width <= 0:
+            raise ConfigurationError(f"画布宽度必须是正整数，当前为 {width}")
+        # 先在原实例上加载 Logo，视图共享同一份解码结果
+        base._get_logos()
+        with base._views_lock:
+            view = base._scaled_views.get(width)
+            if view is None:
+                view = base._scaled_views[width] = base._create_scaled_view(width)
+        return view
+
+    def render_sizes(self, city: str, location: str, camera: str, lens: str, widths,
+                     font_size: int = None, signature_logo_width: int = None) -> dict:
+        """
+        按多个画布宽度渲染同一水印，返回 {宽度: (RGBA 图片, (x, y) 偏移)}，偏移含义同 render_image。
+        font_size 和 signature_logo_width 以原始画布 (CANVAS_WIDTH) 的像素为单位，在每种尺寸下按比例换算。
+        """
+        results = {}
+        for width in dict.fromkeys(widths):
+            view = self.at_width(width)
+            results[width] = view.render_image(city, location, camera, lens,
+                                               font_size=view._scale_length(font_size),
+                                               signature_logo_width=view._scale_length(signature_logo_width))
+        return results
+
+    def generate_watermark_sizes(self, city: str, location: str, camera: str, lens: str, output_path: str,
+                                 widths, font_size: int = None, signature_logo_width: int = None) -> list:
+        """
+        按多个画布宽度生成同一水印，每种尺寸在 output_path 的扩展名前追加宽度（如 a_4000.png），返回输出路径列表。
+        参数单位同 render_sizes，每种尺寸的写文件、输出缓存和旁路文件与 generate_watermark 相同。
+        """
+        output_paths = []
+        for width in dict.fromkeys(widths):
+            view = self.at_width(width)
+            path = sized_output_path(output_path, width)
+            view.generate_watermark(city, location, camera, lens, path,
+                                    font_size=view._scale_length(font_size),
+                                    signature_logo_width=view._scale_length(signature_logo_width))
+            output_paths.append(path)
+        return output_paths
+
+    def _encode_image(self, img: Image.Image, offset: tuple, fp):
+        """按编码配置写入 fp（路径或二进制文件对象），cropped 模式的 PNG 把偏移写入文本块。"""
+        with self.metrics.span("encode"):
+            if self.config.RENDER_MODE == "cropped" and self.encoder.format == "png":
+                canvas_size = (self.config.CANVAS_WIDTH, self.config.CANVAS_HEIGHT)
+                self.encoder.encode(img, fp, pnginfo=build_offset_pnginfo(offset, canvas_size))
+            else:
+                self.encoder.encode(img, fp)
+
+    def render_into(self, buffer: io.BytesIO, city: str, location: str, camera: str, lens: str,
+                    font_size: int = None, signature_logo_width: int = None) -> tuple:
+        """
+        渲染并编码到可复用的 buffer（先清空），不经过磁盘，返回 (x, y) 偏移。
+        编码后的数据为 buffer.getbuffer()[:buffer.tell()]，可以零拷贝地交给上传或合成环节；
+        再次复用 buffer 前需释放由 getbuffer() 得到的 memoryview。
+        """
+        try:
+            img, offset = self.render_image(city, location, camera, lens,
+                                            font_size=font_size, signature_logo_width=signature_logo_width)
+            buffer.seek(0)
+            buffer.truncate()
+            self._encode_image(img, offset, buffer)
+            self.metrics.increment("images_generated")
+            return offset
+        except (FileProcessingError, ImageProcessingError, ConfigurationError):
+            self.metrics.increment("render_errors")
+            raise
+        except Exception as e:
+            self.metrics.increment("render_errors")
+            raise ImageProcessingError(f"渲染水印时发生未知错误: {e}")
+
+    def render_bytes(self, city: str, location: str, camera: str, lens: str,
+                     font_size: int = None, signature_logo_width: int = None) -> bytes:
+        """
+        渲染并返回编码后的字节串。cropped 模式的 PNG 中带有偏移文本块，
+        其他格式的 cropped 输出需要偏移时请使用 render_into 或 render_image。
+        """
+        buffer = io.BytesIO()
+        self.render_into(buffer, city, location, camera, lens,
+                         font_size=font_size, signature_logo_width=signature_logo_width)
+        return buffer.getvalue()
+
     def generate_watermark(self, city: str, location: str, camera: str, lens: str, output_path: str,
                            font_size: int = None, signature_logo_width: int = None):
         """
-        生成带有定制水印的透明 PNG 图片。
+        生成带有定制水印的透明图片，格式和压缩参数由 OUTPUT_FORMAT 等编码配置决定。
+        RENDER_MODE 为 cropped 时只输出内容区域，偏移和原画布尺寸写入 PNG 文本块（其他格式写入 .json 旁路文件）。
+        渲染由 render_image 完成，本方法只负责输出缓存和写文件。
         """
         try:
-            # 更新字体大小（如果用户指定）
-            current_font = self.font
-            if font_size and font_size != self.config.DEFAULT_FONT_SIZE:
-                try:
-                    current_font = ImageFont.truetype(self.config.FONT_PATH, font_size)
-                except IOError as e:
-                    raise FileProcessingError(f"无法加载指定字体大小的字体文件 '{self.config.FONT_PATH}': {e}")
-
-            # 创建透明画布
-            img = Image.new('RGBA', (self.config.CANVAS_WIDTH, self.config.CANVAS_HEIGHT), (255, 255, 255, 0))
-            draw = ImageDraw.Draw(img)
-
-            text_color = (self.config.TEXT_COLOR_R, self.config.TEXT_COLOR_G,
-                          self.config.TEXT_COLOR_B, self.config.TEXT_COLOR_A)
-
-            # 组合文本信息
-            location_text = f"{city}{self.config.LOCATION_SEPARATOR}{location}".upper()
-            info_text = f"SHOT ON {camera}{self.config.CAMERA_LENS_SEPARATOR}{lens}".upper()
-
-            # 计算文本尺寸
-            location_text_width, location_text_height = self._get_text_dimensions(location_text, current_font)
-            info_text_width, info_text_height = self._get_text_dimensions(info_text, current_font)
-
-            # 确定共同的底部 Y 坐标
-            common_bottom_y = self.config.CANVAS_HEIGHT - self.config.PADDING
-
-            # --- 绘制左侧部分 (地点 Logo + 地点文本) ---
-            current_x_left = self.config.PADDING
-            
-            # 绘制地点 Logo
-            scaled_location_logo = None
-            
-            # 绘制地点文本 (先计算文本的Y坐标，因为Logo要和文本底部对齐)
-            location_text_y = common_bottom_y - location_text_height
-            location_text_x = current_x_left + self.config.LOCATION_TEXT_HORIZONTAL_OFFSET
-            draw.text((location_text_x, location_text_y), location_text, font=current_font, fill=text_color)
-            
-            if self.location_logo:
-                # 缩放地点 Logo 使其与地点文本高度等高
-                scaled_location_logo = self._resize_logo_to_text_height(self.location_logo, location_text_height)
-                
-                # 计算地点 Logo 的 Y 坐标，使其底部与文本底部对齐，并应用垂直偏移量
-                location_logo_y = location_text_y + location_text_height - scaled_location_logo.height + self.config.LOCATION_VERTICAL_OFFSET
-                
-                # 计算地点 Logo 的 X 坐标，使其在文本左侧，并考虑文本的水平偏移量
-                location_logo_x = current_x_left + self.config.LOCATION_TEXT_HORIZONTAL_OFFSET - self.config.LOCATION_LOGO_TEXT_SPACING - scaled_location_logo.width
-                
-                img.paste(scaled_location_logo, (location_logo_x, location_logo_y), scaled_location_logo)
-                
-                # 更新左侧部分的起始X坐标，以便后续计算总宽度（如果需要）
-                # current_x_left += scaled_location_logo.width + self.config.LOCATION_LOGO_TEXT_SPACING + location_text_width
-            else:
-                # 如果没有Logo，只移动文本的起始X坐标
-                # current_x_left += location_text_width # 文本已经绘制，这里只是为了后续计算
-                pass # 文本已经绘制，不需要再移动 current_x_left
-
-            # --- 绘制右侧部分 (签名 Logo + 信息文本) ---
-            current_x_right = self.config.CANVAS_WIDTH - self.config.PADDING
-
-            # 绘制信息文本 (相机 & 镜头)
-            info_text_x = current_x_right - info_text_width
-            info_text_y = common_bottom_y - info_text_height
-            draw.text((info_text_x, info_text_y), info_text, font=current_font, fill=text_color)
-            
-            # 绘制签名 Logo (在信息文本上方，右对齐)
-            scaled_signature_logo = None
-            if self.signature_logo:
-                if signature_logo_width is None:
-                    signature_logo_width = self.config.DEFAULT_SIGNATURE_LOGO_WIDTH
-                
-                original_sig_width, original_sig_height = self.signature_logo.size
-                if original_sig_width == 0:
-                    sig_logo_height = original_sig_height
-                else:
-                    sig_logo_height = int(original_sig_height * (signature_logo_width / original_sig_width))
-                
-                scaled_signature_logo = self.signature_logo.resize((signature_logo_width, sig_logo_height), Image.Resampling.LANCZOS)
-                
-                # 签名Logo的X坐标与信息文本右对齐
-                sig_logo_x = current_x_right - scaled_signature_logo.width
-                # 签名Logo在信息文本上方，垂直间距为 PADDING / 2
-                sig_logo_y = info_text_y - (self.config.PADDING // 2) - scaled_signature_logo.height
-                
-                img.paste(scaled_signature_logo, (sig_logo_x, sig_logo_y), scaled_signature_logo)
+            cache_key = None
+            # cropped 模式下不支持文本块的格式把偏移写入旁路文件，缓存时一并保存和输出
+            sidecar = self.config.RENDER_MODE == "cropped" and self.encoder.format != "png"
+            if self.output_cache:
+                with self.metrics.span("output_cache_lookup"):
+                    cache_key = self.output_cache_key(city, location, camera, lens, output_path,
+                                                      font_size=font_size, signature_logo_width=signature_logo_width)
+                    hit = self.output_cache.fetch(cache_key, output_path, sidecar=sidecar)
+                if hit:
+                    self.metrics.increment("output_cache_hits")
+                    logger.info(f"命中输出缓存，水印图片已输出到: {output_path}")
+                    return True
+                self.metrics.increment("output_cache_misses")
+                self.output_cache.prepare_output(output_path)
+
+            img, offset = self.render_image(city, location, camera, lens,
+                                            font_size=font_size, signature_logo_width=signature_logo_width)
 
             # 保存图片
-            img.save(output_path)
+            self._encode_image(img, offset, output_path)
+            if sidecar:
+                write_offset_sidecar(output_path, offset, (self.config.CANVAS_WIDTH, self.config.CANVAS_HEIGHT))
+            if self.metrics.enabled:
+                self.metrics.increment("bytes_written", os.path.getsize(output_path))
+            if cache_key:
+                with self.metrics.span("output_cache_store"):
+                    self.output_cache.store(cache_key, output_path, sidecar=sidecar)
+            self.metrics.increment("images_generated")
             logger.info(f"水印图片已成功生成并保存到: {output_path}")
             return True
         except (FileProcessingError, ImageProcessingError, ConfigurationError) as e:
+            self.metrics.increment("render_errors")
             logger.error(f"生成水印时发生错误: {e}")
             raise
         except Exception as e:
+            self.metrics.increment("render_errors")
             logger.error(f"生成水印时发生未知错误: {e}")
             raise ImageProcessingError(f"生成水印时发生未知错误: {e}")
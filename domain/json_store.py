@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+def write_json_atomic(path: str, data, indent: int = None):
+    """先写入同目录下的临时文件并落盘，再原子替换目标文件，中途崩溃不会留下写了一半的文件。"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=indent, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+class JsonFileStore:
+    """
+    延迟写入的 JSON 文件：schedule 只记录最新的数据快照，后台线程在 delay 秒内没有新的写入请求后
+    才写盘，连续多次修改合并为一次写入，调用方（如 GUI 主线程）不会被序列化和磁盘 I/O 阻塞。
+    传入的数据在写盘前不得再被修改，调用方应传入副本。
+    """
+    def __init__(self, path: str, delay: float = 0.5, indent: int = 4):
+        self.path = path
+        self.delay = delay
+        self.indent = indent
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock() # 保证同一时刻只有一个线程在写文件
+        self._pending = None
+        self._has_pending = False
+        self._version = 0 # 每次 schedule 递增
+        self._written_version = 0 # 已写盘的最新版本，防止旧快照覆盖新快照
+        self._due = 0.0
+        self._closed = False
+        self._thread = None
+        self.writes = 0
+
+    def schedule(self, data):
+        """登记要写入的数据，覆盖尚未写盘的旧快照。"""
+        with self._condition:
+            if self._closed:
+                raise RuntimeError(f"JsonFileStore '{self.path}' 已关闭")
+            self._pending = data
+            self._has_pending = True
+            self._version += 1
+            self._due = time.monotonic() + self.delay
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="json-store-writer", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _take_pending(self):
+        """取出待写入的快照，调用方需持有 _condition。"""
+        data = self._pending
+        self._pending = None
+        self._has_pending = False
+        return data, self._version
+
+    def _write(self, data, version: int):
+        with self._write_lock:
+            if version <= self._written_version:
+                return
+            try:
+                write_json_atomic(self.path, data, self.indent)
+                self._written_version = version
+                self.writes += 1
+                logger.info(f"数据已保存到 {self.path}")
+            except Exception as e:
+                logger.error(f"保存数据到 '{self.path}' 失败: {e}")
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed:
+                    if self._has_pending:
+                        remaining = self._due - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._condition.wait(remaining)
+                    else:
+                        self._condition.wait()
+                if self._closed:
+                    return
+                data, version = self._take_pending()
+            self._write(data, version)
+
+    def flush(self):
+        """立即在当前线程写入尚未写盘的数据（如程序退出前）。"""
+        with self._condition:
+            pending = self._take_pending() if self._has_pending else None
+        if pending:
+            self._write(*pending)
+        else:
+            # 等待后台线程可能正在进行的写入完成
+            with self._write_lock:
+                pass
+
+    def close(self):
+        """写入剩余数据并停止后台线程。"""
+        self.flush()
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,274 @@
+import re
+import json
+import logging
+from domain.exceptions import ConfigurationError
+
+logger = logging.getLogger(__name__)
+
+# 元素及参照物上的锚点，值为 (水平位置, 垂直位置)，0/1/2 分别为左(上)/中/右(下)
+ANCHORS = {
+    "top-left": (0, 0), "top": (1, 0), "top-right": (2, 0),
+    "left": (0, 1), "center": (1, 1), "right": (2, 1),
+    "bottom-left": (0, 2), "bottom": (1, 2), "bottom-right": (2, 2),
+}
+
+# 文本模板可用的字段；location_text 和 info_text 为按分隔符组合并转为大写后的文本
+TEXT_FIELDS = ("city", "location", "camera", "lens", "location_text", "info_text")
+
+# 偏移量中的单项：整数或配置项名称，可带负号和整除，如 "-PADDING//2"
+_OFFSET_TERM = re.compile(r"^(-)?([A-Z][A-Z0-9_]*|\d+)(?://(\d+))?$")
+
+# 内置布局。元素按声明顺序绘制；每个元素用自身的 anchor 点对齐参照物 (to: canvas 或同一块中先声明的元素 id)
+# 的 at 点，再平移 (dx, dy)。文本元素的框为文本蒙版边界框的宽高，Logo 为缩放后的尺寸
+BUILTIN_LAYOUTS = {
+    # 左下角为地点 Logo + 地点文本，右下角为信息文本及其上方的签名 Logo
+    "default": {"blocks": [
+        {"name": "left", "elements": [
+            {"id": "location_text", "type": "text", "text": "{location_text}",
+             "anchor": "bottom-left", "to": "canvas", "at": "bottom-left",
+             "dx": ["PADDING", "LOCATION_TEXT_HORIZONTAL_OFFSET"], "dy": "-PADDING"},
+            {"id": "location_logo", "type": "logo", "logo": "location", "height": "location_text",
+             "anchor": "bottom-right", "to": "location_text", "at": "bottom-left",
+             "dx": "-LOCATION_LOGO_TEXT_SPACING", "dy": "LOCATION_VERTICAL_OFFSET"},
+        ]},
+        {"name": "right", "elements": [
+            {"id": "info_text", "type": "text", "text": "{info_text}",
+             "anchor": "bottom-right", "to": "canvas", "at": "bottom-right", "dx": "-PADDING", "dy": "-PADDING"},
+            {"id": "signature_logo", "type": "logo", "logo": "signature", "width": "signature",
+             "anchor": "bottom-right", "to": "info_text", "at": "top-right", "dy": "-PADDING//2"},
+        ]},
+    ]},
+    # 顶部横条：左上角为地点，右上角为信息文本，签名 Logo 在信息文本左侧
+    "top_bar": {"blocks": [
+        {"name": "left", "elements": [
+            {"id": "location_text", "type": "text", "text": "{location_text}",
+             "anchor": "top-left", "to": "canvas", "at": "top-left",
+             "dx": ["PADDING", "LOCATION_TEXT_HORIZONTAL_OFFSET"], "dy": "PADDING"},
+            {"id": "location_logo", "type": "logo", "logo": "location", "height": "location_text",
+             "anchor": "bottom-right", "to": "location_text", "at": "bottom-left",
+             "dx": "-LOCATION_LOGO_TEXT_SPACING", "dy": "LOCATION_VERTICAL_OFFSET"},
+        ]},
+        {"name": "right", "elements": [
+            {"id": "info_text", "type": "text", "text": "{info_text}",
+             "anchor": "top-right", "to": "canvas", "at": "top-right", "dx": "-PADDING", "dy": "PADDING"},
+            {"id": "signature_logo", "type": "logo", "logo": "signature", "width": "signature",
+             "anchor": "top-right", "to": "info_text", "at": "top-left", "dx": "-PADDING"},
+        ]},
+    ]},
+    # 居中：底部居中为信息文本，其上依次为地点文本 (左侧为地点 Logo) 和签名 Logo
+    "centered": {"blocks": [
+        {"name": "center", "elements": [
+            {"id": "info_text", "type": "text", "text": "{info_text}",
+             "anchor": "bottom", "to": "canvas", "at": "bottom", "dy": "-PADDING"},
+            {"id": "location_text", "type": "text", "text": "{location_text}",
+             "anchor": "bottom", "to": "info_text", "at": "top", "dy": "-PADDING//2"},
+            {"id": "location_logo", "type": "logo", "logo": "location", "height": "location_text",
+             "anchor": "bottom-right", "to": "location_text", "at": "bottom-left",
+             "dx": "-LOCATION_LOGO_TEXT_SPACING", "dy": "LOCATION_VERTICAL_OFFSET"},
+            {"id": "signature_logo", "type": "logo", "logo": "signature", "width": "signature",
+             "anchor": "bottom", "to": "location_text", "at": "top", "dy": "-PADDING//2"},
+        ]},
+    ]},
+    # 左下角逐行堆叠：自下而上为信息文本、地点文本 (左侧为地点 Logo)、签名 Logo
+    "stacked": {"blocks": [
+        {"name": "left", "elements": [
+            {"id": "info_text", "type": "text", "text": "{info_text}",
+             "anchor": "bottom-left", "to": "canvas", "at": "bottom-left",
+             "dx": ["PADDING", "LOCATION_TEXT_HORIZONTAL_OFFSET"], "dy": "-PADDING"},
+            {"id": "location_text", "type": "text", "text": "{location_text}",
+             "anchor": "bottom-left", "to": "info_text", "at": "top-left", "dy": "-PADDING//2"},
+            {"id": "location_logo", "type": "logo", "logo": "location", "height": "location_text",
+             "anchor": "bottom-right", "to": "location_text", "at": "bottom-left",
+             "dx": "-LOCATION_LOGO_TEXT_SPACING", "dy": "LOCATION_VERTICAL_OFFSET"},
+            {"id": "signature_logo", "type": "logo", "logo": "signature", "width": "signature",
+             "anchor": "bottom-left", "to": "location_text", "at": "top-left", "dy": "-PADDING//2"},
+        ]},
+    ]},
+}
+
+def _anchor(name: str, where: str):
+    if name not in ANCHORS:
+        raise ConfigurationError(f"{where} 的锚点 '{name}' 无效，可选: {', '.join(ANCHORS)}")
+    return ANCHORS[name]
+
+def _anchor_offset(steps: int, length: int) -> int:
+    """锚点在长度为 length 的边上的位置，steps 为 0/1/2 (起点/中点/终点)。"""
+    return 0 if steps == 0 else (length // 2 if steps == 1 else length)
+
+def resolve_offset(value, config, where: str = "偏移量") -> int:
+    """把偏移量（整数、单项字符串或它们的列表，列表各项相加）按配置解析为整数。"""
+    if value is None:
+        return 0
+    if isinstance(value, int):
+        return value
+    if isinstance(value, (list, tuple)):
+        return sum(resolve_offset(item, config, where) for item in value)
+    match = _OFFSET_TERM.match(str(value).replace(" ", ""))
+    if not match:
+        raise ConfigurationError(f"{where} '{value}' 无效，应为整数或配置项名称，如 PADDING、-PADDING//2")
+    negative, name, divisor = match.groups()
+    if name.isdigit():
+        number = int(name)
+    else:
+        number = getattr(config, name, None)
+        if not isinstance(number, int) or isinstance(number, bool):
+            raise ConfigurationError(f"{where} 引用的配置项 '{name}' 不存在或不是整数")
+    if divisor:
+        number //= int(divisor)
+    return -number if negative else number
+
+class LayoutElement:
+    """编译后的布局元素：内容、尺寸规则，以及相对参照物的对齐方式（偏移已解析为整数）。"""
+    def __init__(self, element_id: str, kind: str, content: str, anchor: tuple, ref: int, at: tuple,
+                 dx: int, dy: int, height_ref: int = None, width=None):
+        self.id = element_id
+        self.kind = kind # text / logo
+        self.content = content # 文本模板或 Logo 名称 (location / signature)
+        self.anchor = anchor
+        self.ref = ref # 参照元素在块中的序号，None 表示画布
+        self.at = at
+        self.dx = dx
+        self.dy = dy
+        self.height_ref = height_ref # Logo 与该序号的文本元素等高
+        self.width = width # Logo 的宽度："signature" 为每次渲染指定的签名宽度，整数为固定宽度
+        self.static_target = None # 参照画布时预先计算好的对齐点
+
+class LayoutBlock:
+    """
+    编译后的内容块，元素按声明顺序定位和绘制（元素只能参照先声明的元素）。
+    文本模板和是否用到签名宽度决定了块的缓存键。
+    """
+    def __init__(self, name: str, elements: list):
+        self.name = name
+        self.elements = elements
+        self.uses_signature_width = any(e.kind == "logo" and e.width == "signature" for e in elements)
+
+    def texts(self, fields: dict) -> tuple:
+        """本块中各文本元素的实际文本（非文本元素为 None），用作缓存键的一部分。"""
+        return tuple(e.content.format_map(fields) if e.kind == "text" else None for e in self.elements)
+
+    def place(self, sizes: list) -> list:
+        """
+        根据每个元素的 (宽, 高) 计算其左上角在画布上的位置，只有整数加减，返回与 elements 对应的列表。
+        """
+        positions = [None] * len(self.elements)
+        for index, element in enumerate(self.elements):
+            width, height = sizes[index]
+            if element.ref is None:
+                target_x, target_y = element.static_target
+            else:
+                ref_x, ref_y = positions[element.ref]
+                ref_width, ref_height = sizes[element.ref]
+                target_x = ref_x + _anchor_offset(element.at[0], ref_width)
+                target_y = ref_y + _anchor_offset(element.at[1], ref_height)
+            positions[index] = (target_x + element.dx - _anchor_offset(element.anchor[0], width),
+                                target_y + element.dy - _anchor_offset(element.anchor[1], height))
+        return positions
+
+class LayoutPlan:
+    """某个布局在指定画布尺寸下的编译结果，可在任意多次渲染之间复用。"""
+    def __init__(self, name: str, canvas_size: tuple, blocks: list):
+        self.name = name
+        self.canvas_size = canvas_size
+        self.blocks = blocks
+
+    def signature(self) -> tuple:
+        """
+        编译结果中影响像素的全部内容：画布尺寸以及各元素的内容、锚点、参照和已解析（含缩放）的偏移与宽度，
+        用作输出缓存键的一部分。布局定义相同但画布或缩放比例不同的编译结果得到不同的值。
+        """
+        return (self.canvas_size,) + tuple(
+            (block.name,) + tuple((e.kind, e.content, e.anchor, e.ref, e.at, e.dx, e.dy, e.height_ref, e.width,
+                                   e.static_target) for e in block.elements)
+            for block in self.blocks)
+
+def _scale_length(value: int, scale: float) -> int:
+    return value if scale == 1 else round(value * scale)
+
+def compile_layout(spec: dict, config, canvas_size: tuple = None, name: str = "custom",
+                   scale: float = 1.0) -> LayoutPlan:
+    """
+    校验声明式布局并编译为 LayoutPlan：解析偏移量中的配置项、确定元素的定位顺序，
+    并预先计算参照画布的对齐点。布局无效时抛出 ConfigurationError。
+    布局中的偏移量和固定宽度以原始画布 (CANVAS_WIDTH) 的像素为单位，scale 不为 1 时按比例换算到目标画布。
+    """
+    if canvas_size is None:
+        canvas_size = (config.CANVAS_WIDTH, config.CANVAS_HEIGHT)
+    canvas_width, canvas_height = canvas_size
+    if not isinstance(spec, dict) or not isinstance(spec.get("blocks"), list) or not spec["blocks"]:
+        raise ConfigurationError(f"布局 '{name}' 必须包含非空的 blocks 列表")
+
+    blocks = []
+    for block_index, block_spec in enumerate(spec["blocks"]):
+        block_name = str(block_spec.get("name") or f"block{block_index}")
+        ids, elements = {}, []
+        for element_spec in block_spec.get("elements") or []:
+            element_id = str(element_spec.get("id") or f"{block_name}.{len(elements)}")
+            where = f"布局 '{name}' 中的元素 '{element_id}'"
+            if element_id in ids:
+                raise ConfigurationError(f"{where} 的 id 重复")
+            kind = element_spec.get("type")
+            height_ref, width = None, None
+            if kind == "text":
+                content = str(element_spec.get("text", ""))
+                try:
+                    content.format_map({field: "" for field in TEXT_FIELDS})
+                except (KeyError, ValueError, IndexError) as e:
+                    raise ConfigurationError(f"{where} 的文本模板无效: {e}，可用字段: {', '.join(TEXT_FIELDS)}")
+            elif kind == "logo":
+                content = element_spec.get("logo")
+                if content not in ("location", "signature"):
+                    raise ConfigurationError(f"{where} 的 logo 只能是 location 或 signature")
+                if "height" in element_spec:
+                    height_ref = ids.get(element_spec["height"])
+                    if height_ref is None or elements[height_ref].kind != "text":
+                        raise ConfigurationError(f"{where} 的 height 必须是同一块中先声明的文本元素")
+                else:
+                    width = element_spec.get("width", "signature")
+                    if width != "signature" and not (isinstance(width, int) and width > 0):
+                        raise ConfigurationError(f"{where} 的 width 只能是 signature 或正整数")
+                    if width != "signature":
+                        width = max(1, _scale_length(width, scale))
+            else:
+                raise ConfigurationError(f"{where} 的 type 只能是 text 或 logo")
+
+            target = element_spec.get("to", "canvas")
+            if target == "canvas":
+                ref = None
+            elif target in ids:
+                ref = ids[target]
+            else:
+                raise ConfigurationError(f"{where} 参照的 '{target}' 必须是 canvas 或同一块中先声明的元素")
+            element = LayoutElement(element_id, kind, content,
+                                    _anchor(element_spec.get("anchor", "top-left"), where), ref,
+                                    _anchor(element_spec.get("at", element_spec.get("anchor", "top-left")), where),
+                                    _scale_length(resolve_offset(element_spec.get("dx"), config, f"{where} 的 dx"), scale),
+                                    _scale_length(resolve_offset(element_spec.get("dy"), config, f"{where} 的 dy"), scale),
+                                    height_ref, width)
+            if ref is None:
+                element.static_target = (_anchor_offset(element.at[0], canvas_width),
+                                         _anchor_offset(element.at[1], canvas_height))
+            ids[element_id] = len(elements)
+            elements.append(element)
+        if elements:
+            blocks.append(LayoutBlock(block_name, elements))
+    return LayoutPlan(name, canvas_size, blocks)
+
+def load_layout_spec(config) -> tuple:
+    """
+    按配置 LAYOUT 返回 (布局名称, 布局定义)。LAYOUT_FILE 中定义的同名布局优先于内置布局。
+    """
+    layouts = dict(BUILTIN_LAYOUTS)
+    if config.LAYOUT_FILE:
+        try:
+            with open(config.LAYOUT_FILE, 'r', encoding='utf-8') as f:
+                custom = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise ConfigurationError(f"无法读取布局文件 '{config.LAYOUT_FILE}': {e}")
+        if not isinstance(custom, dict):
+            raise ConfigurationError(f"布局文件 '{config.LAYOUT_FILE}' 必须是 {{布局名称: 布局定义}} 形式的 JSON 对象")
+        layouts.update(custom)
+        logger.info(f"已从 '{config.LAYOUT_FILE}' 加载 {len(custom)} 个布局")
+    if config.LAYOUT not in layouts:
+        raise ConfigurationError(f"未知的布局 '{config.LAYOUT}'，可选: {', '.join(sorted(layouts))}")
+    return config.LAYOUT, layouts[config.LAYOUT]
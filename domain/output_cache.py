@@ -0,0 +1,168 @@
+import os
+import shutil
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 本进程写入的字节数达到上限的这一比例时重新统计缓存目录：并行批量时每个工作进程都在写同一目录，
+# 各自的计数不含其他进程的条目，定期重新统计使目录最多超出上限约 进程数 × 此比例
+RESCAN_FRACTION = 0.05
+
+def hash_file(path: str) -> str:
+    """计算文件内容的 SHA-256，路径为空时返回空字符串。"""
+    if not path:
+        return ""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def hash_key_fields(fields) -> str:
+    """将参与渲染的字段序列化后计算 SHA-256，作为缓存键。"""
+    digest = hashlib.sha256()
+    for field in fields:
+        digest.update(repr(field).encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+class OutputCache:
+    """
+    按内容寻址的输出缓存：以渲染输入的哈希为键保存已生成的图片，
+    命中时用硬链接（或复制）输出，不再重新渲染和编码。
+    缓存目录按总大小限制，超出时按最近使用时间淘汰；多个进程可以共用同一目录（见 RESCAN_FRACTION）。
+    带偏移旁路文件的输出（cropped 模式的 WebP/TIFF）把 {输出}.json 作为条目的一部分一并缓存和输出。
+    """
+    def __init__(self, cache_dir: str, max_bytes: int, use_hardlinks: bool = True):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.use_hardlinks = use_hardlinks
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self.total_bytes = sum(size for _, size in self._scan_entries())
+        self._unscanned_bytes = 0 # 上次统计目录后本进程写入的字节数
+
+    def _entry_path(self, key: str, extension: str) -> str:
+        # 按键的前两位分子目录，避免单个目录下文件过多
+        return os.path.join(self.cache_dir, key[:2], key + extension)
+
+    def _scan_entries(self) -> list:
+        """遍历缓存目录，返回按最近使用时间从旧到新排列的 (路径, 字节数) 列表。"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue # 可能已被其他进程淘汰
+                entries.append((stat.st_mtime, path, stat.st_size))
+        entries.sort()
+        return [(path, size) for _, path, size in entries]
+
+    def _place(self, source: str, destination: str):
+        """把 source 放到 destination：优先硬链接，失败（如跨磁盘）时复制。"""
+        temp_path = f"{destination}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            if self.use_hardlinks:
+                try:
+                    os.link(source, temp_path)
+                except OSError:
+                    shutil.copyfile(source, temp_path)
+            else:
+                shutil.copyfile(source, temp_path)
+            os.replace(temp_path, destination)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def fetch(self, key: str, output_path: str, sidecar: bool = False) -> bool:
+        """
+        缓存命中时把已渲染的图片放到 output_path 并返回 True。
+        sidecar 为 True 时同时输出 {output_path}.json，旁路文件已被淘汰时按未命中处理。
+        """
+        entry_path = self._entry_path(key, os.path.splitext(output_path)[1].lower())
+        try:
+            if sidecar:
+                # 先放旁路文件：图片缺失时即使留下旁路文件，也会在重新渲染时被覆盖
+                self._place(f"{entry_path}.json", f"{output_path}.json")
+            self._place(entry_path, output_path)
+            os.utime(entry_path) # 更新最近使用时间，供 LRU 淘汰参考
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def prepare_output(self, output_path: str):
+        """
+        重新渲染前删除已存在的输出文件及其旁路文件。输出可能是缓存条目的硬链接，
+        直接覆盖写入会连带改掉缓存中的内容。
+        """
+        for path in (output_path, f"{output_path}.json"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def store(self, key: str, output_path: str, sidecar: bool = False):
+        """
+        把刚渲染好的图片登记到缓存中，sidecar 为 True 时连同 {output_path}.json 一起登记。
+        失败只记录日志，不影响本次输出。
+        """
+        entry_path = self._entry_path(key, os.path.splitext(output_path)[1].lower())
+        try:
+            os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+            size = 0
+            if sidecar:
+                self._place(f"{output_path}.json", f"{entry_path}.json")
+                size += os.path.getsize(f"{entry_path}.json")
+            self._place(output_path, entry_path)
+            size += os.path.getsize(entry_path)
+        except OSError as e:
+            logger.warning(f"写入输出缓存失败: {e}")
+            return
+        with self._lock:
+            self.total_bytes += size
+            self._unscanned_bytes += size
+            if self.total_bytes > self.max_bytes or self._unscanned_bytes >= self.max_bytes * RESCAN_FRACTION:
+                self._rescan()
+
+    def _rescan(self):
+        """
+        重新统计缓存目录的实际大小（包括其他进程写入的条目），超出上限时淘汰。调用方需持有锁。
+        """
+        entries = self._scan_entries()
+        total = sum(size for _, size in entries)
+        self._unscanned_bytes = 0
+        if total > self.max_bytes:
+            total = self._evict(entries, total)
+        self.total_bytes = total
+
+    def _evict(self, entries: list, total: int) -> int:
+        """按最近使用时间从旧到新删除条目，直到总大小降到上限的 90% 以下，返回剩余的总大小。"""
+        target = self.max_bytes * 0.9
+        removed = 0
+        for path, size in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        logger.info(f"输出缓存已淘汰 {removed} 个文件，当前占用 {total / 1024 / 1024:.1f} MB")
+        return total
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "bytes": self.total_bytes}
@@ -0,0 +1,77 @@
+import json
+from PIL import Image, PngImagePlugin
+
+# 紧凑模式下写入 PNG 文本块的键名，供下游合成工具还原位置
+OFFSET_TEXT_KEY = "WatermarkOffset"
+CANVAS_SIZE_TEXT_KEY = "WatermarkCanvasSize"
+
+class CroppedOverlay:
+    """
+    只包含有内容区域的水印图层。
+    blocks 为 [(RGBA 图片, (x, y))]，坐标相对于完整画布，各块互不重叠。
+    """
+    def __init__(self, canvas_size: tuple, blocks: list):
+        self.canvas_size = canvas_size
+        self.blocks = blocks
+
+    @property
+    def bbox(self):
+        """所有内容块的并集 (left, top, right, bottom)，没有内容时为 None。"""
+        if not self.blocks:
+            return None
+        return (min(x for _, (x, _) in self.blocks),
+                min(y for _, (_, y) in self.blocks),
+                max(x + image.width for image, (x, _) in self.blocks),
+                max(y + image.height for image, (_, y) in self.blocks))
+
+    def to_compact(self):
+        """
+        合并为一张只覆盖内容区域的图片，返回 (图片, (x, y) 偏移)。
+        没有内容时返回 1x1 的透明图片和 (0, 0) 偏移。
+        """
+        bbox = self.bbox
+        if bbox is None:
+            return Image.new('RGBA', (1, 1), (255, 255, 255, 0)), (0, 0)
+        left, top, right, bottom = bbox
+        img = Image.new('RGBA', (right - left, bottom - top), (255, 255, 255, 0))
+        for block, (x, y) in self.blocks:
+            img.paste(block, (x - left, y - top))
+        return img, (left, top)
+
+    def to_full_canvas(self):
+        """展开为完整尺寸的画布，内容块直接按位置拷贝。"""
+        img = Image.new('RGBA', self.canvas_size, (255, 255, 255, 0))
+        for block, position in self.blocks:
+            img.paste(block, position)
+        return img
+
+def build_offset_pnginfo(offset: tuple, canvas_size: tuple) -> PngImagePlugin.PngInfo:
+    """生成记录紧凑图层偏移和原画布尺寸的 PNG 文本块。"""
+    pnginfo = PngImagePlugin.PngInfo()
+    pnginfo.add_text(OFFSET_TEXT_KEY, f"{offset[0]},{offset[1]}")
+    pnginfo.add_text(CANVAS_SIZE_TEXT_KEY, f"{canvas_size[0]},{canvas_size[1]}")
+    return pnginfo
+
+def write_offset_sidecar(output_path: str, offset: tuple, canvas_size: tuple):
+    """不支持文本块的格式 (WebP/TIFF) 把偏移和画布尺寸写入同名的 .json 旁路文件。"""
+    with open(f"{output_path}.json", 'w', encoding='utf-8') as f:
+        json.dump({OFFSET_TEXT_KEY: list(offset), CANVAS_SIZE_TEXT_KEY: list(canvas_size)}, f)
+
+def read_offset_pnginfo(img: Image.Image):
+    """从紧凑图层的 PNG 文本块读取 ((x, y) 偏移, (宽, 高) 画布尺寸)，不存在时返回 None。"""
+    text = getattr(img, "text", None) or img.info
+    if OFFSET_TEXT_KEY not in text or CANVAS_SIZE_TEXT_KEY not in text:
+        return None
+    offset = tuple(int(v) for v in text[OFFSET_TEXT_KEY].split(","))
+    canvas_size = tuple(int(v) for v in text[CANVAS_SIZE_TEXT_KEY].split(","))
+    return offset, canvas_size
+
+def expand_compact_overlay(img: Image.Image) -> Image.Image:
+    """将带偏移信息的紧凑图层还原为完整画布；没有偏移信息时原样返回。"""
+    descriptor = read_offset_pnginfo(img)
+    if descriptor is None:
+        return img
+    offset, canvas_size = descriptor
+    canvas = Image.new('RGBA', canvas_size, (255, 255, 255, 0))
+    canvas.paste(img.convert('RGBA'), offset)
+    return canvas
@@ -0,0 +1,74 @@
+import os
+import logging
+from PIL import Image, ImageOps
+from domain.exceptions import FileProcessingError
+
+logger = logging.getLogger(__name__)
+
+# 支持直接合成水印的照片格式（按扩展名判断）
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".tif", ".tiff", ".png")
+
+def list_photos(photo_dir: str):
+    """按文件名顺序列出目录中支持的照片文件。"""
+    try:
+        names = sorted(os.listdir(photo_dir))
+    except OSError as e:
+        raise FileProcessingError(f"无法读取照片目录 '{photo_dir}': {e}")
+    return [os.path.join(photo_dir, name) for name in names
+            if os.path.splitext(name)[1].lower() in PHOTO_EXTENSIONS]
+
+def load_photo(photo_path: str, max_dimension: int = 0) -> Image.Image:
+    """
+    解码照片并转换为 RGB/RGBA。
+    max_dimension 大于 0 时把长边缩小到不超过该值：JPEG 先用 draft 在 DCT 阶段按 1/2、1/4、1/8 缩小解码，
+    其余格式用 reduce 做整数倍缩小，最后再用 LANCZOS 精确缩放到目标尺寸。
+    """
+    try:
+        img = Image.open(photo_path)
+        if max_dimension and max(img.size) > max_dimension:
+            scale = max_dimension / max(img.size)
+            target_size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+            # draft 只对 JPEG 生效，会选择不小于目标尺寸的最小缩放比例
+            img.draft("RGB", target_size)
+            factor = min(img.width // target_size[0], img.height // target_size[1])
+            if factor >= 2:
+                img = img.reduce(factor)
+            if img.size != target_size:
+                img = img.resize(target_size, Image.Resampling.LANCZOS)
+        else:
+            img.load()
+        # 按 EXIF 方向旋转，避免竖拍照片的水印贴在侧边
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+        return img
+    except FileNotFoundError:
+        raise FileProcessingError(f"照片文件未找到: {photo_path}")
+    except OSError as e:
+        raise FileProcessingError(f"无法读取照片 '{photo_path}': {e}")
+
+def save_photo(img: Image.Image, output_path: str, source_info: dict = None, jpeg_quality: int = 95, fp=None):
+    """
+    按输出扩展名保存照片，保留原图的 ICC 配置文件和 EXIF。
+    fp 为二进制文件对象时写入 fp 而不是 output_path，格式仍按 output_path 的扩展名确定。
+    """
+    source_info = source_info or {}
+    extension = os.path.splitext(output_path)[1].lower()
+    save_options = {}
+    if source_info.get("icc_profile"):
+        save_options["icc_profile"] = source_info["icc_profile"]
+    if extension in (".jpg", ".jpeg"):
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        save_options["quality"] = jpeg_quality
+        if source_info.get("exif"):
+            save_options["exif"] = source_info["exif"]
+    elif extension in (".tif", ".tiff"):
+        save_options["compression"] = "tiff_deflate"
+    try:
+        if fp is not None:
+            img.save(fp, format=Image.registered_extensions().get(extension), **save_options)
+        else:
+            img.save(output_path, **save_options)
+    except OSError as e:
+        raise FileProcessingError(f"无法保存照片 '{output_path}': {e}")
@@ -0,0 +1,160 @@
+import os
+import json
+import sqlite3
+import logging
+from domain.data_library import LIBRARY_KINDS, normalize_library_key
+from domain.exceptions import FileProcessingError
+
+logger = logging.getLogger(__name__)
+
+# 数据库结构版本，记录在 PRAGMA user_version 中
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS library_items (
+    kind  TEXT NOT NULL,              -- cities / locations_by_city / cameras / lenses
+    scope TEXT NOT NULL DEFAULT '',   -- 地点所属城市，其他种类为空字符串
+    norm  TEXT NOT NULL,              -- 规范化键 (忽略大小写和空白)，用于去重和前缀查询
+    value TEXT NOT NULL,              -- 库中写法
+    usage INTEGER NOT NULL DEFAULT 0, -- 使用次数，前缀查询结果按此排序
+    PRIMARY KEY (kind, scope, norm)
+) WITHOUT ROWID;
+"""
+
+# 比任何实际字符都大的哨兵，用于确定前缀区间的上界
+_PREFIX_END = chr(0x10FFFF)
+
+class _LibraryLookup:
+    """按规范化键查询库中写法的只读映射，接口与 build_library_lookup 返回的字典一致。"""
+    def __init__(self, library, kind: str):
+        self._library = library
+        self._kind = kind
+
+    def get(self, key: str, default=None):
+        row = self._library._connection.execute(
+            "SELECT value FROM library_items WHERE kind = ? AND scope = '' AND norm = ?",
+            (self._kind, key)).fetchone()
+        return row[0] if row else default
+
+class SqliteDataLibrary:
+    """
+    基于 SQLite 的数据库，与 JsonDataLibrary 接口一致。
+    前缀查询走 (kind, scope, norm) 主键索引的区间扫描，结果按使用次数排序；
+    新增条目和使用次数逐条写入，不必重写整个文件。
+    """
+    def __init__(self, db_path: str, migrate_from: str = None):
+        self.db_path = db_path
+        try:
+            self._connection = sqlite3.connect(db_path)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(_SCHEMA)
+            version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        except sqlite3.Error as e:
+            raise FileProcessingError(f"无法打开数据库 '{db_path}': {e}")
+        # 结构版本为 0 表示数据库是新建的，或上次打开时迁移失败
+        if version == 0:
+            self._initialize(migrate_from)
+
+    def _initialize(self, migrate_from: str):
+        """
+        从 data.json 迁移条目，成功后才写入结构版本。
+        迁移失败时保留版本 0，数据库照常使用，下次打开时重试迁移（已导入的条目不会重复）。
+        """
+        if migrate_from and os.path.exists(migrate_from):
+            try:
+                count = self.import_json(migrate_from)
+            except (FileProcessingError, sqlite3.Error) as e:
+                logger.warning(f"从 '{migrate_from}' 迁移到数据库 '{self.db_path}' 失败，下次打开时重试: {e}")
+                return
+            logger.info(f"已从 '{migrate_from}' 迁移 {count} 个条目到数据库 '{self.db_path}'")
+        self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _range_query(self, columns: str, kind: str, prefix: str, scope: str, order: str, limit: int = None):
+        key = normalize_library_key(prefix)
+        sql = (f"SELECT {columns} FROM library_items WHERE kind = ? AND scope = ? AND norm >= ? AND norm < ? "
+               f"ORDER BY {order}")
+        params = [kind, scope or "", key, key + _PREFIX_END]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._connection.execute(sql, params).fetchall()
+
+    def values(self, kind: str, scope: str = None, limit: int = None) -> list:
+        """返回某个库中最常用的 limit 个条目（None 为全部），按使用次数和字母顺序排列。"""
+        sql = "SELECT value FROM library_items WHERE kind = ? AND scope = ? ORDER BY usage DESC, norm"
+        params = [kind, scope or ""]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [row[0] for row in self._connection.execute(sql, params).fetchall()]
+
+    def contains(self, kind: str, value: str, scope: str = None) -> bool:
+        """库中是否已有该条目（忽略大小写和空白），走主键索引。"""
+        row = self._connection.execute(
+            "SELECT 1 FROM library_items WHERE kind = ? AND scope = ? AND norm = ?",
+            (kind, scope or "", normalize_library_key(value))).fetchone()
+        return row is not None
+
+    def search(self, kind: str, prefix: str, limit: int = None, scope: str = None) -> list:
+        """返回以 prefix 开头的条目，常用的排在前面，使用次数相同时按字母顺序。"""
+        rows = self._range_query("value", kind, prefix, scope, "usage DESC, norm", limit)
+        return [row[0] for row in rows]
+
+    def common_prefix(self, kind: str, prefix: str, scope: str = None) -> str:
+        """所有以 prefix 开头的条目的最长公共前缀，只需比较区间内按键排序的首尾两项。"""
+        first = self._range_query("value", kind, prefix, scope, "norm", 1)
+        if not first:
+            return ""
+        last = self._range_query("value", kind, prefix, scope, "norm DESC", 1)
+        return os.path.commonprefix([first[0][0], last[0][0]])
+
+    def add(self, kind: str, value: str, scope: str = None) -> bool:
+        """新增条目，已存在（忽略大小写和空白）时返回 False。"""
+        key = normalize_library_key(value)
+        if not key:
+            return False
+        with self._connection:
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO library_items (kind, scope, norm, value) VALUES (?, ?, ?, ?)",
+                (kind, scope or "", key, value))
+        return cursor.rowcount == 1
+
+    def record_use(self, kind: str, value: str, scope: str = None):
+        """使用次数加一，用于前缀查询的排序。"""
+        with self._connection:
+            self._connection.execute(
+                "UPDATE library_items SET usage = usage + 1 WHERE kind = ? AND scope = ? AND norm = ?",
+                (kind, scope or "", normalize_library_key(value)))
+
+    def lookup(self, kind: str) -> _LibraryLookup:
+        """返回按规范化键查询库中写法的映射，供 EXIF 型号对齐使用，不把整个库读入内存。"""
+        return _LibraryLookup(self, kind)
+
+    def import_json(self, json_path: str) -> int:
+        """
+        从 data.json 格式的文件导入全部条目，已存在的条目保持不变，返回新增的条目数。
+        """
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise FileProcessingError(f"无法读取库数据文件 '{json_path}': {e}")
+
+        groups = []
+        for kind in LIBRARY_KINDS:
+            if kind == "locations_by_city":
+                groups.extend((kind, city, locations) for city, locations in data.get("locations", {}).items())
+            else:
+                groups.append((kind, "", data.get(kind, [])))
+        rows = [(kind, scope, normalize_library_key(value), value)
+                for kind, scope, values in groups for value in values]
+
+        before = self._connection.total_changes
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO library_items (kind, scope, norm, value) VALUES (?, ?, ?, ?)",
+                (row for row in rows if row[2]))
+        return self._connection.total_changes - before
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,202 @@
+import os
+import sys
+import time
+import logging
+import argparse
+from domain.batch import read_manifest, build_job, JobResult
+from domain.exceptions import WatermarkGeneratorError
+from utils.filename_utils import FILENAME_FIELDS
+from utils.logger import setup_logging
+from utils.startup_timer import StartupTimer
+
+# 注意：此模块用于无显示环境（渲染节点），不得导入 tkinter
+# 依赖 Pillow 的模块在 run_batch 中按需导入，--help 和参数错误无需等待图像库加载
+
+logger = logging.getLogger(__name__)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="根据 CSV/JSONL 任务清单批量生成水印图片，或直接把水印合成到照片上（无界面）。")
+    parser.add_argument("manifest", nargs="?",
+                        help="任务清单路径 (.csv 或 .jsonl)，字段: city, location, camera, lens, "
+                             "[font_size], [signature_logo_width], [output], [photo], [placement]")
+    parser.add_argument("-o", "--output-dir", default=os.path.join(os.getcwd(), "output"),
+                        help="输出目录，默认为当前目录下的 output 文件夹")
+    parser.add_argument("--filename-fields", default="city,location,camera,lens",
+                        help="未指定 output 时用于拼接文件名的字段，逗号分隔 (默认: city,location,camera,lens)")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="渲染进程数，1 为在当前进程串行渲染，0 为使用全部 CPU 核心 (默认: 配置 BATCH_WORKERS)")
+    parser.add_argument("--widths",
+                        help="多分辨率输出：每个水印按这些画布宽度各输出一张，逗号分隔，如 3000,4000,6000，"
+                             "文件名追加 _宽度；照片合成任务不受影响 (默认: 配置 OUTPUT_WIDTHS)")
+
+    photo_group = parser.add_argument_group("照片合成", "不使用任务清单，直接给目录中的每张照片合成相同的水印")
+    photo_group.add_argument("--photo-dir", help="照片目录 (JPEG/TIFF/PNG)")
+    photo_group.add_argument("--city", help="城市")
+    photo_group.add_argument("--location", help="地点")
+    photo_group.add_argument("--camera", help="相机")
+    photo_group.add_argument("--lens", help="镜头")
+    photo_group.add_argument("--font-size", help="字体大小")
+    photo_group.add_argument("--signature-logo-width", help="签名Logo宽度")
+    photo_group.add_argument("--placement", choices=("over", "below"),
+                             help="水印位置 (默认: 配置 PHOTO_PLACEMENT)")
+    photo_group.add_argument("--exif", action="store_true",
+                             help="从照片 EXIF 读取相机和镜头型号，补全未指定的 camera / lens")
+
+    parser.add_argument("--fail-fast", action="store_true", help="遇到第一个失败的任务即停止")
+    parser.add_argument("-q", "--quiet", action="store_true", help="只输出失败记录和汇总信息")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="记录各渲染阶段的耗时和计数并在结束时写入 PATH (.prom 为 Prometheus 文本格式，其余为 JSON)")
+    args = parser.parse_args(argv)
+    if bool(args.manifest) == bool(args.photo_dir):
+        parser.error("必须且只能指定任务清单或 --photo-dir 之一")
+    return args
+
+def _photo_dir_records(args):
+    """为照片目录中的每张照片生成一条清单记录，产出 (序号, 记录字典)。"""
+    from domain.photo_io import list_photos
+
+    for number, photo_path in enumerate(list_photos(args.photo_dir), start=1):
+        yield number, {
+            "city": args.city,
+            "location": args.location,
+            "camera": args.camera,
+            "lens": args.lens,
+            "font_size": args.font_size,
+            "signature_logo_width": args.signature_logo_width,
+            "photo": photo_path,
+            "placement": args.placement
+        }
+
+def _report(result: JobResult, line_no: int, quiet: bool):
+    """输出单条任务的结果。"""
+    if result.success:
+        if not quiet:
+            print(f"[OK]   #{line_no} {result.output_path} ({result.elapsed * 1000:.1f} ms)")
+    else:
+        print(f"[FAIL] #{line_no} {result.output_path or ''} {result.error}", file=sys.stderr)
+
+def run_batch(args, startup_timer: StartupTimer = None) -> int:
+    """执行批量生成，返回进程退出码。"""
+    startup_timer = startup_timer or StartupTimer()
+    filename_fields = [f.strip() for f in args.filename_fields.split(",") if f.strip()]
+    unknown_fields = [f for f in filename_fields if f not in FILENAME_FIELDS]
+    if unknown_fields:
+        print(f"未知的文件名字段: {', '.join(unknown_fields)}", file=sys.stderr)
+        return 2
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    from application.services.watermark_service import WatermarkService
+    from domain.data_library import open_data_library
+    from domain.exif_index import ExifIndex, fill_camera_lens
+    from domain.image_encoder import OUTPUT_EXTENSIONS
+    from domain.config_loader import parse_widths
+    startup_timer.mark("导入渲染模块")
+
+    try:
+        service = WatermarkService()
+    except WatermarkGeneratorError as e:
+        print(f"初始化失败: {e}", file=sys.stderr)
+        return 2
+    if args.metrics:
+        # 工作进程通过 initargs 拿到同一份配置，也会记录指标
+        service.config.METRICS_ENABLED = True
+        service.image_processor.metrics.enabled = True
+    try:
+        widths = parse_widths(args.widths) if args.widths else service.config.OUTPUT_WIDTHS
+    except ValueError as e:
+        print(f"--widths 无效: {e}", file=sys.stderr)
+        return 2
+    startup_timer.mark("加载配置")
+
+    succeeded, failed = 0, 0
+    used_filenames = set()
+    start = time.perf_counter()
+
+    exif_index = None
+    if args.exif:
+        exif_index = ExifIndex(service.config.EXIF_INDEX_PATH)
+        # 相机库和镜头库的写法对齐表，SQLite 后端按需查询，不整体读入
+        data_library = open_data_library(service.config)
+        camera_lookup = data_library.lookup("cameras")
+        lens_lookup = data_library.lookup("lenses")
+
+    # 清单逐行读取并校验，无效记录立即报告，有效任务直接交给渲染引擎，整个清单不驻留内存
+    invalid, job_count, read_error = 0, 0, None
+    job_line_numbers = {} # 任务序号 -> 清单行号，结果报告后删除
+
+    def iter_jobs():
+        nonlocal invalid, job_count, read_error
+        try:
+            records = read_manifest(args.manifest) if args.manifest else _photo_dir_records(args)
+            for line_no, record in records:
+                try:
+                    if exif_index and record:
+                        record = fill_camera_lens(record, exif_index, camera_lookup, lens_lookup)
+                    job = build_job(record, args.output_dir, filename_fields, used_filenames,
+                                    OUTPUT_EXTENSIONS[service.config.OUTPUT_FORMAT],
+                                    max_font_size=service.config.CANVAS_HEIGHT,
+                                    max_logo_width=service.config.CANVAS_WIDTH)
+                except ValueError as e:
+                    _report(JobResult(-1, error=str(e)), line_no, args.quiet)
+                    invalid += 1
+                    if args.fail_fast:
+                        return
+                    continue
+                if widths and not job.get("photo_path"):
+                    # 同一任务的各尺寸共享布局、字体和 Logo 原图，在同一个渲染进程中依次输出
+                    job["widths"] = widths
+                job_line_numbers[job_count] = line_no
+                job_count += 1
+                yield job
+        except WatermarkGeneratorError as e:
+            read_error = e
+
+    try:
+        # 串行模式复用同一个 ImageProcessor；并行模式下每个工作进程各自加载一次字体和 Logo
+        first_result = True
+        for result in service.iter_batch(iter_jobs(), max_workers=args.workers):
+            if first_result:
+                # 首个渲染结果产出时字体和 Logo 已加载完毕，记录冷启动耗时
+                first_result = False
+                startup_timer.mark("首个任务完成")
+                logger.info(startup_timer.report())
+            _report(result, job_line_numbers.pop(result.index), args.quiet)
+            if result.success:
+                succeeded += 1
+            else:
+                failed += 1
+                if args.fail_fast:
+                    break
+    finally:
+        if exif_index:
+            exif_index.save()
+            data_library.close()
+    if read_error:
+        print(f"读取任务清单失败: {read_error}", file=sys.stderr)
+        return 2
+    failed += invalid
+
+    elapsed = time.perf_counter() - start
+    total = succeeded + failed
+    throughput = total / elapsed if elapsed > 0 else 0.0
+    print(f"完成: 共 {total} 条，成功 {succeeded} 条，失败 {failed} 条，"
+          f"耗时 {elapsed:.2f} 秒，吞吐量 {throughput:.1f} 张/秒")
+    if args.metrics:
+        try:
+            service.image_processor.export_metrics().write(args.metrics)
+            print(f"指标已写入 {args.metrics}")
+        except OSError as e:
+            print(f"写入指标文件失败: {e}", file=sys.stderr)
+    return 0 if failed == 0 else 1
+
+def main(argv=None, startup_timer: StartupTimer = None) -> int:
+    startup_timer = startup_timer or StartupTimer()
+    args = parse_args(argv)
+    setup_logging()
+    if args.quiet:
+        # 批量模式下每张图片的 INFO 日志过多，静默模式只保留警告及以上
+        logging.getLogger().setLevel(logging.WARNING)
+    startup_timer.mark("解析参数")
+    return run_batch(args, startup_timer)
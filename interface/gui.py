@@ -1,20 +1,42 @@
-import json
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import logging
-import re # 导入re模块用于正则表达式替换
 import os
 from PIL import Image, ImageTk # 导入PIL库
 from application.services.watermark_service import WatermarkService
 from domain.exceptions import WatermarkGeneratorError, ConfigurationError, FileProcessingError, ImageProcessingError
+from domain.data_library import open_data_library
+from domain.image_encoder import OUTPUT_EXTENSIONS
+from domain.json_store import JsonFileStore
+from interface.render_queue import RenderQueue, PENDING, RUNNING, SUCCEEDED, FAILED, CANCELLED
+from interface.preview_worker import PreviewWorker
+from utils.filename_utils import build_output_filename
+from utils.startup_timer import StartupTimer
 
 logger = logging.getLogger(__name__)
 
+# 轮询后台渲染队列状态的间隔 (毫秒)
+RENDER_QUEUE_POLL_MS = 100
+# 关闭窗口时等待正在渲染的任务完成的最长时间（秒）
+RENDER_SHUTDOWN_TIMEOUT = 10
+# 输入停止变化多久后刷新预览 (毫秒)
+PREVIEW_DEBOUNCE_MS = 150
+# 轮询后台预览结果的间隔 (毫秒)
+PREVIEW_POLL_MS = 30
+# 预览图宽度 (像素) 和背景色，深色背景便于看清白色水印
+PREVIEW_WIDTH = 560
+PREVIEW_BACKGROUND = (64, 64, 64, 255)
+# 库数据和会话数据在最后一次修改后延迟多久写盘 (秒)，连续修改合并为一次写入
+SAVE_DELAY_SECONDS = 1.0
+# 自动补全下拉列表最多显示的匹配数，输入为空时显示的条目数也以此为上限
+AUTOCOMPLETE_LIMIT = 50
+
 class WatermarkApp:
-    def __init__(self, master):
+    def __init__(self, master, startup_timer: StartupTimer = None):
         self.master = master
+        self.startup_timer = startup_timer or StartupTimer()
         master.title("水印生成")
-        master.geometry("600x460") # 调整窗口大小以容纳更多控件
+        master.geometry("600x640") # 调整窗口大小以容纳更多控件
         master.resizable(False, False)
 
         # 设置窗口图标
@@ -36,16 +58,46 @@ class WatermarkApp:
             self.watermark_service = WatermarkService()
             # 获取配置和库数据
             self.config = self.watermark_service.config
+            self.startup_timer.mark("加载配置")
         except WatermarkGeneratorError as e:
             messagebox.showerror("初始化错误", f"应用程序初始化失败: {e}\n请检查配置和文件路径。")
             master.destroy() # 如果服务无法初始化，则关闭应用程序
             return
 
+        # 会话数据在后台线程中延迟、原子地写入 config 目录
+        self.session_store = JsonFileStore(self.config.SESSION_FILE_PATH, delay=SAVE_DELAY_SECONDS)
+
+        # 城市、地点、相机、镜头库（data.json 或 SQLite，由 DATA_BACKEND 决定），提供前缀查询和增量新增
+        try:
+            self.data_library = open_data_library(self.config, save_delay=SAVE_DELAY_SECONDS)
+        except WatermarkGeneratorError as e:
+            messagebox.showerror("初始化错误", f"无法打开数据库: {e}")
+            master.destroy()
+            return
+
+        # 后台渲染队列，GUI 定时轮询其状态事件
+        self.render_queue = RenderQueue(self.watermark_service)
+        # 各任务提交时的会话快照，任务成功后保存，避免保存成渲染期间修改过的表单内容
+        self._job_sessions = {}
+        self.master.after(RENDER_QUEUE_POLL_MS, self._poll_render_queue)
+        # 预览在后台线程中渲染，只保留最新的请求
+        self.preview_worker = PreviewWorker(self.watermark_service, PREVIEW_WIDTH, PREVIEW_BACKGROUND)
+        self.master.after(PREVIEW_POLL_MS, self._poll_preview)
+
         self.create_widgets()
         self.set_default_output_path()
         self.load_session_data() # 加载上次会话数据
         self.load_default_input_values() # 加载默认输入值（如果会话数据为空）
         master.protocol("WM_DELETE_WINDOW", self.on_closing) # 绑定窗口关闭事件
+        self.startup_timer.mark("构建界面")
+        # 窗口显示后再在后台加载字体和 Logo
+        master.after_idle(self._on_window_ready)
+
+    def _on_window_ready(self):
+        """窗口首次空闲时记录启动耗时并开始预加载字体和 Logo。"""
+        self.startup_timer.mark("窗口就绪")
+        logger.info(self.startup_timer.report())
+        self.watermark_service.warm_up_in_background()
 
     def create_widgets(self):
         # 创建主框架
@@ -76,15 +128,15 @@ class WatermarkApp:
             
             self.vars[var_name] = tk.StringVar()
             
-            # 对于城市，直接从 config.cities 获取值
+            # 对于城市，直接从城市库获取值
             if is_city:
                 combobox = ttk.Combobox(row_frame, textvariable=self.vars[var_name],
-                                        values=self.config.cities)
+                                        values=self.data_library.values("cities", limit=AUTOCOMPLETE_LIMIT))
                 combobox.bind("<<ComboboxSelected>>", self.on_city_selected) # 城市选择事件
             else:
-                # 对于地点、相机、镜头，初始值为空或从config中获取
+                # 对于地点、相机、镜头，初始值为空或从库中获取（地点在选择城市后填充）
                 combobox = ttk.Combobox(row_frame, textvariable=self.vars[var_name],
-                                        values=getattr(self.config, data_key, []))
+                                        values=[] if data_key == "locations_by_city" else self.data_library.values(data_key, limit=AUTOCOMPLETE_LIMIT))
             
             combobox.pack(side=tk.LEFT, fill=tk.X, expand=True)
             combobox.bind("<KeyRelease>", lambda event, dk=data_key, cb=combobox, is_city_field=is_city: self.on_combobox_key_release(event, dk, cb, is_city_field))
@@ -141,6 +193,19 @@ class WatermarkApp:
         self.vars["camera_var"].trace_add("write", lambda *args: self.update_filename_preview())
         self.vars["lens_var"].trace_add("write", lambda *args: self.update_filename_preview())
 
+        # 水印预览
+        preview_frame = ttk.LabelFrame(main_frame, text="水印预览", padding="5")
+        preview_frame.pack(fill=tk.X, pady=(0, 10))
+        self.preview_label = ttk.Label(preview_frame, anchor="center")
+        self.preview_label.pack(fill=tk.X)
+        self.preview_photo = None # 保持对 PhotoImage 的引用，防止被回收
+        self._preview_after_id = None
+
+        # 输入变化时延迟刷新预览，连续输入只渲染最后一次
+        for var_name in ("city_var", "location_var", "camera_var", "lens_var",
+                         "font_size_var", "signature_logo_width_var"):
+            self.vars[var_name].trace_add("write", lambda *args: self.schedule_preview())
+
         # 状态信息 (移到按钮上方或下方，这里选择上方)
         self.status_label = ttk.Label(main_frame, text="", foreground="blue")
         self.status_label.pack(pady=0)
@@ -150,16 +215,21 @@ class WatermarkApp:
         button_container_frame.pack(fill=tk.X, pady=0)
 
         # 配置列权重
-        button_container_frame.grid_columnconfigure(0, weight=8) # 生成水印按钮
-        button_container_frame.grid_columnconfigure(1, weight=2) # 设置按钮
+        button_container_frame.grid_columnconfigure(0, weight=6) # 生成水印按钮
+        button_container_frame.grid_columnconfigure(1, weight=2) # 取消按钮
+        button_container_frame.grid_columnconfigure(2, weight=2) # 设置按钮
 
-        # 生成水印按钮
+        # 生成水印按钮（渲染期间可继续点击，任务会排队执行）
         generate_button = ttk.Button(button_container_frame, text="生成水印", command=self.generate_watermark)
         generate_button.grid(row=0, column=0, sticky="ew", padx=(0, 5)) # sticky="ew" 使按钮填充单元格
 
+        # 取消按钮
+        cancel_button = ttk.Button(button_container_frame, text="取消", command=self.cancel_watermark_jobs)
+        cancel_button.grid(row=0, column=1, sticky="ew", padx=5)
+
         # 设置按钮
         settings_button = ttk.Button(button_container_frame, text="设置", command=self.open_settings_window)
-        settings_button.grid(row=0, column=1, sticky="ew", padx=(5, 0)) # sticky="ew" 使按钮填充单元格
+        settings_button.grid(row=0, column=2, sticky="ew", padx=(5, 0)) # sticky="ew" 使按钮填充单元格
 
     def load_session_data(self):
         """从 config.last_session_data 加载上次会话数据并设置到GUI控件。"""
@@ -186,9 +256,9 @@ class WatermarkApp:
         else:
             logger.info("未找到上次会话数据，将加载默认配置。")
 
-    def save_session_data(self):
-        """保存当前GUI控件的值到 config/last_session.json。"""
-        session_data = {
+    def _collect_session_data(self) -> dict:
+        """读取当前GUI控件的值，格式与 config/last_session.json 相同。"""
+        return {
             "city": self.vars["city_var"].get().strip(),
             "location": self.vars["location_var"].get().strip(),
             "camera": self.vars["camera_var"].get().strip(),
@@ -198,17 +268,25 @@ class WatermarkApp:
             "output_path": self.vars["output_path_var"].get().strip(),
             "filename_config": {key: var.get() for key, var in self.filename_vars.items()} # 保存文件名配置
         }
-        session_file_path = 'config/last_session.json'
-        try:
-            with open(session_file_path, 'w', encoding='utf-8') as f:
-                json.dump(session_data, f, indent=4, ensure_ascii=False)
-            logger.info(f"会话数据已保存到 {session_file_path}")
-        except Exception as e:
-            logger.error(f"保存会话数据到 '{session_file_path}' 失败: {e}")
+
+    def save_session_data(self, session_data: dict = None):
+        """
+        保存会话数据到 config/last_session.json（后台延迟写入）。
+        session_data 为空时保存当前GUI控件的值。
+        """
+        self.session_store.schedule(session_data or self._collect_session_data())
 
     def on_closing(self):
         """处理窗口关闭事件，保存会话数据并退出。"""
         self.save_session_data()
+        if self._preview_after_id is not None:
+            self.master.after_cancel(self._preview_after_id)
+        # 等待正在渲染的任务写完文件，避免留下不完整的输出；预览不写文件，只通知其线程退出
+        self.preview_worker.shutdown(timeout=0)
+        self.render_queue.shutdown(timeout=RENDER_SHUTDOWN_TIMEOUT)
+        # 退出前写入尚未落盘的库数据和会话数据
+        self.data_library.close()
+        self.session_store.close()
         self.master.destroy()
 
     def load_default_input_values(self):
@@ -229,16 +307,18 @@ class WatermarkApp:
     def on_city_selected(self, event=None):
         """当城市Combobox选择改变时，更新地点Combobox的值。"""
         selected_city = self.vars["city_var"].get().strip().upper()
-        locations_for_city = self.config.locations_by_city.get(selected_city, [])
-        self.comboboxes["location_var"]['values'] = locations_for_city
+        # 下拉列表只放最常用的 AUTOCOMPLETE_LIMIT 个地点，是否在库中通过索引判断，不读入整个地点库
+        self.comboboxes["location_var"]['values'] = self.data_library.values(
+            "locations_by_city", selected_city, limit=AUTOCOMPLETE_LIMIT)
         
         # 尝试加载上次该城市使用的地点
         last_location_for_city = self.config.last_session_data.get(selected_city, "")
-        if last_location_for_city and last_location_for_city in locations_for_city:
+        if last_location_for_city and self.data_library.contains("locations_by_city", last_location_for_city, selected_city):
             self.vars["location_var"].set(last_location_for_city)
         else:
             # 如果当前地点不在新城市的地点列表中，则清空地点输入
-            if self.vars["location_var"].get().strip().upper() not in locations_for_city:
+            current_location = self.vars["location_var"].get().strip().upper()
+            if not self.data_library.contains("locations_by_city", current_location, selected_city):
                 self.vars["location_var"].set("")
 
     def on_combobox_key_release(self, event, data_key, combobox, is_city_field):
@@ -247,22 +327,17 @@ class WatermarkApp:
         """
         current_text = self.vars[combobox.winfo_name()].get().strip().upper()
         
-        # 获取当前库数据
-        if is_city_field:
-            all_values = self.config.cities
-        elif data_key == "locations_by_city":
-            selected_city = self.vars["city_var"].get().strip().upper()
-            all_values = self.config.locations_by_city.get(selected_city, [])
-        else:
-            all_values = getattr(self.config, data_key, [])
+        # 地点库按当前城市查询
+        city = self.vars["city_var"].get().strip().upper() if data_key == "locations_by_city" else None
         
+        matches = []
         if current_text:
-            # 过滤匹配的项
-            matches = [item for item in all_values if item.startswith(current_text)]
+            # 通过前缀索引过滤匹配的项，只取前 AUTOCOMPLETE_LIMIT 个
+            matches = self.data_library.search(data_key, current_text, AUTOCOMPLETE_LIMIT, scope=city)
             combobox['values'] = matches
         else:
-            # 如果输入为空，显示所有值
-            combobox['values'] = all_values
+            # 输入为空时只显示最常用的 AUTOCOMPLETE_LIMIT 个，不读入整个库
+            combobox['values'] = self.data_library.values(data_key, city, limit=AUTOCOMPLETE_LIMIT)
         
         # 尝试自动补全
         if matches and len(current_text) > 0:
@@ -273,8 +348,8 @@ class WatermarkApp:
                 if is_city_field: # 如果是城市字段，触发地点更新
                     self.on_city_selected()
             elif matches and event.keysym != "BackSpace" and event.keysym != "Delete":
-                # 尝试进行部分自动补全
-                longest_common_prefix = os.path.commonprefix(matches)
+                # 尝试进行部分自动补全（公共前缀覆盖全部匹配项，而不只是显示的前几个）
+                longest_common_prefix = self.data_library.common_prefix(data_key, current_text, scope=city)
                 if len(longest_common_prefix) > len(current_text):
                     combobox.set(longest_common_prefix)
                     combobox.icursor(tk.END) # 将光标移到末尾
@@ -286,59 +361,33 @@ class WatermarkApp:
             combobox.focus() # 确保焦点在combobox上
 
     def _add_to_data_library(self, data_key, new_item, city_for_location=None):
-        """将新项添加到对应的库中并保存。"""
+        """将新项添加到对应的库中（库负责保存），并记录一次使用。"""
         new_item = new_item.strip().upper()
         if not new_item:
             return False
 
+        scope = None
         if data_key == "locations_by_city":
-            if city_for_location:
-                city_for_location = city_for_location.strip().upper()
-                if city_for_location not in self.config.locations_by_city:
-                    self.config.locations_by_city[city_for_location] = []
-                
-                if new_item not in self.config.locations_by_city[city_for_location]:
-                    self.config.locations_by_city[city_for_location].append(new_item)
-                    self.config.locations_by_city[city_for_location].sort()
-                    self._save_data_libraries()
-                    # 更新地点Combobox的值
-                    if self.vars["city_var"].get().strip().upper() == city_for_location:
-                        self.comboboxes["location_var"]['values'] = self.config.locations_by_city[city_for_location]
-                    logger.info(f"已将 '{new_item}' 添加到 {city_for_location} 的地点库。")
-                    return True
+            if not city_for_location:
+                return False
+            scope = city_for_location.strip().upper()
+
+        # 库忽略大小写和空白，已有的不同写法不会重复加入
+        added = self.data_library.add(data_key, new_item, scope=scope)
+        self.data_library.record_use(data_key, new_item, scope=scope)
+        if not added:
+            return False
+
+        # 更新对应Combobox的值
+        if data_key == "locations_by_city":
+            if self.vars["city_var"].get().strip().upper() == scope:
+                self.comboboxes["location_var"]['values'] = self.data_library.values(data_key, scope, limit=AUTOCOMPLETE_LIMIT)
+            logger.info(f"已将 '{new_item}' 添加到 {scope} 的地点库。")
         else:
-            current_library = getattr(self.config, data_key)
-            if new_item not in current_library:
-                current_library.append(new_item)
-                current_library.sort() # 保持排序
-                self._save_data_libraries()
-                # 更新Combobox的值
-                for cb_name, cb_instance in self.comboboxes.items():
-                    # 找到对应的Combobox并更新其values
-                    if (data_key == "cities" and cb_name == "city_var") or \
-                       (data_key == "cameras" and cb_name == "camera_var") or \
-                       (data_key == "lenses" and cb_name == "lens_var"):
-                        cb_instance['values'] = current_library
-                logger.info(f"已将 '{new_item}' 添加到 {data_key} 库。")
-                return True
-        return False
-
-    def _save_data_libraries(self):
-        """将当前的库数据保存到 config/data.json 文件。"""
-        data_file_path = 'config/data.json'
-        data_to_save = {
-            "cities": self.config.cities,
-            "locations": self.config.locations_by_city, # 保存为字典
-            "cameras": self.config.cameras,
-            "lenses": self.config.lenses
-        }
-        try:
-            with open(data_file_path, 'w', encoding='utf-8') as f:
-                json.dump(data_to_save, f, indent=4, ensure_ascii=False)
-            logger.info(f"库数据已保存到 {data_file_path}")
-        except Exception as e:
-            logger.error(f"保存库数据到 '{data_file_path}' 失败: {e}")
-            messagebox.showerror("保存错误", f"无法保存库数据: {e}")
+            cb_name = {"cities": "city_var", "cameras": "camera_var", "lenses": "lens_var"}[data_key]
+            self.comboboxes[cb_name]['values'] = self.data_library.values(data_key, limit=AUTOCOMPLETE_LIMIT)
+            logger.info(f"已将 '{new_item}' 添加到 {data_key} 库。")
+        return True
 
     def set_default_output_path(self):
         """设置默认输出路径为当前工作目录下的 'output' 文件夹。"""
@@ -390,24 +439,54 @@ class WatermarkApp:
 
     def update_filename_preview(self):
         """根据勾选框和输入框内容更新文件名预览。"""
-        parts = []
-        if self.filename_vars["city"].get():
-            parts.append(self._sanitize_filename_part(self.vars["city_var"].get().strip()))
-        if self.filename_vars["location"].get():
-            parts.append(self._sanitize_filename_part(self.vars["location_var"].get().strip()))
-        if self.filename_vars["camera"].get():
-            parts.append(self._sanitize_filename_part(self.vars["camera_var"].get().strip()))
-        if self.filename_vars["lens"].get():
-            parts.append(self._sanitize_filename_part(self.vars["lens_var"].get().strip()))
-        
-        # 过滤空字符串并连接
-        filtered_parts = [p.replace(" ", "_") for p in parts if p]
-        if filtered_parts:
-            preview_name = "_".join(filtered_parts) + ".png"
-        else:
-            preview_name = "watermark.png" # 至少有一个默认文件名
-        
-        self.filename_preview_var.set(preview_name)
+        values = {
+            "city": self.vars["city_var"].get(),
+            "location": self.vars["location_var"].get(),
+            "camera": self.vars["camera_var"].get(),
+            "lens": self.vars["lens_var"].get()
+        }
+        selected_fields = [key for key, var in self.filename_vars.items() if var.get()]
+        extension = OUTPUT_EXTENSIONS[self.config.OUTPUT_FORMAT]
+        self.filename_preview_var.set(build_output_filename(values, selected_fields, extension))
+
+    def schedule_preview(self):
+        """输入变化时重新计时，PREVIEW_DEBOUNCE_MS 内没有新的输入才刷新预览。"""
+        if self._preview_after_id is not None:
+            self.master.after_cancel(self._preview_after_id)
+        self._preview_after_id = self.master.after(PREVIEW_DEBOUNCE_MS, self.update_preview)
+
+    def update_preview(self):
+        """
+        按当前输入请求低分辨率预览。渲染在 PreviewWorker 的后台线程中进行，结果由 _poll_preview 显示；
+        左右内容块分别缓存，只修改一侧时只重新渲染该侧。
+        """
+        self._preview_after_id = None
+        try:
+            font_size_str = self.vars["font_size_var"].get().strip()
+            signature_logo_width_str = self.vars["signature_logo_width_var"].get().strip()
+            font_size = int(font_size_str) if font_size_str else None
+            signature_logo_width = int(signature_logo_width_str) if signature_logo_width_str else None
+        except ValueError:
+            return # 数值输入不完整时保留上一次的预览
+        if (font_size is not None and font_size <= 0) or (signature_logo_width is not None and signature_logo_width <= 0):
+            return
+
+        self.preview_worker.request(
+            self.vars["city_var"].get().strip(),
+            self.vars["location_var"].get().strip(),
+            self.vars["camera_var"].get().strip(),
+            self.vars["lens_var"].get().strip(),
+            font_size=font_size,
+            signature_logo_width=signature_logo_width
+        )
+
+    def _poll_preview(self):
+        """定时取回后台渲染好的预览并显示（PhotoImage 只能在 Tk 主线程中创建）。"""
+        result = self.preview_worker.poll()
+        if result is not None:
+            self.preview_photo = ImageTk.PhotoImage(result.image)
+            self.preview_label.config(image=self.preview_photo)
+        self.master.after(PREVIEW_POLL_MS, self._poll_preview)
 
     def generate_watermark(self):
         """处理生成水印的逻辑。"""
@@ -448,31 +527,46 @@ class WatermarkApp:
         output_filename = self.filename_preview_var.get()
         output_path = os.path.join(output_dir, output_filename)
 
-        self.status_label.config(text="正在生成水印...", foreground="blue")
-        self.master.update_idletasks() # 强制更新GUI
-
-        try:
-            success = self.watermark_service.generate_watermark(
-                city=city,
-                location=location,
-                camera=camera,
-                lens=lens,
-                output_path=output_path,
-                font_size=font_size,
-                signature_logo_width=signature_logo_width
-            )
-            if success:
-                self.status_label.config(text=f"水印生成成功！文件保存至: {output_path}", foreground="green")
-                self.save_session_data() # 保存当前会话数据
-            else:
-                self.status_label.config(text="水印生成失败。", foreground="red")
-                logger.error("水印生成失败，请查看日志获取更多信息。")
-        except WatermarkGeneratorError as e:
-            self.status_label.config(text=f"水印生成失败: {e}", foreground="red")
-            logger.error(f"生成水印时发生错误: {e}")
-        except Exception as e:
-            self.status_label.config(text=f"水印生成失败: {e}", foreground="red")
-            logger.critical(f"生成水印时发生未知错误: {e}", exc_info=True)
+        # 提交到后台队列，渲染和编码在工作线程中进行，界面不会卡住
+        job = self.render_queue.submit({
+            "city": city,
+            "location": location,
+            "camera": camera,
+            "lens": lens,
+            "output_path": output_path,
+            "font_size": font_size,
+            "signature_logo_width": signature_logo_width
+        })
+        self._job_sessions[job.job_id] = self._collect_session_data()
+        logger.info(f"水印任务 #{job.job_id} 已加入队列: {output_path}")
+
+    def cancel_watermark_jobs(self):
+        """取消队列中所有尚未完成的水印任务。"""
+        if self.render_queue.active_count:
+            self.render_queue.cancel_all()
+            self.status_label.config(text="正在取消队列中的任务...", foreground="blue")
+
+    def _poll_render_queue(self):
+        """定时从后台队列取回任务状态并更新界面（只在 Tk 主线程中执行）。"""
+        for job, status in self.render_queue.poll_events():
+            remaining = self.render_queue.active_count
+            queue_info = f"（队列中还有 {remaining} 个任务）" if remaining else ""
+            if status == PENDING:
+                self.status_label.config(text=f"水印任务已加入队列{queue_info}", foreground="blue")
+            elif status == RUNNING:
+                self.status_label.config(text=f"正在生成水印...{queue_info}", foreground="blue")
+            elif status == SUCCEEDED:
+                self.status_label.config(text=f"水印生成成功！文件保存至: {job.output_path}{queue_info}", foreground="green")
+                # 保存该任务提交时的输入，而不是当前可能已被修改的表单
+                self.save_session_data(self._job_sessions.pop(job.job_id, None))
+            elif status == FAILED:
+                self.status_label.config(text=f"水印生成失败: {job.error}{queue_info}", foreground="red")
+                logger.error(f"水印任务 #{job.job_id} 失败: {job.error}")
+            elif status == CANCELLED:
+                self.status_label.config(text=f"水印任务已取消{queue_info}", foreground="orange")
+            if status in (FAILED, CANCELLED):
+                self._job_sessions.pop(job.job_id, None)
+        self.master.after(RENDER_QUEUE_POLL_MS, self._poll_render_queue)
 
     def open_settings_window(self):
         """打开设置窗口，允许修改 .env 配置。"""
@@ -542,9 +636,3 @@ class WatermarkApp:
 
         ttk.Button(settings_frame, text="保存设置", command=save_settings).pack(pady=10)
         ttk.Button(settings_frame, text="取消", command=settings_window.destroy).pack(pady=5)
-
-    def _sanitize_filename_part(self, part):
-        """替换文件名中不允许的字符为下划线。"""
-        # 替换 / \ : * ? " < > | 为下划线
-        invalid_chars = r'[\\/:*?"<>|]'
-        return re.sub(invalid_chars, '_', part)
@@ -0,0 +1,281 @@
+import sys
+import json
+import zipfile
+import logging
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from domain.batch import build_job
+from domain.exceptions import WatermarkGeneratorError, ServiceBusyError
+from utils.filename_utils import FILENAME_FIELDS
+from utils.logger import setup_logging
+from utils.startup_timer import StartupTimer
+
+# 注意：此模块用于无显示环境，不得导入 tkinter
+# 依赖 Pillow 的模块在 run_server 中按需导入，--help 和参数错误无需等待图像库加载
+
+logger = logging.getLogger(__name__)
+
+# 请求体的大小上限（字节），/batch 的任务清单也在此范围内
+MAX_REQUEST_BYTES = 4 * 1024 * 1024
+# /batch 响应按块发送，每块的大小
+CHUNK_SIZE = 64 * 1024
+# 返回 503 时建议客户端等待的秒数
+RETRY_AFTER_SECONDS = 1
+
+class RequestError(Exception):
+    """请求无效，携带要返回的 HTTP 状态码。"""
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class _ChunkedWriter:
+    """
+    以 HTTP/1.1 分块传输编码写出响应体的只写文件对象，供 zipfile 边生成边发送。
+    小块写入先在内存中累积到 CHUNK_SIZE 再发送；不支持 tell/seek，zipfile 会改用数据描述符。
+    """
+    def __init__(self, wfile):
+        self._wfile = wfile
+        self._pending = bytearray()
+
+    def write(self, data) -> int:
+        self._pending += data
+        if len(self._pending) >= CHUNK_SIZE:
+            self._send_pending()
+        return len(data)
+
+    def _send_pending(self):
+        if self._pending:
+            self._wfile.write(f"{len(self._pending):X}\r\n".encode("ascii") + self._pending + b"\r\n")
+            self._pending.clear()
+
+    def flush(self):
+        self._send_pending()
+
+    def close(self):
+        """发送剩余数据和结束块。"""
+        self._send_pending()
+        self._wfile.write(b"0\r\n\r\n")
+
+class WatermarkRequestHandler(BaseHTTPRequestHandler):
+    """
+    渲染服务的请求处理器：
+    POST /render 渲染单个水印并直接返回图片；POST /batch 渲染多个水印并以 zip 流式返回；
+    GET /health 返回渲染池状态；GET /metrics 返回 Prometheus 文本格式的指标。
+    """
+    server_version = "WatermarkGenerator/1.0"
+    protocol_version = "HTTP/1.1" # 支持长连接，连续请求不必重新握手
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} {format % args}")
+
+    def _send_bytes(self, status: int, body, content_type: str, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload, headers: dict = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self._send_bytes(status, body, "application/json; charset=utf-8", headers)
+
+    def _send_error_json(self, status: int, message: str, headers: dict = None):
+        self._send_json(status, {"error": message}, headers)
+
+    def _read_json(self):
+        """读取并解析 JSON 请求体。"""
+        length = self.headers.get("Content-Length")
+        if length is None:
+            raise RequestError(411, "缺少 Content-Length")
+        try:
+            length = int(length)
+        except ValueError:
+            raise RequestError(400, "Content-Length 无效")
+        if length > MAX_REQUEST_BYTES:
+            raise RequestError(413, f"请求体超过 {MAX_REQUEST_BYTES} 字节")
+        try:
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise RequestError(400, f"请求体不是有效的 JSON: {e}")
+
+    def _build_job(self, record, used_filenames: set = None, filename_fields=FILENAME_FIELDS) -> dict:
+        """校验单个渲染请求，返回 ImageProcessor 的关键字参数（output_path 为 zip 中的文件名）。"""
+        if not isinstance(record, dict):
+            raise RequestError(400, "渲染请求必须是 JSON 对象")
+        if record.get("photo"):
+            # 服务不读取服务器本地的照片文件
+            raise RequestError(400, "HTTP 服务不支持照片合成 (photo 字段)")
+        config = self.server.pool.service.config
+        try:
+            extension = self.server.pool.service.image_processor.encoder.extension
+            # 字号不超过画布高度、Logo 宽度不超过画布宽度，单个请求占用实例的时间和内存有上限
+            job = build_job(record, "", filename_fields, used_filenames, extension,
+                            max_font_size=config.CANVAS_HEIGHT, max_logo_width=config.CANVAS_WIDTH)
+        except ValueError as e:
+            raise RequestError(400, str(e))
+        return job
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/health":
+            self._send_json(200, {"status": "ok", **self.server.pool.status()})
+        elif path == "/metrics":
+            body = self.server.pool.export_metrics().to_prometheus().encode("utf-8")
+            self._send_bytes(200, body, "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self._send_error_json(404, f"未知的路径: {path}")
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0]
+        try:
+            if path == "/render":
+                self._handle_render()
+            elif path == "/batch":
+                self._handle_batch()
+            else:
+                # 请求体未读取，不能继续复用该连接
+                self.close_connection = True
+                self._send_error_json(404, f"未知的路径: {path}")
+        except RequestError as e:
+            # 请求体可能没有读完，不能继续复用该连接
+            self.close_connection = True
+            self._send_error_json(e.status, str(e))
+        except ServiceBusyError as e:
+            logger.warning(f"拒绝请求 {path}: {e}")
+            self._send_error_json(503, str(e), {"Retry-After": RETRY_AFTER_SECONDS})
+        except WatermarkGeneratorError as e:
+            self._send_error_json(500, str(e))
+        except (BrokenPipeError, ConnectionResetError):
+            logger.warning(f"客户端在响应 {path} 时断开连接")
+            self.close_connection = True
+
+    def _handle_render(self):
+        job = self._build_job(self._read_json())
+        del job["output_path"]
+        with self.server.pool.lease() as (processor, buffer):
+            offset = processor.render_into(buffer, **job)
+            headers = {"X-Watermark-Offset": f"{offset[0]},{offset[1]}"}
+            # 直接发送复用缓冲区的内容，不额外复制
+            with buffer.getbuffer() as view, view[:buffer.tell()] as body:
+                self._send_bytes(200, body, processor.encoder.mime_type, headers)
+
+    def _handle_batch(self):
+        payload = self._read_json()
+        records = payload.get("jobs") if isinstance(payload, dict) else payload
+        if not isinstance(records, list) or not records:
+            raise RequestError(400, "请求体必须是任务列表，或包含非空 jobs 列表的 JSON 对象")
+        max_jobs = self.server.pool.service.config.SERVER_MAX_BATCH_JOBS
+        if len(records) > max_jobs:
+            raise RequestError(413, f"单个批次最多 {max_jobs} 个任务，当前为 {len(records)} 个")
+        filename_fields = FILENAME_FIELDS
+        if isinstance(payload, dict) and payload.get("filename_fields"):
+            filename_fields = payload["filename_fields"]
+            if not isinstance(filename_fields, list) or not all(isinstance(f, str) for f in filename_fields):
+                raise RequestError(400, "filename_fields 必须是字符串列表")
+            unknown_fields = [f for f in filename_fields if f not in FILENAME_FIELDS]
+            if unknown_fields:
+                raise RequestError(400, f"未知的文件名字段: {', '.join(unknown_fields)}")
+
+        # 先校验全部任务，响应开始发送后就无法再返回错误状态码
+        # manifest.json 为结果清单保留，同名任务会追加序号
+        used_filenames, jobs = {"manifest.json"}, []
+        for index, record in enumerate(records):
+            try:
+                jobs.append(self._build_job(record, used_filenames, filename_fields))
+            except RequestError as e:
+                raise RequestError(e.status, f"第 {index} 个任务无效: {e}")
+
+        # 整个批次占用同一个实例，字体、文本和 Logo 缓存在任务之间复用
+        with self.server.pool.lease() as (processor, buffer):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/zip")
+            self.send_header("Content-Disposition", 'attachment; filename="watermarks.zip"')
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            writer = _ChunkedWriter(self.wfile)
+            results = []
+            # 图片已经过压缩，zip 中直接存储
+            with zipfile.ZipFile(writer, "w", compression=zipfile.ZIP_STORED) as archive:
+                for job in jobs:
+                    name = job.pop("output_path")
+                    try:
+                        offset = processor.render_into(buffer, **job)
+                    except WatermarkGeneratorError as e:
+                        results.append({"name": name, "error": str(e)})
+                        continue
+                    with buffer.getbuffer() as view, view[:buffer.tell()] as body:
+                        archive.writestr(name, body)
+                    results.append({"name": name, "offset": list(offset)})
+                # 单个任务失败不影响其他任务，结果清单记录每个文件的偏移或错误
+                archive.writestr("manifest.json", json.dumps(results, ensure_ascii=False, indent=4))
+            writer.close()
+        failed = sum(1 for result in results if "error" in result)
+        logger.info(f"批量请求完成：成功 {len(results) - failed} 条，失败 {failed} 条")
+
+class WatermarkHTTPServer(ThreadingHTTPServer):
+    """每个连接一个线程的 HTTP 服务器，渲染并发度由 RenderPool 限制。"""
+    daemon_threads = True
+
+    def __init__(self, server_address, pool):
+        self.pool = pool
+        super().__init__(server_address, WatermarkRequestHandler)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="启动本机 HTTP 渲染服务：POST /render 返回单张水印，POST /batch 返回 zip，"
+                    "GET /health 查看状态，GET /metrics 导出指标。")
+    parser.add_argument("--host", help="监听地址 (默认: 配置 SERVER_HOST)")
+    parser.add_argument("--port", type=int, help="监听端口，0 表示随机端口 (默认: 配置 SERVER_PORT)")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="预热的渲染实例数，0 为使用全部 CPU 核心 (默认: 配置 SERVER_WORKERS)")
+    parser.add_argument("--queue-size", type=int, default=None,
+                        help="实例都在忙时最多排队的请求数，超出返回 503 (默认: 配置 SERVER_QUEUE_SIZE)")
+    return parser.parse_args(argv)
+
+def create_server(host: str = None, port: int = None, workers: int = None, queue_size: int = None,
+                  service=None) -> WatermarkHTTPServer:
+    """创建并预热渲染池，返回尚未开始服务的 HTTP 服务器。"""
+    from application.services.watermark_service import WatermarkService
+    from application.services.render_pool import RenderPool
+
+    service = service or WatermarkService()
+    config = service.config
+    pool = RenderPool(service, size=workers, max_pending=queue_size)
+    pool.warm_up()
+    host = config.SERVER_HOST if host is None else host
+    port = config.SERVER_PORT if port is None else port
+    return WatermarkHTTPServer((host, port), pool)
+
+def run_server(args, startup_timer: StartupTimer = None) -> int:
+    """启动服务并阻塞直到收到 Ctrl+C，返回进程退出码。"""
+    startup_timer = startup_timer or StartupTimer()
+    try:
+        server = create_server(args.host, args.port, args.workers, args.queue_size)
+    except WatermarkGeneratorError as e:
+        print(f"初始化失败: {e}", file=sys.stderr)
+        return 2
+    except OSError as e:
+        print(f"无法监听端口: {e}", file=sys.stderr)
+        return 2
+    startup_timer.mark("预热渲染池")
+    logger.info(startup_timer.report())
+
+    host, port = server.server_address[:2]
+    print(f"渲染服务已启动: http://{host}:{port}/ (Ctrl+C 停止)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("收到中断信号，停止渲染服务")
+    finally:
+        server.server_close()
+    return 0
+
+def main(argv=None, startup_timer: StartupTimer = None) -> int:
+    startup_timer = startup_timer or StartupTimer()
+    args = parse_args(argv)
+    setup_logging()
+    startup_timer.mark("解析参数")
+    return run_server(args, startup_timer)
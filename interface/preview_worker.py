@@ -0,0 +1,80 @@
+import time
+import queue
+import logging
+import threading
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+class PreviewResult:
+    """一次预览渲染的结果：合成到背景色上的 RGB 图片和从提交到渲染完成的耗时。"""
+    def __init__(self, request_id: int, image: Image.Image, latency: float):
+        self.request_id = request_id
+        self.image = image
+        self.latency = latency # 秒，包括在工作线程中排队等待的时间
+
+class PreviewWorker:
+    """
+    在后台线程中渲染 GUI 的水印预览，避免渲染阻塞 Tk 主线程。
+    只渲染最新的请求：工作线程取请求时丢弃已被更新请求取代的旧请求。
+    工作线程不接触任何 Tk 对象，结果放入线程安全的队列，由 GUI 通过 after() 定时调用 poll 取回，
+    再在主线程中转换为 PhotoImage。
+    """
+    def __init__(self, watermark_service, width: int, background: tuple):
+        self.watermark_service = watermark_service
+        self.width = width
+        self.background = background
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+        self._request_id = 0
+        self._worker = threading.Thread(target=self._run, name="preview-worker", daemon=True)
+        self._worker.start()
+
+    def request(self, city: str, location: str, camera: str, lens: str,
+                font_size: int = None, signature_logo_width: int = None) -> int:
+        """提交预览请求，立即返回请求序号，不等待渲染。"""
+        self._request_id += 1
+        self._requests.put((self._request_id, time.perf_counter(), (city, location, camera, lens),
+                            {"font_size": font_size, "signature_logo_width": signature_logo_width}))
+        return self._request_id
+
+    def poll(self):
+        """取出最新完成的预览结果，没有新结果时返回 None，供 GUI 主线程调用。"""
+        result = None
+        while True:
+            try:
+                result = self._results.get_nowait()
+            except queue.Empty:
+                return result
+
+    def shutdown(self, timeout: float = None):
+        """通知工作线程退出，最多等待 timeout 秒让正在进行的渲染结束。"""
+        self._requests.put(None)
+        self._worker.join(timeout)
+
+    def _latest_request(self):
+        """阻塞等待请求，取到后丢弃同时排队的旧请求，只返回最新的一个（退出标记优先）。"""
+        item = self._requests.get()
+        while item is not None:
+            try:
+                newer = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            item = newer
+        return item
+
+    def _run(self):
+        while True:
+            item = self._latest_request()
+            if item is None:
+                return
+            request_id, submitted, texts, options = item
+            preview = self.watermark_service.render_preview(*texts, self.width, **options)
+            if preview is None:
+                continue
+            # 深色背景便于看清白色水印，合成也在工作线程中完成
+            image = Image.new("RGBA", preview.size, self.background)
+            image.alpha_composite(preview)
+            latency = time.perf_counter() - submitted
+            logger.debug(f"预览 #{request_id} 渲染完成，耗时 {latency * 1000:.1f} ms")
+            self._results.put(PreviewResult(request_id, image.convert("RGB"), latency))
@@ -0,0 +1,140 @@
+import os
+import queue
+import logging
+import itertools
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+class RenderJob:
+    """GUI 提交到后台队列的一次水印生成任务。"""
+    def __init__(self, job_id: int, params: dict):
+        self.job_id = job_id
+        self.params = params # WatermarkService.generate_watermark 的关键字参数
+        self.status = PENDING
+        self.error = None
+        self.cancel_requested = False
+
+    @property
+    def output_path(self):
+        return self.params.get("output_path")
+
+class RenderQueue:
+    """
+    在后台工作线程中按提交顺序执行水印生成任务，避免渲染和编码阻塞 Tk 主线程。
+    工作线程不接触任何 Tk 对象，状态变化以 (任务, 状态) 事件放入线程安全的队列，
+    由 GUI 通过 after() 定时调用 poll_events 取回并更新界面。
+    """
+    def __init__(self, watermark_service):
+        self.watermark_service = watermark_service
+        self._jobs = queue.Queue()
+        self._events = queue.Queue()
+        self._job_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._active = {} # job_id -> RenderJob，尚未结束的任务
+        self._stopped = False
+        self._worker = threading.Thread(target=self._run, name="render-worker", daemon=True)
+        self._worker.start()
+
+    def submit(self, params: dict) -> RenderJob:
+        """提交任务，立即返回，不等待渲染。"""
+        job = RenderJob(next(self._job_ids), params)
+        with self._lock:
+            self._active[job.job_id] = job
+        self._jobs.put(job)
+        self._events.put((job, PENDING))
+        return job
+
+    def cancel(self, job_id: int):
+        """
+        取消任务：排队中的任务不会再执行；正在渲染的任务无法中断，
+        完成后删除其输出文件并记为已取消。
+        """
+        with self._lock:
+            job = self._active.get(job_id)
+            if job:
+                job.cancel_requested = True
+
+    def cancel_all(self):
+        """取消所有尚未结束的任务。"""
+        with self._lock:
+            for job in self._active.values():
+                job.cancel_requested = True
+
+    @property
+    def active_count(self) -> int:
+        """排队中和正在渲染的任务数。"""
+        with self._lock:
+            return len(self._active)
+
+    def poll_events(self):
+        """取出自上次调用以来的所有状态事件，供 GUI 主线程调用。"""
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def shutdown(self, timeout: float = None) -> bool:
+        """
+        取消排队中的任务并通知工作线程退出，最多等待 timeout 秒让正在进行的渲染写完文件
+        （None 表示一直等待）。返回工作线程是否已退出。
+        正在渲染的任务照常完成并保留输出：工作线程是守护线程，进程退出时被中断的编码会留下不完整的文件。
+        """
+        self._stopped = True
+        with self._lock:
+            for job in self._active.values():
+                if job.status == PENDING:
+                    job.cancel_requested = True
+        self._jobs.put(None)
+        self._worker.join(timeout)
+        if self._worker.is_alive():
+            logger.warning(f"等待 {timeout} 秒后渲染任务仍未结束，输出文件可能不完整")
+            return False
+        return True
+
+    def _finish(self, job: RenderJob, status: str, error: str = None):
+        job.status = status
+        job.error = error
+        with self._lock:
+            self._active.pop(job.job_id, None)
+        self._events.put((job, status))
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None or self._stopped:
+                return
+            if job.cancel_requested:
+                self._finish(job, CANCELLED)
+                continue
+
+            job.status = RUNNING
+            self._events.put((job, RUNNING))
+            try:
+                success = self.watermark_service.generate_watermark(**job.params)
+                error = None if success else "水印生成失败，请查看日志获取更多信息。"
+            except Exception as e:
+                logger.critical(f"后台生成水印时发生未知错误: {e}", exc_info=True)
+                success, error = False, str(e)
+
+            if job.cancel_requested:
+                # 渲染期间被取消：丢弃已生成的文件
+                if success and job.output_path and os.path.exists(job.output_path):
+                    try:
+                        os.remove(job.output_path)
+                    except OSError as e:
+                        logger.warning(f"删除已取消任务的输出文件失败: {e}")
+                self._finish(job, CANCELLED)
+            elif success:
+                self._finish(job, SUCCEEDED)
+            else:
+                self._finish(job, FAILED, error)
@@ -1,17 +1,22 @@
 import tkinter as tk
 import logging
 from utils.logger import setup_logging
-from interface.gui import WatermarkApp
+from utils.startup_timer import StartupTimer
 from domain.exceptions import WatermarkGeneratorError
 
 def main():
+    startup_timer = StartupTimer()
     setup_logging()
     logger = logging.getLogger(__name__)
     logger.info("应用程序启动。")
 
     root = tk.Tk()
+    startup_timer.mark("创建窗口")
     try:
-        app = WatermarkApp(root)
+        # 界面模块会导入 Pillow 和渲染模块，放到窗口创建之后再导入
+        from interface.gui import WatermarkApp
+        startup_timer.mark("导入界面模块")
+        app = WatermarkApp(root, startup_timer=startup_timer)
         root.mainloop()
     except WatermarkGeneratorError as e:
         logger.critical(f"应用程序启动失败: {e}")
@@ -0,0 +1,11 @@
+import sys
+import time
+from utils.startup_timer import StartupTimer
+
+# 本机 HTTP 渲染服务入口，供其他内部工具调用：
+#   python server.py --port 8765 -j 2
+if __name__ == "__main__":
+    startup_timer = StartupTimer(time.perf_counter())
+    from interface.http_server import main
+    startup_timer.mark("导入模块")
+    sys.exit(main(startup_timer=startup_timer))
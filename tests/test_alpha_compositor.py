@@ -0,0 +1,67 @@
+import os
+import sys
+import random
+import unittest
+
+# 允许直接以 python tests/test_alpha_compositor.py 方式运行
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from PIL import Image
+from domain.alpha_compositor import NUMPY_AVAILABLE, NumpyCompositor, create_compositor
+from domain.exceptions import ConfigurationError
+
+def random_image(rng: random.Random, mode: str, size: tuple) -> Image.Image:
+    return Image.frombytes(mode, size, rng.randbytes(size[0] * size[1] * len(mode)))
+
+class CreateCompositorTest(unittest.TestCase):
+    def test_pillow_uses_image_paste(self):
+        self.assertIsNone(create_compositor("pillow"))
+
+    @unittest.skipIf(NUMPY_AVAILABLE, "已安装 NumPy")
+    def test_numpy_without_numpy_raises(self):
+        with self.assertRaises(ConfigurationError):
+            create_compositor("numpy")
+
+@unittest.skipUnless(NUMPY_AVAILABLE, "未安装 NumPy")
+class NumpyCompositorTest(unittest.TestCase):
+    """NumpyCompositor.paste 与 Image.paste(src, position, src) 的输出必须逐字节一致。"""
+    def setUp(self):
+        self.compositor = NumpyCompositor()
+        self.rng = random.Random(20240607)
+
+    def assert_same_as_pillow(self, base: Image.Image, overlay: Image.Image, position: tuple):
+        expected, actual = base.copy(), base.copy()
+        expected.paste(overlay, position, overlay)
+        self.compositor.paste(actual, overlay, position)
+        self.assertEqual(expected.tobytes(), actual.tobytes(), f"目标 {base.mode}, 位置 {position}")
+
+    def test_random_pixels_and_clipped_positions(self):
+        overlay = random_image(self.rng, "RGBA", (97, 61))
+        positions = [(0, 0), (13, 7), (-20, -11), (180, 130), (190, 5), (-200, 0), (3, 500)]
+        for mode in ("RGBA", "RGB"):
+            base = random_image(self.rng, mode, (211, 149))
+            for position in positions:
+                self.assert_same_as_pillow(base, overlay, position)
+
+    def test_random_sizes(self):
+        for _ in range(30):
+            mode = self.rng.choice(("RGBA", "RGB"))
+            base = random_image(self.rng, mode, (self.rng.randint(1, 120), self.rng.randint(1, 120)))
+            overlay = random_image(self.rng, "RGBA", (self.rng.randint(1, 80), self.rng.randint(1, 80)))
+            position = (self.rng.randint(-90, 130), self.rng.randint(-90, 130))
+            self.assert_same_as_pillow(base, overlay, position)
+
+    def test_sparse_and_extreme_alpha(self):
+        # 大部分像素完全透明，其余为完全不透明或半透明，覆盖 alpha 为 0/255 的边界情况
+        overlay = Image.new("RGBA", (64, 48), (10, 20, 30, 0))
+        for i in range(0, 64, 3):
+            overlay.putpixel((i, i % 48), (255, 128, 0, 255 if i % 2 else 1 + i))
+        for mode in ("RGBA", "RGB"):
+            self.assert_same_as_pillow(random_image(self.rng, mode, (80, 60)), overlay, (5, 4))
+
+    def test_fully_transparent_overlay_leaves_target_unchanged(self):
+        base = random_image(self.rng, "RGB", (40, 30))
+        self.assert_same_as_pillow(base, Image.new("RGBA", (20, 10), (255, 255, 255, 0)), (3, 3))
+
+if __name__ == "__main__":
+    unittest.main()
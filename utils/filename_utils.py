@@ -0,0 +1,32 @@
+import os
+import re
+
+# 文件名可选的组成字段，顺序即拼接顺序
+FILENAME_FIELDS = ("city", "location", "camera", "lens")
+
+def sanitize_filename_part(part: str) -> str:
+    """替换文件名中不允许的字符为下划线。"""
+    # 替换 / \ : * ? " < > | 为下划线
+    invalid_chars = r'[\\/:*?"<>|]'
+    return re.sub(invalid_chars, '_', part)
+
+def build_output_filename(values: dict, fields, extension: str = ".png") -> str:
+    """
+    根据选中的字段拼接输出文件名。
+    values 为 {字段名: 输入值}，fields 为需要包含在文件名中的字段名集合。
+    """
+    parts = []
+    for field in FILENAME_FIELDS:
+        if field in fields:
+            parts.append(sanitize_filename_part(str(values.get(field, "")).strip()))
+
+    # 过滤空字符串并连接
+    filtered_parts = [p.replace(" ", "_") for p in parts if p]
+    if filtered_parts:
+        return "_".join(filtered_parts) + extension
+    return "watermark" + extension # 至少有一个默认文件名
+
+def sized_output_path(output_path: str, width: int) -> str:
+    """多分辨率输出时在扩展名前追加画布宽度，如 a.png -> a_4000.png。"""
+    stem, extension = os.path.splitext(output_path)
+    return f"{stem}_{width}{extension}"
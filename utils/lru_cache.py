@@ -0,0 +1,96 @@
+import threading
+from collections import OrderedDict
+
+class LRUCache:
+    """
+    线程安全的 LRU 缓存，可按条目数和（可选的）字节数限制容量，并统计命中/未命中次数。
+    sizeof 为计算缓存值占用字节数的函数，仅在设置 max_bytes 时使用。
+    """
+    def __init__(self, max_entries: int = 128, max_bytes: int = None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._entries = OrderedDict() # key -> (value, 字节数)
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key, default=None):
+        """查找缓存值，命中时将其移到最近使用的位置。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """写入缓存值，超出容量时淘汰最久未使用的条目。"""
+        size = self._sizeof(value) if (self.max_bytes and self._sizeof) else 0
+        with self._lock:
+            old_entry = self._entries.pop(key, None)
+            if old_entry is not None:
+                self.total_bytes -= old_entry[1]
+            if self.max_bytes and size > self.max_bytes:
+                return # 单个值超过总容量，不缓存
+            self._entries[key] = (value, size)
+            self.total_bytes += size
+            self._evict()
+
+    def get_or_create(self, key, factory):
+        """
+        返回缓存值，未命中时调用 factory() 创建并写入缓存。
+        factory 在锁外执行，避免耗时的创建操作阻塞其他线程的查找。
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        value = factory()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                # 其他线程已抢先创建，使用已有的值以保证所有调用方拿到同一个对象
+                return entry[0]
+        self.put(key, value)
+        return value
+
+    def _evict(self):
+        """淘汰条目直到满足容量限制，调用方需持有锁。"""
+        while self._entries and (
+                (self.max_entries and len(self._entries) > self.max_entries) or
+                (self.max_bytes and self.total_bytes > self.max_bytes)):
+            _, (_, size) = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> dict:
+        """返回缓存的统计信息。"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
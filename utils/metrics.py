@@ -0,0 +1,172 @@
+import re
+import json
+import time
+import threading
+
+# 阶段耗时直方图的桶上界（秒），覆盖从亚毫秒的缓存命中到数秒的大图编码
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class _NullSpan:
+    """未启用指标时 span() 返回的空上下文管理器，所有调用共用同一个实例。"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    def __init__(self, metrics, name: str):
+        self._metrics = metrics
+        self._name = name
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._metrics.observe(self._name, time.perf_counter() - self._start)
+        return False
+
+class Histogram:
+    """固定桶的直方图，记录观测次数、总和与各桶的计数（非累积）。"""
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # 最后一个为 +Inf 桶
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, data: dict):
+        for i, count in enumerate(data["counts"]):
+            self.counts[i] += count
+        self.count += data["count"]
+        self.sum += data["sum"]
+
+    def to_dict(self) -> dict:
+        return {"buckets": list(self.buckets), "counts": list(self.counts), "count": self.count, "sum": self.sum}
+
+class Metrics:
+    """
+    进程内的轻量指标：span(名称) 记录阶段耗时到直方图，increment 累加计数器，set_gauge 设置当前值。
+    enabled 为 False 时 span 返回共享的空上下文管理器、其余方法直接返回，开销可以忽略。
+    可导出为 JSON 或 Prometheus 文本格式；多进程渲染时用 drain/merge 汇总各工作进程的指标。
+    """
+    def __init__(self, enabled: bool = False, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+
+    def span(self, name: str):
+        """用于 with 语句，测量代码块的耗时并记入名为 name 的直方图。"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def observe(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def increment(self, name: str, value: float = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[name] = value
+
+    def snapshot(self) -> dict:
+        """返回当前全部指标的字典副本。"""
+        with self._lock:
+            return {"histograms": {name: h.to_dict() for name, h in self._histograms.items()},
+                    "counters": dict(self._counters),
+                    "gauges": dict(self._gauges)}
+
+    def drain(self) -> dict:
+        """返回当前指标并清零，工作进程用它把增量交给主进程汇总。"""
+        with self._lock:
+            data = {"histograms": {name: h.to_dict() for name, h in self._histograms.items()},
+                    "counters": dict(self._counters),
+                    "gauges": dict(self._gauges)}
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+        return data
+
+    def merge(self, data: dict):
+        """合并 snapshot/drain 产出的指标：直方图和计数器相加，gauge 取最新值。"""
+        if not data:
+            return
+        with self._lock:
+            for name, histogram_data in data.get("histograms", {}).items():
+                histogram = self._histograms.get(name)
+                if histogram is None:
+                    histogram = self._histograms[name] = Histogram(histogram_data["buckets"])
+                histogram.merge(histogram_data)
+            for name, value in data.get("counters", {}).items():
+                self._counters[name] = self._counters.get(name, 0) + value
+            self._gauges.update(data.get("gauges", {}))
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=4, ensure_ascii=False)
+
+    def to_prometheus(self, prefix: str = "watermark") -> str:
+        """
+        导出为 Prometheus 文本格式：阶段耗时为 {prefix}_stage_seconds 直方图（stage 标签），
+        计数器为 {prefix}_{名称}_total，gauge 为 {prefix}_{名称}。
+        """
+        data = self.snapshot()
+        lines = []
+        if data["histograms"]:
+            family = f"{prefix}_stage_seconds"
+            lines.append(f"# HELP {family} 各渲染阶段的耗时")
+            lines.append(f"# TYPE {family} histogram")
+            for name, histogram in sorted(data["histograms"].items()):
+                cumulative = 0
+                for bound, count in zip(list(histogram["buckets"]) + ["+Inf"], histogram["counts"]):
+                    cumulative += count
+                    lines.append(f'{family}_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{family}_sum{{stage="{name}"}} {histogram["sum"]}')
+                lines.append(f'{family}_count{{stage="{name}"}} {histogram["count"]}')
+        for name, value in sorted(data["counters"].items()):
+            family = f"{prefix}_{_metric_name(name)}_total"
+            lines.append(f"# TYPE {family} counter")
+            lines.append(f"{family} {value}")
+        for name, value in sorted(data["gauges"].items()):
+            family = f"{prefix}_{_metric_name(name)}"
+            lines.append(f"# TYPE {family} gauge")
+            lines.append(f"{family} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """按扩展名写出指标：.prom / .txt 为 Prometheus 文本格式，其余为 JSON。"""
+        text = self.to_prometheus() if path.lower().endswith((".prom", ".txt")) else self.to_json()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+def _metric_name(name: str) -> str:
+    """把任意指标名转换为 Prometheus 允许的字符。"""
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
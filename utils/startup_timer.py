@@ -0,0 +1,24 @@
+import time
+
+class StartupTimer:
+    """
+    记录启动过程中各阶段的耗时。
+    mark(阶段名) 记录自上一个阶段结束以来的耗时，report() 生成一行汇总，用于对比冷启动性能。
+    """
+    def __init__(self, start: float = None):
+        self.start = start if start is not None else time.perf_counter()
+        self._last = self.start
+        self.stages = [] # [(阶段名, 耗时秒)]
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        self.stages.append((stage, now - self._last))
+        self._last = now
+
+    @property
+    def total(self) -> float:
+        return self._last - self.start
+
+    def report(self) -> str:
+        parts = ", ".join(f"{stage} {elapsed * 1000:.1f} ms" for stage, elapsed in self.stages)
+        return f"启动耗时 {self.total * 1000:.1f} ms ({parts})"